@@ -0,0 +1,187 @@
+"""
+Liveness analysis with bit sets. The entry point is the function `analyze`, which
+returns a `Liveness` object for a control flow graph from `assembly.controlFlow`.
+
+Variables are numbered densely, and sets of variables are represented as Python ints,
+where bit k is set if the variable with number k is in the set. For each block, the
+analysis first summarizes the variables used before being defined in the block (gen)
+and the variables defined in the block (kill). The fixed point is then computed by
+`assembly.dataflow` as a backward bit vector analysis.
+
+The sets of variables live before and after a single instruction are only computed
+on demand, one block at a time.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+from assembly.graph import Graph
+import assembly.dataflow as dataflow
+import assembly.ssa as ssa
+
+type InstrId = tuple[int, int]
+
+class VarIndex:
+    """
+    A dense numbering of variables.
+    """
+    def __init__(self):
+        self.nums: dict[tac.ident, int] = {}
+        self.vars: list[tac.ident] = []
+
+    def num(self, x: tac.ident) -> int:
+        k = self.nums.get(x)
+        if k is None:
+            k = len(self.vars)
+            self.nums[x] = k
+            self.vars.append(x)
+        return k
+
+    def bit(self, x: tac.ident) -> int:
+        return 1 << self.num(x)
+
+    def toSet(self, mask: int) -> set[tac.ident]:
+        res: set[tac.ident] = set()
+        while mask:
+            low = mask & -mask
+            res.add(self.vars[low.bit_length() - 1])
+            mask ^= low
+        return res
+
+def instrMasks(i: tac.instr, idx: VarIndex) -> tuple[int, int]:
+    """
+    Returns the bit sets of the variables defined and used by an instruction.
+    """
+    x = ssa.instrDefs(i)
+    d = idx.bit(x) if x is not None else 0
+    u = 0
+    for p in ssa.instrPrims(i):
+        if isinstance(p, tac.Name):
+            u |= idx.bit(p.var)
+    return (d, u)
+
+class Liveness:
+    def __init__(self, g: ControlFlowGraph, idx: VarIndex,
+                 masks: dict[int, list[tuple[int, int]]],
+                 liveInMasks: dict[int, int], liveOutMasks: dict[int, int], iterations: int):
+        self.g = g
+        self.idx = idx
+        self._masks = masks
+        self._in = liveInMasks
+        self._out = liveOutMasks
+        # Number of blocks processed until the fixed point was reached
+        self.iterations = iterations
+        self._afterMasks: dict[int, list[int]] = {}
+
+    def liveInMask(self, b: int) -> int:
+        return self._in[b]
+
+    def liveOutMask(self, b: int) -> int:
+        return self._out[b]
+
+    def liveIn(self, b: int) -> set[tac.ident]:
+        return self.idx.toSet(self._in[b])
+
+    def liveOut(self, b: int) -> set[tac.ident]:
+        return self.idx.toSet(self._out[b])
+
+    def afterMasks(self, b: int) -> list[int]:
+        """
+        Returns, for each instruction of block b, the bit set of variables live after it.
+        """
+        res = self._afterMasks.get(b)
+        if res is None:
+            masks = self._masks[b]
+            res = [0] * len(masks)
+            live = self._out[b]
+            for k in range(len(masks) - 1, -1, -1):
+                res[k] = live
+                (d, u) = masks[k]
+                live = (live & ~d) | u
+            self._afterMasks[b] = res
+        return res
+
+    def afterMask(self, instrId: InstrId) -> int:
+        (b, k) = instrId
+        return self.afterMasks(b)[k]
+
+    def beforeMask(self, instrId: InstrId) -> int:
+        (b, k) = instrId
+        (d, u) = self._masks[b][k]
+        return (self.afterMask(instrId) & ~d) | u
+
+    def after(self, instrId: InstrId) -> set[tac.ident]:
+        return self.idx.toSet(self.afterMask(instrId))
+
+    def before(self, instrId: InstrId) -> set[tac.ident]:
+        return self.idx.toSet(self.beforeMask(instrId))
+
+    def interfGraph(self) -> InterfGraph:
+        """
+        Builds the interference graph: the variable defined by an instruction interferes
+        with all other variables live after the instruction. For a move x = y, there is
+        no edge between x and y, as both hold the same value afterwards. The graph
+        contains all variables, even those without any interference.
+        """
+        edges: dict[int, int] = {}
+        for b in self.g.vertices:
+            afters = self.afterMasks(b)
+            instrs = self.g.getData(b).instrs
+            for k, (d, _) in enumerate(self._masks[b]):
+                if d:
+                    others = afters[k] & ~d
+                    src = moveSource(instrs[k])
+                    if src is not None:
+                        others &= ~self.idx.bit(src)
+                    if others:
+                        edges[d] = edges.get(d, 0) | others
+        res = Graph[tac.ident, None]('undirected')
+        for x in self.idx.vars:
+            res.addVertex(x, None)
+        for (d, others) in edges.items():
+            x = self.idx.vars[d.bit_length() - 1]
+            for y in self.idx.toSet(others):
+                res.addEdge(x, y)
+        return res
+
+    def moves(self) -> list[tuple[tac.ident, tac.ident]]:
+        """
+        Returns the pairs (x, y) of all moves x = y between different variables.
+        """
+        res: list[tuple[tac.ident, tac.ident]] = []
+        for b in sorted(self.g.vertices):
+            for i in self.g.getData(b).instrs:
+                match i:
+                    case tac.Assign(x, tac.Prim(tac.Name(y))) if x != y:
+                        res.append((x, y))
+                    case _:
+                        pass
+        return res
+
+def moveSource(i: tac.instr) -> Optional[tac.ident]:
+    """
+    Returns y if i is a move x = y between different variables.
+    """
+    match i:
+        case tac.Assign(x, tac.Prim(tac.Name(y))) if x != y:
+            return y
+        case _:
+            return None
+
+def analyze(g: ControlFlowGraph) -> Liveness:
+    idx = VarIndex()
+    masks: dict[int, list[tuple[int, int]]] = {}
+    gen: dict[int, int] = {}
+    kill: dict[int, int] = {}
+    for b in sorted(g.vertices):
+        ms = [instrMasks(i, idx) for i in g.getData(b).instrs]
+        masks[b] = ms
+        genB = 0
+        killB = 0
+        for (d, u) in reversed(ms):
+            genB = (genB & ~d) | u
+            killB |= d
+        gen[b] = genB
+        kill[b] = killB
+    res = dataflow.solve(g, dataflow.BitVectorAnalysis('backward', gen, kill))
+    return Liveness(g, idx, masks, res.inValues, res.outValues, res.iterations)
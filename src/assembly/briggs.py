@@ -0,0 +1,147 @@
+"""
+Register allocation in the style of Chaitin and Briggs. The entry point is the function
+`briggsAlloc`.
+
+With K registers, the allocator works in four phases on the interference graph:
+
+- coalesce: for a move x = y where x and y do not interfere, x and y are merged into a
+  single variable, so that they get the same register and the move disappears. Merging
+  is conservative: it must not turn a colorable graph into an uncolorable one. This
+  holds if the merged variable has fewer than K neighbours with K or more neighbours
+  (Briggs), or if every neighbour of y already interferes with x or has fewer than K
+  neighbours (George).
+- simplify: a variable with fewer than K neighbours can always be colored, so it is
+  removed from the graph and pushed on a stack. Removing it lowers the degree of its
+  neighbours.
+- potential spill: if every remaining variable has K or more neighbours, the variable
+  with the lowest spill cost is removed and pushed instead. The cost of x is
+  (uses + defs) * 10^loopDepth / degree, summed over all occurrences of x, where the
+  loop depth comes from `assembly.loops`. Definitions of variables that can be
+  rematerialized are free.
+- select: variables are popped from the stack and get the lowest register not taken
+  by a neighbour. Coloring is optimistic: a potential spill often still finds a free
+  register. Only variables without a free register are spilled.
+
+Spilled variables live on the stack and are loaded to and stored from the temporary
+registers of `assembly.tacToTacSpill` at every use and definition, so no further
+rounds of allocation are needed.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.loops as loops
+import assembly.ssa as ssa
+import common.log as log
+import heapq
+
+def spillCosts(g: ControlFlowGraph, remat: AbstractSet[tac.ident]=frozenset()) \
+        -> dict[tac.ident, float]:
+    """
+    Returns, for each variable, the number of its uses and definitions, where each
+    occurrence is weighted by 10^d for an instruction at loop depth d. Definitions of
+    variables in remat are not counted, as they need no store when spilled.
+    """
+    info = loops.loopInfo(g)
+    costs: dict[tac.ident, float] = {}
+    for b in g.vertices:
+        weight = 10 ** info.depth(b)
+        for i in g.getData(b).instrs:
+            x = ssa.instrDefs(i)
+            if x is not None:
+                costs[x] = costs.get(x, 0) + (0 if x in remat else weight)
+            for p in ssa.instrPrims(i):
+                if isinstance(p, tac.Name):
+                    costs[p.var] = costs.get(p.var, 0) + weight
+    return costs
+
+def _canCoalesce(adj: dict[tac.ident, set[tac.ident]], x: tac.ident, y: tac.ident,
+                 maxRegs: int) -> bool:
+    def degreeAfter(t: tac.ident) -> int:
+        return len(adj[t]) - (1 if t in adj[x] and t in adj[y] else 0)
+    significant = sum(1 for t in adj[x] | adj[y] if degreeAfter(t) >= maxRegs)
+    if significant < maxRegs:
+        return True
+    return all(t in adj[x] or len(adj[t]) < maxRegs for t in adj[y])
+
+def coalesce(adj: dict[tac.ident, set[tac.ident]], moves: list[tuple[tac.ident, tac.ident]],
+             costs: dict[tac.ident, float], maxRegs: int) -> dict[tac.ident, tac.ident]:
+    """
+    Merges the variables of moves in adj, as long as this is conservative. Returns the
+    variable each merged variable was merged into.
+    """
+    alias: dict[tac.ident, tac.ident] = {}
+    def find(x: tac.ident) -> tac.ident:
+        while x in alias:
+            x = alias[x]
+        return x
+    changed = True
+    while changed:
+        changed = False
+        for (x, y) in moves:
+            x = find(x)
+            y = find(y)
+            if x == y or x not in adj or y not in adj or y in adj[x]:
+                continue
+            if not _canCoalesce(adj, x, y, maxRegs):
+                continue
+            for t in adj.pop(y):
+                adj[t].discard(y)
+                adj[t].add(x)
+                adj[x].add(t)
+            costs[x] = costs.get(x, 0) + costs.pop(y, 0)
+            alias[y] = x
+            changed = True
+    return {y: find(y) for y in alias}
+
+def briggsAlloc(g: ControlFlowGraph, interfG: InterfGraph, maxRegs: int,
+                moves: list[tuple[tac.ident, tac.ident]]=[],
+                remat: AbstractSet[tac.ident]=frozenset()) -> RegisterMap:
+    costs = spillCosts(g, remat)
+    adj = {x: set(interfG.succs(x)) for x in interfG.vertices}
+    alias = coalesce(adj, moves, costs, maxRegs)
+    log.debug(f'Coalesced {len(alias)} of {len(moves)} moves')
+    degree = {x: len(ys) for x, ys in adj.items()}
+    order = {x: k for k, x in enumerate(adj)}
+    def spillPrio(x: tac.ident) -> tuple[float, int, int]:
+        return (costs.get(x, 0) / max(degree[x], 1), order[x], degree[x])
+    low = [x for x in adj if degree[x] < maxRegs]
+    high = {x for x in adj if degree[x] >= maxRegs}
+    # Candidates for potential spills. Removing neighbours only lowers the degree and
+    # thus raises the priority of a variable, so outdated entries are renewed lazily.
+    spillQueue = [(spillPrio(x), x) for x in high]
+    heapq.heapify(spillQueue)
+    removed: set[tac.ident] = set()
+    stack: list[tac.ident] = []
+    def remove(x: tac.ident):
+        removed.add(x)
+        stack.append(x)
+        for y in adj[x]:
+            if y not in removed:
+                degree[y] -= 1
+                if degree[y] == maxRegs - 1:
+                    high.remove(y)
+                    low.append(y)
+    while low or high:
+        if low:
+            remove(low.pop())
+        else:
+            (prio, x) = heapq.heappop(spillQueue)
+            if x not in high:
+                continue
+            if prio[2] != degree[x]:
+                heapq.heappush(spillQueue, (spillPrio(x), x))
+                continue
+            high.remove(x)
+            remove(x)
+    colors: dict[tac.ident, int] = {}
+    while stack:
+        x = stack.pop()
+        taken = {colors[y] for y in adj[x] if y in colors}
+        free = [c for c in range(maxRegs) if c not in taken]
+        if free:
+            colors[x] = free[0]
+    for (y, x) in alias.items():
+        if x in colors:
+            colors[y] = colors[x]
+    return RegisterAllocMap(colors, maxRegs)
@@ -4,7 +4,7 @@ from web assembly to MIPS assembly.
 """
 
 from typing import *
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import assembly.tac_ast as tac
 import assembly.tacSpill_ast as tacSpill
 import assembly.tacPretty as tacPretty
@@ -26,6 +26,21 @@ class BasicBlock:
         return f'BasicBlock({self.index}, {self.labels}, {instrs})'
 
 
+@dataclass
+class PassStats:
+    """
+    Statistics of one run of an optimization pass over TAC.
+    """
+    name: str
+    instrsBefore: int = 0
+    instrsAfter: int = 0
+    counters: dict[str, int] = field(default_factory=dict[str, int])
+    def inc(self, counter: str, n: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+    def __str__(self):
+        counters = ''.join(f', {k}={v}' for k, v in self.counters.items())
+        return f'{self.name}: {self.instrsBefore} -> {self.instrsAfter} instructions{counters}'
+
 type ControlFlowGraph = Graph[int, BasicBlock]
 type InterfGraph = Graph[tac.ident, None]
 
@@ -36,12 +51,12 @@ class RegisterMap(Protocol):
 class RegisterAllocMap(RegisterMap):
     def __init__(self, m: dict[tac.ident, int], maxRegisters: int):
         self._m = m
-        self.maxRegisters = maxRegisters
+        self.maxRegisters = min(maxRegisters, len(REGISTERS))
     def __str__(self):
         d = {}
         for x, i in self._m.items():
             if i >= 0 and i < self.maxRegisters:
-                d[x.name] = f'$s{i}'
+                d[x.name] = REGISTERS[i]
         return f'RegisterAllocMap({d})'
     def resolve(self, x: tac.ident) -> Optional[tacSpill.ident]:
         """
@@ -53,6 +68,15 @@ class RegisterAllocMap(RegisterMap):
         elif i < 0 or i >= self.maxRegisters:
             return None
         else:
-            return tacSpill.Ident(f'$s{i}')
+            return tacSpill.Ident(REGISTERS[i])
+
+# The registers for variables, in the order in which they are handed out. The callee-saved
+# $s registers come first, so with at most MAX_REGISTERS registers only these are used.
+# Then follow the caller-saved registers $t3-$t9 and $a1-$a3: $t0-$t2 are the temporaries
+# of the spill code, and the system calls for input and output only clobber $v0 and $a0.
+# The MIPS backend compiles a single function without calls, so caller-saved registers
+# never need to be saved.
+REGISTERS = [f'$s{i}' for i in range(8)] + [f'$t{i}' for i in range(3, 10)] + \
+    [f'$a{i}' for i in range(1, 4)]
 
 MAX_REGISTERS = 8
@@ -6,14 +6,15 @@ MIPS assembly.
 from typing import *
 from assembly.common import *
 from common.compilerSupport import *
-from assembly.tacToTacSpill import tacToTacSpill
+from assembly.tacToTacSpill import tacToTacSpill, RegAlloc
 from assembly.tacSpillToMips import tacSpillToMips
+import assembly.optimalAlloc as optimalAlloc
 from assembly.tac_ast import *
 import common.utils as utils
 import common.log as log
 import common.genericCompiler as genCompiler
 import assembly.mipsPretty as mipsPretty
-from assembly.loopToTac import loopToTac
+from assembly.loopToTac import fileToTac, mainFun
 import assembly.tacSpillPretty as tacSpillPretty
 
 MIPS_START = """
@@ -32,12 +33,24 @@ MIPS_END = """
   syscall
 """
 
-def compileFile(args: genCompiler.Args):
+def compileFile(args: genCompiler.Args, lang: str = 'loop', regAlloc: RegAlloc = 'color',
+                split: bool = False, budget: float = optimalAlloc.DEFAULT_BUDGET):
     log.info(f'Compiling {args.input} to assembly file {args.output}, args={args}')
-    tacInstrs = loopToTac(args)
+    prog = fileToTac(args, lang)
+    if len(prog.funs) != 1 or prog.globals:
+        utils.abort('The MIPS backend only supports programs consisting of a single ' \
+                    'function without globals')
+    tacInstrs = mainFun(prog).body
+    for i in tacInstrs:
+        if not isinstance(i, Assign | Call | GotoIf | Goto | Label):
+            utils.abort(f'Instruction not supported by the MIPS backend: ' \
+                        f'{tacPretty.prettyInstr(i).strip()}')
     log.debug('TAC:\n' + tacPretty.prettyInstrs(tacInstrs))
-    maxRegs = args.maxRegisters if args.maxRegisters is not None else MAX_REGISTERS
-    tacSpillInstrs = tacToTacSpill(tacInstrs, maxRegs)
+    maxRegs = args.maxRegisters if args.maxRegisters is not None else len(REGISTERS)
+    if maxRegs > len(REGISTERS):
+        utils.abort(f'The MIPS backend has at most {len(REGISTERS)} registers for variables')
+    tacSpillInstrs = tacToTacSpill(tacInstrs, maxRegs, args.optLevel, regAlloc=regAlloc,
+                                   split=split, budget=budget)
     log.debug('TAC spill:\n' + tacSpillPretty.prettyInstrs(tacSpillInstrs))
     mipsInstrs = tacSpillToMips(tacSpillInstrs)
     s = mipsPretty.mipsPretty(mipsInstrs)
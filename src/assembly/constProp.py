@@ -0,0 +1,225 @@
+"""
+Constant propagation and folding for TAC. The entry point is the function `constProp`.
+
+The pass is a forward dataflow analysis over the control flow graph from
+`assembly.controlFlow`. For each variable, it tracks whether the variable holds a
+known constant. Only edges that can actually be taken are followed: a conditional
+jump on a known constant has a single successor. Blocks never reached are removed.
+
+After the analysis, operands with a known value are replaced by constants, operations
+on constants are folded, and conditional jumps on constants become unconditional
+jumps or disappear. Constants are only introduced if they fit into the 16-bit
+immediates of the MIPS backend; larger values are treated as unknown.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.controlFlow as controlFlow
+import assembly.tacRuntime as tacRuntime
+
+# Maps each variable to its constant value, or None if the value is not a constant.
+type ConstEnv = dict[tac.ident, Optional[int]]
+
+MIN_IMM = -2**15
+MAX_IMM = 2**15 - 1
+
+# Relational operators with swapped operands
+_swapped: dict[str, str] = {
+    'ADD': 'ADD', 'MUL': 'MUL', 'EQ': 'EQ', 'NE': 'NE',
+    'LT_S': 'GT_S', 'GT_S': 'LT_S', 'LE_S': 'GE_S', 'GE_S': 'LE_S',
+}
+
+def fitsImm(v: Optional[int]) -> Optional[int]:
+    """
+    Returns v if it fits into a MIPS immediate, otherwise None.
+    """
+    if v is None or v < MIN_IMM or v > MAX_IMM:
+        return None
+    return v
+
+def _evalPrim(p: tac.prim, env: ConstEnv) -> Optional[int]:
+    match p:
+        case tac.Const(v): return v
+        case tac.Name(x): return env.get(x)
+
+def evalExp(e: tac.exp, env: ConstEnv) -> Optional[int]:
+    match e:
+        case tac.Prim(p):
+            return _evalPrim(p, env)
+        case tac.BinOp(p1, op, p2):
+            v1 = _evalPrim(p1, env)
+            v2 = _evalPrim(p2, env)
+            f = tacRuntime.binOps.get(op.name)
+            if v1 is None or v2 is None or f is None:
+                return None
+            return fitsImm(f(v1, v2))
+        case tac.UnOp(op, p):
+            v = _evalPrim(p, env)
+            f = tacRuntime.unOps.get(op.name)
+            if v is None or f is None:
+                return None
+            return fitsImm(f(v))
+
+def _defined(i: tac.instr) -> Optional[tac.ident]:
+    match i:
+        case tac.Assign(x) | tac.Load(x) | tac.GlobalGet(x):
+            return x
+        case tac.Call(x) | tac.CallIndirect(x):
+            return x
+        case _:
+            return None
+
+def _transfer(i: tac.instr, env: ConstEnv):
+    match i:
+        case tac.Assign(x, e):
+            env[x] = evalExp(e, env)
+        case _:
+            x = _defined(i)
+            if x is not None:
+                env[x] = None
+
+def _meet(env1: ConstEnv, env2: ConstEnv) -> ConstEnv:
+    return {x: v if env2.get(x) == v else None for x, v in env1.items()}
+
+def _feasibleSuccs(g: ControlFlowGraph, bb: BasicBlock, env: ConstEnv) -> list[int]:
+    match bb.last:
+        case tac.GotoIf(test, label):
+            v = _evalPrim(test, env)
+            if v is None:
+                return g.succs(bb.index)
+            if v != 0:
+                return [s for s in g.succs(bb.index) if label in g.getData(s).labels]
+            nextIdx = bb.index + 1
+            return [nextIdx] if g.hasVertex(nextIdx) else []
+        case _:
+            return g.succs(bb.index)
+
+def _allVars(instrs: list[tac.instr]) -> set[tac.ident]:
+    res: set[tac.ident] = set()
+    for i in instrs:
+        x = _defined(i)
+        if x is not None:
+            res.add(x)
+    return res
+
+def analyze(g: ControlFlowGraph, vars: set[tac.ident]) -> dict[int, ConstEnv]:
+    """
+    Computes the constant environment at the start of each reachable block. Initially,
+    no variable is known to be a constant.
+    """
+    if not g.hasVertex(0):
+        return {}
+    inEnvs: dict[int, ConstEnv] = {0: {x: None for x in vars}}
+    worklist = [0]
+    while worklist:
+        idx = worklist.pop()
+        bb = g.getData(idx)
+        env = dict(inEnvs[idx])
+        for i in bb.instrs:
+            _transfer(i, env)
+        for s in _feasibleSuccs(g, bb, env):
+            old = inEnvs.get(s)
+            new = env if old is None else _meet(old, env)
+            if old is None or new != old:
+                inEnvs[s] = new
+                worklist.append(s)
+    return inEnvs
+
+def rewritePrim(p: tac.prim, env: ConstEnv) -> tac.prim:
+    v = _evalPrim(p, env)
+    return tac.Const(v) if v is not None else p
+
+def _rewriteExp(e: tac.exp, env: ConstEnv, stats: PassStats) -> tac.exp:
+    v = evalExp(e, env)
+    if v is not None:
+        if not isinstance(e, tac.Prim):
+            stats.inc('folded')
+        return tac.Prim(tac.Const(v))
+    match e:
+        case tac.Prim(p):
+            return e
+        case tac.BinOp(p1, op, p2):
+            p1 = rewritePrim(p1, env)
+            p2 = rewritePrim(p2, env)
+            # The MIPS backend expects constant operands on the right
+            swapped = _swapped.get(op.name)
+            if isinstance(p1, tac.Const) and isinstance(p2, tac.Name) and swapped:
+                return tac.BinOp(p2, tac.Op(swapped), p1)
+            return tac.BinOp(p1, op, p2)
+        case tac.UnOp(op, p):
+            return tac.UnOp(op, rewritePrim(p, env))
+
+def rewriteInstr(i: tac.instr, env: ConstEnv, stats: PassStats) -> Optional[tac.instr]:
+    """
+    Rewrites an instruction, given the environment before the instruction. Returns
+    None if the instruction can be removed.
+    """
+    match i:
+        case tac.Assign(x, e):
+            return tac.Assign(x, _rewriteExp(e, env, stats))
+        case tac.Call(x, f, args):
+            return tac.Call(x, f, [rewritePrim(a, env) for a in args])
+        case tac.CallIndirect(x, idx, args):
+            return tac.CallIndirect(x, rewritePrim(idx, env),
+                                    [rewritePrim(a, env) for a in args])
+        case tac.GotoIf(test, label):
+            v = _evalPrim(test, env)
+            if v is None:
+                return i
+            stats.inc('branchesFolded')
+            return tac.Goto(label) if v != 0 else None
+        case tac.Load(x, size, addr):
+            return tac.Load(x, size, rewritePrim(addr, env))
+        case tac.Store(size, addr, value):
+            return tac.Store(size, rewritePrim(addr, env), rewritePrim(value, env))
+        case tac.GlobalSet(glob, value):
+            return tac.GlobalSet(glob, rewritePrim(value, env))
+        case tac.Return(value):
+            return tac.Return(rewritePrim(value, env) if value is not None else None)
+        case tac.Goto() | tac.Label() | tac.GlobalGet() | tac.Trap():
+            return i
+
+def _labelsAt(instrs: list[tac.instr], idx: int) -> set[str]:
+    """
+    Returns the labels starting at index idx.
+    """
+    labels: set[str] = set()
+    while idx < len(instrs):
+        match instrs[idx]:
+            case tac.Label(l):
+                labels.add(l)
+                idx += 1
+            case _:
+                break
+    return labels
+
+def removeJumpsToNext(instrs: list[tac.instr]) -> list[tac.instr]:
+    """
+    Removes unconditional jumps to a label directly following the jump.
+    """
+    res: list[tac.instr] = []
+    for idx, i in enumerate(instrs):
+        if isinstance(i, tac.Goto) and i.label in _labelsAt(instrs, idx + 1):
+            continue
+        res.append(i)
+    return res
+
+def constProp(instrs: list[tac.instr], stats: PassStats) -> list[tac.instr]:
+    g = controlFlow.buildControlFlowGraph(instrs)
+    inEnvs = analyze(g, _allVars(instrs))
+    res: list[tac.instr] = []
+    for idx in sorted(g.vertices):
+        bb = g.getData(idx)
+        env = inEnvs.get(idx)
+        if env is None:
+            stats.inc('blocksRemoved')
+            continue
+        env = dict(env)
+        res.extend(tac.Label(l) for l in bb.labels)
+        for i in bb.instrs:
+            newI = rewriteInstr(i, env, stats)
+            if newI is not None:
+                res.append(newI)
+            _transfer(i, env)
+    return removeJumpsToNext(res)
@@ -8,6 +8,37 @@ from typing import *
 from assembly.common import *
 import common.log as log
 
+def endsBlock(instr: tac.instr) -> bool:
+    """
+    Returns True if instr is the last instruction of its basic block: jumps, returns,
+    and traps.
+    """
+    return isinstance(instr, tac.Goto | tac.GotoIf | tac.Return | tac.Trap)
+
+def retarget(i: tac.instr, labels: list[str], newLabel: str) -> tac.instr:
+    """
+    Redirects a jump to one of the labels to newLabel.
+    """
+    match i:
+        case tac.Goto(l) if l in labels:
+            return tac.Goto(newLabel)
+        case tac.GotoIf(test, l) if l in labels:
+            return tac.GotoIf(test, newLabel)
+        case _:
+            return i
+
+def freshLabel(g: ControlFlowGraph, base: str) -> str:
+    """
+    Returns a label not used in g, base itself or base with a numeric suffix.
+    """
+    labels = {l for bb in g.values for l in bb.labels}
+    name = base
+    k = 0
+    while name in labels:
+        k += 1
+        name = f'{base}_{k}'
+    return name
+
 def _firstBasicBlock(instrs: list[tac.instr], blockIdx: int) -> tuple[BasicBlock, list[tac.instr]]:
     # First, strip off all labels
     labels: list[str] = []
@@ -25,11 +56,11 @@ def _firstBasicBlock(instrs: list[tac.instr], blockIdx: int) -> tuple[BasicBlock
     # Now find the first instruction that is a jump or a label
     firstJumpOrLabelIdx = 0
     for idx, instr in enumerate(instrs):
-        if not isinstance(instr, tac.Assign) and not isinstance(instr, tac.Call):
+        if isinstance(instr, tac.Label) or endsBlock(instr):
             firstJumpOrLabelIdx = idx
             break
     else:
-        # instrs only contains assign or calls
+        # instrs contains no jumps or labels
         return (BasicBlock(instrs, blockIdx, labels), [])
     # idx is the index of the first instruction that is a jump or a label.
     offset = 0 if isinstance(instrs[firstJumpOrLabelIdx], tac.Label) else 1
@@ -59,6 +90,8 @@ def buildControlFlowGraph(instrs: list[tac.instr]) -> ControlFlowGraph:
                 nextIdx = bb.index + 1
                 if g.hasVertex(nextIdx):
                     succs.append(nextIdx)
+            case tac.Return() | tac.Trap():
+                pass
             case _:
                 nextIdx = bb.index + 1
                 if g.hasVertex(nextIdx):
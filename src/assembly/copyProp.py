@@ -0,0 +1,174 @@
+"""
+Copy propagation and dead assignment elimination for TAC. The entry point is the
+function `copyPropDce`.
+
+Copy propagation is a forward dataflow analysis (see `assembly.dataflow`) over the
+control flow graph from `assembly.controlFlow`. It tracks the copies `x = y` available
+at each point and replaces uses of x by y. This leaves many copies without any use.
+Dead assignment elimination removes assignments to variables that are not live
+afterwards, using the liveness information from `assembly.bitLiveness`. Removing an
+assignment may make other assignments dead or enable further copy propagation, so both
+steps are iterated until the instructions no longer change.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.controlFlow as controlFlow
+import assembly.bitLiveness as bitLiveness
+import assembly.dataflow as dataflow
+
+# Maps a variable x to y if the copy x = y is available.
+type CopyEnv = dict[tac.ident, tac.ident]
+
+type InstrId = tuple[int, int]
+
+def _defined(i: tac.instr) -> Optional[tac.ident]:
+    match i:
+        case tac.Assign(x) | tac.Load(x) | tac.GlobalGet(x):
+            return x
+        case tac.Call(x) | tac.CallIndirect(x):
+            return x
+        case _:
+            return None
+
+def _transfer(i: tac.instr, env: CopyEnv):
+    x = _defined(i)
+    if x is None:
+        return
+    for y in [y for y, z in env.items() if y == x or z == x]:
+        del env[y]
+    match i:
+        case tac.Assign(_, tac.Prim(tac.Name(z))) if z != x:
+            env[x] = z
+        case _:
+            pass
+
+def _meet(env1: CopyEnv, env2: CopyEnv) -> CopyEnv:
+    return {x: y for x, y in env1.items() if env2.get(x) == y}
+
+class _AvailableCopies:
+    direction: dataflow.Direction = 'forward'
+    def boundary(self) -> CopyEnv:
+        return {}
+    def initial(self) -> CopyEnv:
+        return {}
+    def join(self, x: CopyEnv, y: CopyEnv) -> CopyEnv:
+        return _meet(x, y)
+    def transfer(self, b: int, bb: BasicBlock, x: CopyEnv) -> CopyEnv:
+        env = dict(x)
+        for i in bb.instrs:
+            _transfer(i, env)
+        return env
+
+def analyze(g: ControlFlowGraph, stats: Optional[PassStats] = None) -> dict[int, CopyEnv]:
+    """
+    Computes the copies available at the start of each reachable block.
+    """
+    res = dataflow.solve(g, _AvailableCopies())
+    if stats is not None:
+        stats.inc('dataflowIterations', res.iterations)
+    return res.inValues
+
+def _rewritePrim(p: tac.prim, env: CopyEnv, stats: PassStats) -> tac.prim:
+    match p:
+        case tac.Name(x) if x in env:
+            stats.inc('copiesPropagated')
+            return tac.Name(env[x])
+        case _:
+            return p
+
+def _rewriteExp(e: tac.exp, env: CopyEnv, stats: PassStats) -> tac.exp:
+    match e:
+        case tac.Prim(p):
+            return tac.Prim(_rewritePrim(p, env, stats))
+        case tac.BinOp(p1, op, p2):
+            return tac.BinOp(_rewritePrim(p1, env, stats), op, _rewritePrim(p2, env, stats))
+        case tac.UnOp(op, p):
+            return tac.UnOp(op, _rewritePrim(p, env, stats))
+
+def _rewriteInstr(i: tac.instr, env: CopyEnv, stats: PassStats) -> tac.instr:
+    def prims(ps: list[tac.prim]) -> list[tac.prim]:
+        return [_rewritePrim(p, env, stats) for p in ps]
+    match i:
+        case tac.Assign(x, e):
+            return tac.Assign(x, _rewriteExp(e, env, stats))
+        case tac.Call(x, f, args):
+            return tac.Call(x, f, prims(args))
+        case tac.CallIndirect(x, idx, args):
+            return tac.CallIndirect(x, _rewritePrim(idx, env, stats), prims(args))
+        case tac.GotoIf(test, label):
+            return tac.GotoIf(_rewritePrim(test, env, stats), label)
+        case tac.Load(x, size, addr):
+            return tac.Load(x, size, _rewritePrim(addr, env, stats))
+        case tac.Store(size, addr, value):
+            return tac.Store(size, _rewritePrim(addr, env, stats),
+                             _rewritePrim(value, env, stats))
+        case tac.GlobalSet(glob, value):
+            return tac.GlobalSet(glob, _rewritePrim(value, env, stats))
+        case tac.Return(value):
+            return tac.Return(_rewritePrim(value, env, stats) if value is not None else None)
+        case tac.Goto() | tac.Label() | tac.GlobalGet() | tac.Trap():
+            return i
+
+def propagateCopies(g: ControlFlowGraph, stats: PassStats) -> list[tac.instr]:
+    inEnvs = analyze(g, stats)
+    res: list[tac.instr] = []
+    for idx in sorted(g.vertices):
+        bb = g.getData(idx)
+        env = dict(inEnvs.get(idx, {}))
+        res.extend(tac.Label(l) for l in bb.labels)
+        for i in bb.instrs:
+            res.append(_rewriteInstr(i, env, stats))
+            _transfer(i, env)
+    return res
+
+def _isDead(i: tac.instr, live: bitLiveness.Liveness, instrId: InstrId) -> bool:
+    """
+    Returns True if i only assigns a variable that is not live afterwards. Loads are
+    never dead because they may trap.
+    """
+    match i:
+        case tac.Assign(x, tac.Prim(tac.Name(y))) if x == y:
+            return True
+        case tac.Assign(x) | tac.GlobalGet(x):
+            return not (live.afterMask(instrId) & live.idx.bit(x))
+        case _:
+            return False
+
+def removeDeadAssigns(g: ControlFlowGraph, live: bitLiveness.Liveness,
+                      stats: PassStats) -> list[tac.instr]:
+    res: list[tac.instr] = []
+    for idx in sorted(g.vertices):
+        bb = g.getData(idx)
+        res.extend(tac.Label(l) for l in bb.labels)
+        for k, i in enumerate(bb.instrs):
+            if _isDead(i, live, (idx, k)):
+                stats.inc('deadRemoved')
+            else:
+                res.append(i)
+    return res
+
+def _liveness(instrs: list[tac.instr]) -> tuple[ControlFlowGraph, bitLiveness.Liveness, int]:
+    """
+    Returns the control flow graph, its liveness information, and the number of
+    variables with at least one interference.
+    """
+    g = controlFlow.buildControlFlowGraph(instrs)
+    live = bitLiveness.analyze(g)
+    interfG = live.interfGraph()
+    return (g, live, sum(1 for x in interfG.vertices if interfG.succs(x)))
+
+def copyPropDce(instrs: list[tac.instr], stats: PassStats) -> list[tac.instr]:
+    (g, live, vertsBefore) = _liveness(instrs)
+    verts = vertsBefore
+    while True:
+        stats.inc('iterations')
+        newInstrs = removeDeadAssigns(g, live, stats)
+        newInstrs = propagateCopies(controlFlow.buildControlFlowGraph(newInstrs), stats)
+        if newInstrs == instrs:
+            break
+        instrs = newInstrs
+        (g, live, verts) = _liveness(instrs)
+    stats.inc('interfVerticesRemoved', vertsBefore - verts)
+    return instrs
@@ -0,0 +1,143 @@
+"""
+A generic framework for dataflow analyses over control flow graphs built by
+`assembly.controlFlow`. The entry point is the function `solve`.
+
+An analysis (see `Analysis`) defines its direction, the values of the lattice, how
+values from several neighbours are joined, and how a block transforms a value. A
+forward analysis propagates values from the entry along the edges, a backward analysis
+propagates values from the blocks without successors against the edges.
+
+The fixed point is computed with a worklist. Blocks are processed in reverse postorder
+for forward analyses and in postorder for backward analyses, so that a block is usually
+processed after the blocks it depends on. After the initial round, only blocks whose
+neighbours changed are processed again. The value flowing into a block is the join of
+the values of all neighbours processed so far, so the analysis never needs a top
+element.
+
+`BitVectorAnalysis` specializes the framework for analyses whose values are sets
+represented as bits of Python ints, with transfer functions given by gen and kill sets.
+"""
+
+from typing import *
+from dataclasses import dataclass
+from assembly.common import *
+import assembly.dominators as dominators
+import heapq
+
+type Direction = Literal['forward', 'backward']
+
+class Analysis[L](Protocol):
+    direction: Direction
+
+    def boundary(self) -> L:
+        """
+        The value at the start of the entry block (forward analyses) or at the end of
+        the blocks without successors (backward analyses).
+        """
+        ...
+
+    def initial(self) -> L:
+        """
+        The value flowing into a block when none of its neighbours was processed yet.
+        """
+        ...
+
+    def join(self, x: L, y: L) -> L:
+        ...
+
+    def transfer(self, b: int, bb: BasicBlock, x: L) -> L:
+        """
+        Transforms the value flowing into block b to the value flowing out of b. For a
+        backward analysis, the value flows in at the end of the block.
+        """
+        ...
+
+@dataclass
+class Result[L]:
+    # The values at the start and at the end of each block. For a forward analysis,
+    # blocks not reachable from the entry have no values.
+    inValues: dict[int, L]
+    outValues: dict[int, L]
+    # Number of blocks processed until the fixed point was reached
+    iterations: int
+
+def postorder(g: ControlFlowGraph) -> list[int]:
+    """
+    Returns all blocks in postorder of a depth-first traversal from the entry, followed
+    by the unreachable blocks.
+    """
+    order = list(reversed(dominators.reversePostorder(g)))
+    seen = set(order)
+    order.extend(v for v in sorted(g.vertices) if v not in seen)
+    return order
+
+def solve[L](g: ControlFlowGraph, a: Analysis[L]) -> Result[L]:
+    preds = dominators.predecessors(g)
+    if a.direction == 'forward':
+        order = dominators.reversePostorder(g)
+        sources = preds
+        targets: dict[int, list[int]] = {b: g.succs(b) for b in g.vertices}
+        isBoundary: Callable[[int], bool] = lambda b: b == dominators.ENTRY
+    else:
+        order = postorder(g)
+        sources = {b: g.succs(b) for b in g.vertices}
+        targets = preds
+        isBoundary = lambda b: not sources[b]
+    prio = {b: k for k, b in enumerate(order)}
+    # Values flowing into and out of each block, in the direction of the analysis
+    flowIn: dict[int, L] = {}
+    flowOut: dict[int, L] = {}
+    work = [(prio[b], b) for b in order]
+    queued = set(order)
+    iterations = 0
+    while work:
+        (_, b) = heapq.heappop(work)
+        queued.discard(b)
+        iterations += 1
+        x: Optional[L] = a.boundary() if isBoundary(b) else None
+        for s in sources[b]:
+            if s in flowOut:
+                y = flowOut[s]
+                x = y if x is None else a.join(x, y)
+        if x is None:
+            x = a.initial()
+        flowIn[b] = x
+        y = a.transfer(b, g.getData(b), x)
+        if b in flowOut and flowOut[b] == y:
+            continue
+        flowOut[b] = y
+        for t in targets[b]:
+            if t in prio and t not in queued:
+                queued.add(t)
+                heapq.heappush(work, (prio[t], t))
+    if a.direction == 'forward':
+        return Result(flowIn, flowOut, iterations)
+    else:
+        return Result(flowOut, flowIn, iterations)
+
+class BitVectorAnalysis:
+    """
+    An analysis whose values are bit sets. Block b transforms x into
+    gen[b] | (x & ~kill[b]). For a may analysis, values are joined by union. For a must
+    analysis, they are joined by intersection, and `universe` contains all bits.
+    """
+    def __init__(self, direction: Direction, gen: dict[int, int], kill: dict[int, int],
+                 must: bool = False, universe: int = 0, boundary: int = 0):
+        self.direction = direction
+        self.gen = gen
+        self.kill = kill
+        self.must = must
+        self.universe = universe
+        self._boundary = boundary
+
+    def boundary(self) -> int:
+        return self._boundary
+
+    def initial(self) -> int:
+        return self.universe if self.must else 0
+
+    def join(self, x: int, y: int) -> int:
+        return x & y if self.must else x | y
+
+    def transfer(self, b: int, bb: BasicBlock, x: int) -> int:
+        return self.gen[b] | (x & ~self.kill[b])
@@ -0,0 +1,115 @@
+"""
+Dominators for control flow graphs built by `assembly.controlFlow`. A block d dominates
+a block b if every path from the entry block 0 to b passes through d.
+
+The function `immediateDominators` computes the dominator tree with the iterative
+algorithm by Cooper, Harvey, and Kennedy ("A Simple, Fast Dominance Algorithm").
+Blocks not reachable from the entry block are not part of the dominator tree.
+"""
+
+from typing import *
+from assembly.common import *
+
+ENTRY = 0
+
+def predecessors(g: ControlFlowGraph) -> dict[int, list[int]]:
+    """
+    Returns the predecessors of all blocks, in ascending order.
+    """
+    preds: dict[int, list[int]] = {v: [] for v in g.vertices}
+    for v in sorted(g.vertices):
+        for s in g.succs(v):
+            preds[s].append(v)
+    return preds
+
+def reversePostorder(g: ControlFlowGraph) -> list[int]:
+    """
+    Returns the blocks reachable from the entry block in reverse postorder.
+    """
+    if not g.hasVertex(ENTRY):
+        return []
+    post: list[int] = []
+    visited = {ENTRY}
+    stack: list[tuple[int, Iterator[int]]] = [(ENTRY, iter(sorted(g.succs(ENTRY))))]
+    while stack:
+        (v, it) = stack[-1]
+        s = next(it, None)
+        if s is None:
+            stack.pop()
+            post.append(v)
+        elif s not in visited:
+            visited.add(s)
+            stack.append((s, iter(sorted(g.succs(s)))))
+    post.reverse()
+    return post
+
+def immediateDominators(g: ControlFlowGraph) -> dict[int, int]:
+    """
+    Maps each block reachable from the entry to its immediate dominator. The entry
+    block is mapped to itself.
+    """
+    order = reversePostorder(g)
+    rpoIdx = {v: k for k, v in enumerate(order)}
+    preds = predecessors(g)
+    idom: dict[int, int] = {ENTRY: ENTRY} if order else {}
+    def intersect(b1: int, b2: int) -> int:
+        while b1 != b2:
+            while rpoIdx[b1] > rpoIdx[b2]:
+                b1 = idom[b1]
+            while rpoIdx[b2] > rpoIdx[b1]:
+                b2 = idom[b2]
+        return b1
+    changed = True
+    while changed:
+        changed = False
+        for b in order[1:]:
+            newIdom: Optional[int] = None
+            for p in preds[b]:
+                if p in idom:
+                    newIdom = p if newIdom is None else intersect(p, newIdom)
+            if newIdom is not None and idom.get(b) != newIdom:
+                idom[b] = newIdom
+                changed = True
+    return idom
+
+def dominatorTree(idom: dict[int, int]) -> dict[int, list[int]]:
+    """
+    Maps each block to its children in the dominator tree.
+    """
+    children: dict[int, list[int]] = {v: [] for v in idom}
+    for v in sorted(idom):
+        if v != ENTRY:
+            children[idom[v]].append(v)
+    return children
+
+def dominates(idom: dict[int, int], d: int, b: int) -> bool:
+    """
+    Returns True if block d dominates block b. Every block dominates itself.
+    """
+    while b != d:
+        if b == ENTRY or b not in idom:
+            return False
+        b = idom[b]
+    return True
+
+def dominanceFrontiers(g: ControlFlowGraph, idom: dict[int, int]) -> dict[int, set[int]]:
+    """
+    Computes the dominance frontier of each block reachable from the entry: the blocks b
+    such that the block dominates a predecessor of b, but does not strictly dominate b.
+    """
+    df: dict[int, set[int]] = {v: set() for v in idom}
+    preds = predecessors(g)
+    for b in idom:
+        ps = [p for p in preds[b] if p in idom]
+        # The entry block has an additional implicit edge from the start of the function
+        if len(ps) < 2 and not (b == ENTRY and ps):
+            continue
+        stop = idom[b] if b != ENTRY else None
+        for p in ps:
+            runner = p
+            while runner != stop:
+                df[runner].add(b)
+                if runner == ENTRY:
+                    break
+                runner = idom[runner]
+    return df
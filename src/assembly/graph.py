@@ -17,6 +17,7 @@ class Graph[V, T]:
         self.kind = kind
         self.__vertexData: dict[V, T] = {}
         self.__edges: dict[V, set[V]] = {}
+        self.__cache: dict[str, Any] = {}
     def __repr__(self):
         return f'Graph(vertices={list(self.__vertexData.keys())}, edges={self.__edges})'
     def addVertex(self, v: V, x: T):
@@ -26,6 +27,7 @@ class Graph[V, T]:
         if v in self.__vertexData:
             raise ValueError(f'Vertex {v} already added to graph')
         self.__vertexData[v] = x
+        self.__cache.clear()
     def hasVertex(self, v: V):
         return v in self.__vertexData
     def __assertVertex(self, v: V):
@@ -39,6 +41,7 @@ class Graph[V, T]:
         """
         self.__assertVertex(src)
         self.__assertVertex(tgt)
+        self.__cache.clear()
         self.__addEdge(src, tgt)
         if self.kind == 'undirected':
             self.__addEdge(tgt, src)
@@ -83,3 +86,11 @@ class Graph[V, T]:
             for tgt in tgts:
                 res.append((src, tgt))
         return res
+    def cached[R](self, key: str, compute: Callable[[], R]) -> R:
+        """
+        Returns the result of some analysis of the graph, identified by key. The result
+        is computed on first use and cached until the vertices or edges change.
+        """
+        if key not in self.__cache:
+            self.__cache[key] = compute()
+        return self.__cache[key]
@@ -0,0 +1,150 @@
+"""
+Global value numbering for functions in SSA form (see `assembly.ssa`). The entry point
+is the function `gvn`.
+
+The blocks are visited in a preorder traversal of the dominator tree. A scoped hash
+table maps each operation, identified by its operator and the value numbers of its
+operands, to the variable computing it. As each SSA variable is assigned only once,
+the variable is available in all blocks dominated by its definition. An operation
+found in the table is replaced by a copy of this variable. When the traversal leaves a
+block, the entries added for the block are removed again.
+
+The value number of a variable is the variable itself, or, for copies, the value
+number of the copied operand. Phi functions whose arguments all have the same value
+number are copies as well. Like `assembly.valueNumbering`, the operands of ADD, MUL,
+EQ, and NE are ordered.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.dominators as dominators
+from assembly.ssa import SsaFun, Phi, mapPrims
+
+_commutative = {'ADD', 'MUL', 'EQ', 'NE'}
+
+# Value numbers: ('const', c) for constants and ('var', x) for variables
+type ValueNum = tuple[str, int] | tuple[str, str]
+type ValueKey = tuple[ValueNum | str, ...]
+
+class _Gvn:
+    def __init__(self, ssa: SsaFun, stats: PassStats):
+        self.ssa = ssa
+        self.stats = stats
+        # For copies, the operand copied
+        self.copies: dict[tac.ident, tac.prim] = {}
+        self.table: dict[ValueKey, tac.ident] = {}
+
+    def canon(self, p: tac.prim) -> tac.prim:
+        """
+        Returns the representative for an operand. Only variables replace variables,
+        because the MIPS backend cannot use every constant as an operand.
+        """
+        match p:
+            case tac.Name(x):
+                q = self.copies.get(x)
+                return q if isinstance(q, tac.Name) else p
+            case tac.Const():
+                return p
+
+    def num(self, p: tac.prim) -> ValueNum:
+        match p:
+            case tac.Name(x):
+                q = self.copies.get(x, p)
+                match q:
+                    case tac.Name(y): return ('var', y.name)
+                    case tac.Const(c): return ('const', c)
+            case tac.Const(c):
+                return ('const', c)
+
+    def key(self, e: tac.exp) -> Optional[ValueKey]:
+        match e:
+            case tac.Prim():
+                return None
+            case tac.BinOp(p1, op, p2):
+                n1 = self.num(p1)
+                n2 = self.num(p2)
+                if op.name in _commutative and str(n2) < str(n1):
+                    (n1, n2) = (n2, n1)
+                return (op.name, n1, n2)
+            case tac.UnOp(op, p):
+                return (op.name, self.num(p))
+
+    def visitPhi(self, b: int, phi: Phi, added: list[ValueKey]) -> Optional[Phi]:
+        nums = {self.num(p) for p in phi.args.values()}
+        nums.discard(('var', phi.var.name))
+        if len(nums) == 1:
+            arg = next(p for p in phi.args.values() if self.num(p) in nums)
+            self.copies[phi.var] = self.copies.get(arg.var, arg) \
+                if isinstance(arg, tac.Name) else arg
+            self.stats.inc('phisRemoved')
+            return None
+        k: ValueKey = ('phi', str(b)) + tuple(str(self.num(phi.args[p])) for p in sorted(phi.args))
+        leader = self.table.get(k)
+        if leader is not None:
+            self.copies[phi.var] = tac.Name(leader)
+            self.stats.inc('phisRemoved')
+            return None
+        self.table[k] = phi.var
+        added.append(k)
+        return phi
+
+    def visitInstr(self, i: tac.instr, added: list[ValueKey]) -> tac.instr:
+        i = mapPrims(i, self.canon)
+        match i:
+            case tac.Assign(x, tac.Prim(p)):
+                self.copies[x] = self.copies.get(p.var, p) if isinstance(p, tac.Name) else p
+            case tac.Assign(x, e):
+                k = self.key(e)
+                if k is None:
+                    return i
+                leader = self.table.get(k)
+                if leader is not None:
+                    self.stats.inc('replaced')
+                    self.copies[x] = tac.Name(leader)
+                    return tac.Assign(x, tac.Prim(tac.Name(leader)))
+                self.table[k] = x
+                added.append(k)
+            case _:
+                pass
+        return i
+
+    def visitBlock(self, b: int) -> list[ValueKey]:
+        added: list[ValueKey] = []
+        phis = [self.visitPhi(b, phi, added) for phi in self.ssa.phis.get(b, [])]
+        bb = self.ssa.g.getData(b)
+        bb.instrs = [self.visitInstr(i, added) for i in bb.instrs]
+        self.ssa.phis[b] = [phi for phi in phis if phi is not None]
+        return added
+
+def gvn(ssa: SsaFun, stats: PassStats):
+    """
+    Runs global value numbering on a function in SSA form, modifying it in place.
+    """
+    idom = dominators.immediateDominators(ssa.g)
+    if not idom:
+        return
+    tree = dominators.dominatorTree(idom)
+    s = _Gvn(ssa, stats)
+    oldPhis = {b: list(phis) for b, phis in ssa.phis.items()}
+    todo: list[tuple[int, Optional[list[ValueKey]]]] = [(dominators.ENTRY, None)]
+    while todo:
+        (b, added) = todo.pop()
+        if added is not None:
+            for k in added:
+                del s.table[k]
+            continue
+        todo.append((b, s.visitBlock(b)))
+        for c in reversed(tree[b]):
+            todo.append((c, None))
+    # Operands of phi functions flow in from the end of the predecessors, so they are
+    # replaced only after all blocks have been visited. Phi functions that became copies
+    # are turned into assignments at the start of their block.
+    for b in ssa.g.vertices:
+        for phi in ssa.phis.get(b, []):
+            phi.args = {p: s.canon(arg) for p, arg in phi.args.items()}
+        bb = ssa.g.getData(b)
+        kept = ssa.phis.get(b, [])
+        removed = [phi for phi in oldPhis.get(b, []) if phi not in kept]
+        bb.instrs = [tac.Assign(phi.var, tac.Prim(s.copies[phi.var]))
+                     for phi in removed] + bb.instrs
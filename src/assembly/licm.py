@@ -0,0 +1,148 @@
+"""
+Loop-invariant code motion for TAC. The entry point is the function `licm`.
+
+Loops are found with `assembly.loops` and processed from the innermost to the
+outermost, so code hoisted out of an inner loop may be hoisted further out of the
+enclosing loop. An assignment x = e inside a loop is moved in front of the loop if
+
+- e is a binary or unary operation, whose operands are constants or variables not
+  assigned in the loop (or only by assignments already moved),
+- x is assigned only once in the loop,
+- x is live neither at the start of the loop header nor at any block reached when
+  leaving the loop (liveness from `assembly.bitLiveness`).
+
+Operations never trap, so they may be executed even if the loop body would not run.
+Calls, loads and accesses to globals stay in place.
+
+The hoisted code goes to the end of the only predecessor outside the loop if the
+header is its only successor. Otherwise, a new preheader block is created in front of
+the header and all jumps into the loop from outside are redirected to it.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.controlFlow as controlFlow
+import assembly.dominators as dominators
+import assembly.loops as loops
+import assembly.bitLiveness as bitLiveness
+
+type InstrId = tuple[int, int]
+
+def _defined(i: tac.instr) -> Optional[tac.ident]:
+    match i:
+        case tac.Assign(x) | tac.Load(x) | tac.GlobalGet(x):
+            return x
+        case tac.Call(x) | tac.CallIndirect(x):
+            return x
+        case _:
+            return None
+
+def _operands(e: tac.exp) -> list[tac.prim]:
+    match e:
+        case tac.Prim(p): return [p]
+        case tac.BinOp(p1, _, p2): return [p1, p2]
+        case tac.UnOp(_, p): return [p]
+
+def _invariants(g: ControlFlowGraph, loop: loops.Loop) -> list[InstrId]:
+    """
+    Returns the instructions of the loop that can be hoisted, in the order in which
+    they must be executed.
+    """
+    defs: dict[tac.ident, int] = {}
+    for b in loop.blocks:
+        for i in g.getData(b).instrs:
+            x = _defined(i)
+            if x is not None:
+                defs[x] = defs.get(x, 0) + 1
+    live = bitLiveness.analyze(g)
+    blocked = live.liveIn(loop.header)
+    for b in loop.blocks:
+        for s in g.succs(b):
+            if s not in loop.blocks:
+                blocked.update(live.liveIn(s))
+    hoisted: list[InstrId] = []
+    changed = True
+    while changed:
+        changed = False
+        for b in sorted(loop.blocks):
+            for k, i in enumerate(g.getData(b).instrs):
+                if (b, k) in hoisted:
+                    continue
+                match i:
+                    case tac.Assign(x, tac.BinOp() | tac.UnOp() as e):
+                        if defs[x] != 1 or x in blocked:
+                            continue
+                        if any(isinstance(p, tac.Name) and defs.get(p.var, 0) > 0
+                               for p in _operands(e)):
+                            continue
+                        hoisted.append((b, k))
+                        defs[x] = 0
+                        changed = True
+                    case _:
+                        pass
+    return hoisted
+
+def _hoist(g: ControlFlowGraph, loop: loops.Loop, stats: PassStats) -> Optional[list[tac.instr]]:
+    """
+    Hoists the invariant code out of the loop. Returns None if nothing changed.
+    """
+    header = g.getData(loop.header)
+    prev = loop.header - 1
+    if prev in loop.blocks:
+        last = g.getData(prev).last
+        if last is None or not controlFlow.endsBlock(last):
+            # A block of the loop falls through into the header
+            return None
+    ids = _invariants(g, loop)
+    if not ids:
+        return None
+    stats.inc('hoisted', len(ids))
+    hoisted = [g.getData(b).instrs[k] for (b, k) in ids]
+    skip = set(ids)
+    preds = dominators.predecessors(g)
+    outside = [p for p in preds[loop.header] if p not in loop.blocks]
+    target: Optional[int] = None
+    newLabel: Optional[str] = None
+    if len(outside) == 1 and g.succs(outside[0]) == [loop.header] and \
+            not isinstance(g.getData(outside[0]).last, tac.GotoIf):
+        target = outside[0]
+    else:
+        stats.inc('preheadersCreated')
+        newLabel = controlFlow.freshLabel(g, f'{header.labels[0]}_preheader')
+    res: list[tac.instr] = []
+    for b in sorted(g.vertices):
+        bb = g.getData(b)
+        instrs = [i for k, i in enumerate(bb.instrs) if (b, k) not in skip]
+        if newLabel is not None:
+            if b == loop.header:
+                res.append(tac.Label(newLabel))
+                res.extend(hoisted)
+            elif b not in loop.blocks:
+                instrs = [controlFlow.retarget(i, header.labels, newLabel) for i in instrs]
+        res.extend(tac.Label(l) for l in bb.labels)
+        if b == target:
+            if instrs and isinstance(instrs[-1], tac.Goto):
+                instrs = instrs[:-1] + hoisted + instrs[-1:]
+            else:
+                instrs = instrs + hoisted
+        res.extend(instrs)
+    return res
+
+def licm(instrs: list[tac.instr], stats: PassStats) -> list[tac.instr]:
+    # Loops are identified by the first label of their header, as block indices change
+    # whenever a preheader is inserted.
+    done: set[str] = set()
+    while True:
+        g = controlFlow.buildControlFlowGraph(instrs)
+        info = loops.loopInfo(g)
+        todo = [l for l in sorted(info.loops.values(), key=lambda l: (-l.depth, l.header))
+                if g.getData(l.header).labels and g.getData(l.header).labels[0] not in done]
+        if not todo:
+            return instrs
+        loop = todo[0]
+        done.add(g.getData(loop.header).labels[0])
+        stats.inc('loops')
+        newInstrs = _hoist(g, loop, stats)
+        if newInstrs is not None:
+            instrs = newInstrs
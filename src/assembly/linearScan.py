@@ -0,0 +1,167 @@
+"""
+Linear-scan register allocation with lifetime holes, in the style of Poletto and
+Sarkar. The entry point is the function `linearScanAlloc`. Unlike the allocators
+working on the interference graph, it never builds that graph and runs in nearly
+linear time.
+
+The blocks are linearized in the order in which the code is emitted, and the
+instruction with index k in this order gets two positions: its operands are read at
+position 2k and its result is written at position 2k+1. With the liveness information
+from `assembly.bitLiveness`, each variable gets a live interval, a sorted list of
+disjoint ranges of positions. The gaps between the ranges are the lifetime holes of
+the interval, for example a variable defined again after its last use in a loop.
+
+The intervals are visited in the order of their start positions. An interval is
+active if it covers the current position and inactive if the current position lies
+in one of its holes. The current interval gets a register neither used by an active
+interval nor by an inactive interval intersecting the current one. If no register is
+free, the interval ending last among the current and the active ones is spilled. A
+spilled variable lives on the stack for its whole lifetime.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.bitLiveness as bitLiveness
+import common.log as log
+import bisect
+
+class Interval:
+    def __init__(self, var: tac.ident):
+        self.var = var
+        # Disjoint ranges [start, end), sorted by start
+        self.ranges: list[tuple[int, int]] = []
+        self.reg: Optional[int] = None
+
+    def __repr__(self):
+        return f'Interval({self.var.name}, {self.ranges}, reg={self.reg})'
+
+    @property
+    def start(self) -> int:
+        return self.ranges[0][0]
+
+    @property
+    def end(self) -> int:
+        return self.ranges[-1][1]
+
+    def addRange(self, start: int, end: int):
+        """
+        Adds a range starting before all existing ranges.
+        """
+        if self.ranges and self.ranges[0][0] <= end:
+            self.ranges[0] = (min(start, self.ranges[0][0]), max(end, self.ranges[0][1]))
+        else:
+            self.ranges.insert(0, (start, end))
+
+    def setStart(self, pos: int):
+        """
+        Shortens the first range to start at the definition at pos. A definition without
+        any use gets a range of its own.
+        """
+        if not self.ranges or self.ranges[0][0] > pos:
+            self.ranges.insert(0, (pos, pos + 1))
+        else:
+            self.ranges[0] = (pos, self.ranges[0][1])
+
+    def covers(self, pos: int) -> bool:
+        k = bisect.bisect_right(self.ranges, (pos, float('inf'))) - 1
+        return k >= 0 and pos < self.ranges[k][1]
+
+    def intersects(self, other: 'Interval') -> bool:
+        i = 0
+        j = 0
+        while i < len(self.ranges) and j < len(other.ranges):
+            (s1, e1) = self.ranges[i]
+            (s2, e2) = other.ranges[j]
+            if s1 < e2 and s2 < e1:
+                return True
+            if e1 <= e2:
+                i += 1
+            else:
+                j += 1
+        return False
+
+def _bits(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def buildIntervals(g: ControlFlowGraph) -> list[Interval]:
+    """
+    Computes the live intervals of all variables, walking the blocks and their
+    instructions backwards.
+    """
+    live = bitLiveness.analyze(g)
+    order = sorted(g.vertices)
+    firsts: dict[int, int] = {}
+    k = 0
+    for b in order:
+        firsts[b] = k
+        k += len(g.getData(b).instrs)
+    intervals: dict[int, Interval] = {}
+    def interval(n: int) -> Interval:
+        if n not in intervals:
+            intervals[n] = Interval(live.idx.vars[n])
+        return intervals[n]
+    for b in reversed(order):
+        instrs = g.getData(b).instrs
+        blockStart = 2 * firsts[b]
+        blockEnd = 2 * (firsts[b] + len(instrs))
+        for n in _bits(live.liveOutMask(b)):
+            interval(n).addRange(blockStart, blockEnd)
+        for k in range(len(instrs) - 1, -1, -1):
+            pos = 2 * (firsts[b] + k)
+            (d, u) = bitLiveness.instrMasks(instrs[k], live.idx)
+            for n in _bits(d):
+                interval(n).setStart(pos + 1)
+            for n in _bits(u):
+                interval(n).addRange(blockStart, pos + 1)
+    return [intervals[n] for n in sorted(intervals)]
+
+def linearScan(intervals: list[Interval], maxRegs: int) -> int:
+    """
+    Assigns registers to the intervals. Returns the number of spilled intervals.
+    """
+    active: list[Interval] = []
+    inactive: list[Interval] = []
+    spilled = 0
+    for cur in sorted(intervals, key=lambda i: i.start):
+        pos = cur.start
+        for it in list(active):
+            if it.end <= pos:
+                active.remove(it)
+            elif not it.covers(pos):
+                active.remove(it)
+                inactive.append(it)
+        for it in list(inactive):
+            if it.end <= pos:
+                inactive.remove(it)
+            elif it.covers(pos):
+                inactive.remove(it)
+                active.append(it)
+        blocked = {it.reg for it in active}
+        for it in inactive:
+            if it.reg not in blocked and it.intersects(cur):
+                blocked.add(it.reg)
+        free = [r for r in range(maxRegs) if r not in blocked]
+        if free:
+            cur.reg = free[0]
+            active.append(cur)
+            continue
+        spilled += 1
+        candidates = [it for it in active if it.end > cur.end and
+                      not any(o.reg == it.reg and o.intersects(cur) for o in inactive)]
+        if candidates:
+            victim = max(candidates, key=lambda it: it.end)
+            cur.reg = victim.reg
+            victim.reg = None
+            active.remove(victim)
+            active.append(cur)
+    return spilled
+
+def linearScanAlloc(g: ControlFlowGraph, maxRegs: int) -> RegisterMap:
+    intervals = buildIntervals(g)
+    spilled = linearScan(intervals, maxRegs)
+    log.debug(f'Linear scan: {len(intervals)} intervals, {spilled} spilled')
+    return RegisterAllocMap({i.var: i.reg for i in intervals if i.reg is not None}, maxRegs)
@@ -0,0 +1,160 @@
+"""
+Live-range splitting at loop boundaries. The entry point is the function
+`splitLiveRanges`, which runs between the optimizations of `assembly.tacOpt` and
+register allocation.
+
+A variable used in a loop but live before or after it occupies a register along its
+whole live range, or it is spilled everywhere, including at every use in the loop. For
+each outermost loop found by `assembly.loops`, the pass renames such a variable x to a
+fresh variable x.L inside the loop, where L is the label of the loop header:
+
+- before the loop, x.L = x copies the value of x if x is live at the loop header,
+- at the start of each block reached when leaving the loop, x = x.L copies the value
+  back if x is assigned in the loop and live in that block.
+
+The allocator may now assign a register to x.L and spill x, paying a single load and
+store per execution of the loop instead of one per use in the loop. If x and x.L get
+the same register, the copies disappear. `assembly.tacToTacSpill` keeps the split
+program only if allocating it lowers the estimated spill cost.
+
+The copies before the loop go to the end of the only predecessor outside the loop if
+the header is its only successor, otherwise to a new preheader block, as in
+`assembly.licm`. Loops whose exit blocks are also reached from outside the loop are
+not split, as this would require new blocks on the exit edges.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.controlFlow as controlFlow
+import assembly.dominators as dominators
+import assembly.loops as loops
+import assembly.bitLiveness as bitLiveness
+import assembly.ssa as ssa
+
+def _loopVars(g: ControlFlowGraph, loop: loops.Loop) -> tuple[set[tac.ident], set[tac.ident]]:
+    """
+    Returns the variables occurring in the loop and the variables assigned in the loop.
+    """
+    occurring: set[tac.ident] = set()
+    assigned: set[tac.ident] = set()
+    for b in loop.blocks:
+        for i in g.getData(b).instrs:
+            x = ssa.instrDefs(i)
+            if x is not None:
+                assigned.add(x)
+            occurring.update(p.var for p in ssa.instrPrims(i) if isinstance(p, tac.Name))
+    return (occurring | assigned, assigned)
+
+def _fresh(names: set[str], base: str) -> tac.ident:
+    name = base
+    k = 0
+    while name in names:
+        k += 1
+        name = f'{base}.{k}'
+    names.add(name)
+    return tac.Ident(name)
+
+def _rename(i: tac.instr, renaming: dict[tac.ident, tac.ident]) -> tac.instr:
+    def renamePrim(p: tac.prim) -> tac.prim:
+        match p:
+            case tac.Name(x) if x in renaming:
+                return tac.Name(renaming[x])
+            case _:
+                return p
+    i = ssa.mapPrims(i, renamePrim)
+    x = ssa.instrDefs(i)
+    if x is not None and x in renaming:
+        i = ssa.setDef(i, renaming[x])
+    return i
+
+def _split(g: ControlFlowGraph, loop: loops.Loop, candidates: Optional[set[tac.ident]],
+           names: set[str], stats: PassStats) -> Optional[list[tac.instr]]:
+    """
+    Splits the live ranges of the variables of the loop. Returns None if nothing changed.
+    """
+    header = g.getData(loop.header)
+    prev = loop.header - 1
+    if prev in loop.blocks:
+        last = g.getData(prev).last
+        if last is None or not controlFlow.endsBlock(last):
+            # A block of the loop falls through into the header
+            return None
+    preds = dominators.predecessors(g)
+    exits = sorted({s for b in loop.blocks for s in g.succs(b) if s not in loop.blocks})
+    if any(p not in loop.blocks for s in exits for p in preds[s]):
+        stats.inc('loopsSkipped')
+        return None
+    live = bitLiveness.analyze(g)
+    (occurring, assigned) = _loopVars(g, loop)
+    liveAtEntry = live.liveIn(loop.header)
+    liveAtExit = {s: live.liveIn(s) for s in exits}
+    split = sorted((x for x in occurring if candidates is None or x in candidates
+                    if x in liveAtEntry or any(x in l for l in liveAtExit.values())),
+                   key=lambda x: x.name)
+    if not split:
+        return None
+    renaming = {x: _fresh(names, f'{x.name}.{header.labels[0]}') for x in split}
+    entryCopies: list[tac.instr] = [tac.Assign(renaming[x], tac.Prim(tac.Name(x)))
+                                    for x in split if x in liveAtEntry]
+    exitCopies = {s: [tac.Assign(x, tac.Prim(tac.Name(renaming[x])))
+                      for x in split if x in assigned and x in liveAtExit[s]]
+                  for s in exits}
+    stats.inc('split', len(split))
+    stats.inc('copies', len(entryCopies) + sum(len(cs) for cs in exitCopies.values()))
+    outside = [p for p in preds[loop.header] if p not in loop.blocks]
+    target: Optional[int] = None
+    newLabel: Optional[str] = None
+    if len(outside) == 1 and g.succs(outside[0]) == [loop.header] and \
+            not isinstance(g.getData(outside[0]).last, tac.GotoIf):
+        target = outside[0]
+    elif entryCopies:
+        stats.inc('preheadersCreated')
+        newLabel = controlFlow.freshLabel(g, f'{header.labels[0]}_preheader')
+    res: list[tac.instr] = []
+    for b in sorted(g.vertices):
+        bb = g.getData(b)
+        instrs = bb.instrs
+        if b in loop.blocks:
+            instrs = [_rename(i, renaming) for i in instrs]
+        if newLabel is not None:
+            if b == loop.header:
+                res.append(tac.Label(newLabel))
+                res.extend(entryCopies)
+            elif b not in loop.blocks:
+                instrs = [controlFlow.retarget(i, header.labels, newLabel) for i in instrs]
+        res.extend(tac.Label(l) for l in bb.labels)
+        if b in exitCopies:
+            instrs = exitCopies[b] + instrs
+        if b == target:
+            if instrs and isinstance(instrs[-1], tac.Goto):
+                instrs = instrs[:-1] + entryCopies + instrs[-1:]
+            else:
+                instrs = instrs + entryCopies
+        res.extend(instrs)
+    return res
+
+def splitLiveRanges(instrs: list[tac.instr], stats: PassStats,
+                    candidates: Optional[set[tac.ident]] = None) -> list[tac.instr]:
+    """
+    Splits the live ranges of the variables in candidates, or of all variables if
+    candidates is None, at the boundaries of the outermost loops.
+    """
+    names = {x.name for i in instrs for x in [ssa.instrDefs(i)] if x is not None}
+    names.update(p.var.name for i in instrs for p in ssa.instrPrims(i)
+                 if isinstance(p, tac.Name))
+    # As in assembly.licm, loops are identified by the first label of their header.
+    done: set[str] = set()
+    while True:
+        g = controlFlow.buildControlFlowGraph(instrs)
+        info = loops.loopInfo(g)
+        todo = [info.loops[h] for h in info.roots
+                if g.getData(h).labels and g.getData(h).labels[0] not in done]
+        if not todo:
+            return instrs
+        loop = todo[0]
+        done.add(g.getData(loop.header).labels[0])
+        stats.inc('loops')
+        newInstrs = _split(g, loop, candidates, names, stats)
+        if newInstrs is not None:
+            instrs = newInstrs
@@ -1,27 +1,37 @@
 """
-This module defines a function `loopToTac` that translates to L_loop program
-from a file to TAC.
+This module translates programs from a file to TAC. The function `fileToTac` compiles
+a program of any language with a wasm compiler and translates the whole wasm module
+to a TAC program. The function `loopToTac` translates an L_loop program and returns
+only the instructions of its main function.
 """
 from typing import *
 from assembly.common import *
 from common.compilerSupport import *
-import assembly.wasmToTac as wasmToTac
 from assembly.tac_ast import *
 import common.log as log
 import common.genericCompiler as genCompiler
 import assembly.wasmToTac as wasmToTac
+import assembly.tacRuntime as tacRuntime
 import common.sexp as sexp
 import common.utils as utils
 
-def loopToTac(args: genCompiler.Args) -> list[tac.instr]:
-    c = utils.importModuleNotInStudent('compilers.lang_loop.loop_compiler')
-    import lang_loop.loop_ast as ast
+def fileToTac(args: genCompiler.Args, lang: str = 'loop') -> tac.program:
+    try:
+        c = utils.importModuleNotInStudent(f'compilers.lang_{lang}.{lang}_compiler')
+    except ModuleNotFoundError:
+        utils.abort(f'No wasm compiler for language {lang}, cannot generate TAC')
+    ast = utils.importModuleNotInStudent(f'lang_{lang}.{lang}_ast')
     log.debug(f'Generating TAC from {args.input}')
     wasmMod = genCompiler.compileMain(args, c.compileModule, ast)
-    wasmInstrs = wasmMod.funcs[0].instrs
     wasmCode = sexp.renderSExp(wasmMod.render())
     log.debug('Wasm instructions:\n' + wasmCode)
-    (res, tacInstrs) = wasmToTac.wasmToTac(wasmToTac.downcast(wasmInstrs))
-    if res is not None:
-        raise ValueError(f'Value returned from tac.toTac is not None: {res}')
-    return tacInstrs
+    return wasmToTac.moduleToTac(wasmMod)
+
+def mainFun(prog: tac.program) -> tac.Fun:
+    for f in prog.funs:
+        if f.name == tacRuntime.MAIN_FUN:
+            return f
+    raise ValueError(f'TAC program does not define function {tacRuntime.MAIN_FUN.name}')
+
+def loopToTac(args: genCompiler.Args) -> list[tac.instr]:
+    return mainFun(fileToTac(args, 'loop')).body
@@ -0,0 +1,112 @@
+"""
+Loop analysis for control flow graphs built by `assembly.controlFlow`. The function
+`loopInfo` returns the loops of a graph, caching the result on the graph.
+
+An edge b -> h is a back edge if h dominates b (see `assembly.dominators`). The natural
+loop of a back edge consists of h and all blocks that reach b without passing through
+h. Natural loops with the same header are merged into a single loop. Two loops are
+either disjoint or one is nested in the other, so the loops form a forest. The loop
+depth of a block is the number of loops containing it, 0 for blocks outside of any
+loop.
+
+Edges to blocks not dominating their source (as in irreducible control flow) do not
+form loops.
+"""
+
+from typing import *
+from dataclasses import dataclass, field
+from assembly.common import *
+import assembly.dominators as dominators
+
+@dataclass
+class Loop:
+    header: int
+    blocks: set[int]
+    # Sources of the back edges to the header
+    latches: list[int]
+    # Header of the enclosing loop
+    parent: Optional[int] = None
+    # Headers of the loops directly nested in this loop
+    children: list[int] = field(default_factory=list[int])
+    depth: int = 1
+
+@dataclass
+class LoopInfo:
+    idom: dict[int, int]
+    backEdges: list[tuple[int, int]]
+    # All loops, indexed by their header
+    loops: dict[int, Loop]
+    # Headers of the outermost loops
+    roots: list[int]
+    # Header of the innermost loop containing each block inside a loop
+    innermost: dict[int, int]
+
+    def depth(self, b: int) -> int:
+        h = self.innermost.get(b)
+        return self.loops[h].depth if h is not None else 0
+
+    def loopOf(self, b: int) -> Optional[Loop]:
+        """
+        Returns the innermost loop containing block b.
+        """
+        h = self.innermost.get(b)
+        return self.loops[h] if h is not None else None
+
+    def isHeader(self, b: int) -> bool:
+        return b in self.loops
+
+def idomCached(g: ControlFlowGraph) -> dict[int, int]:
+    return g.cached('idom', lambda: dominators.immediateDominators(g))
+
+def _naturalLoop(header: int, latches: list[int], preds: dict[int, list[int]],
+                 reachable: dict[int, int]) -> set[int]:
+    blocks = {header}
+    worklist = [b for b in latches if b not in blocks]
+    blocks.update(worklist)
+    while worklist:
+        b = worklist.pop()
+        for p in preds[b]:
+            if p not in blocks and p in reachable:
+                blocks.add(p)
+                worklist.append(p)
+    return blocks
+
+def _computeLoopInfo(g: ControlFlowGraph) -> LoopInfo:
+    idom = idomCached(g)
+    backEdges: list[tuple[int, int]] = []
+    for b in sorted(idom):
+        for s in sorted(g.succs(b)):
+            if dominators.dominates(idom, s, b):
+                backEdges.append((b, s))
+    latches: dict[int, list[int]] = {}
+    for (b, h) in backEdges:
+        latches.setdefault(h, []).append(b)
+    preds = dominators.predecessors(g)
+    loops = {h: Loop(h, _naturalLoop(h, ls, preds, idom), ls) for h, ls in latches.items()}
+    # Process loops from the innermost to the outermost. The parent of a loop is the
+    # smallest other loop containing its header.
+    bySize = sorted(loops.values(), key=lambda l: (len(l.blocks), l.header))
+    for k, l in enumerate(bySize):
+        for outer in bySize[k+1:]:
+            if l.header in outer.blocks:
+                l.parent = outer.header
+                outer.children.append(l.header)
+                break
+    roots = [l.header for l in bySize if l.parent is None]
+    # Assign depths from the outermost loops inwards
+    for l in reversed(bySize):
+        if l.parent is not None:
+            l.depth = loops[l.parent].depth + 1
+    innermost: dict[int, int] = {}
+    for l in reversed(bySize):
+        for b in l.blocks:
+            innermost[b] = l.header
+    for l in loops.values():
+        l.children.sort()
+    return LoopInfo(idom, backEdges, loops, sorted(roots), innermost)
+
+def loopInfo(g: ControlFlowGraph) -> LoopInfo:
+    """
+    Returns the loops of the graph. The result is cached on the graph.
+    """
+    return g.cached('loops', lambda: _computeLoopInfo(g))
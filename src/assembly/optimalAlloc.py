@@ -0,0 +1,211 @@
+"""
+Register allocation with minimal spill cost, for small and medium functions. The entry
+point is the function `optimalAlloc`, the search itself is done by `minCostColoring`.
+
+Spilling a set S of variables costs the sum of the spill costs of its variables, see
+`assembly.briggs.spillCosts`. The allocator looks for a set S of minimal cost such that
+the interference graph without S can be colored with K registers. This problem is
+NP-hard, so the search is exact but bounded by a time budget:
+
+- Variables with fewer than K neighbours are removed from the graph, as in the simplify
+  phase of `assembly.briggs`, until all remaining variables have K or more neighbours.
+  The removed variables always get a register afterwards, so only the remaining core
+  needs to be searched. Each connected component of the core is searched on its own.
+- The search is a branch and bound in the style of DSatur: the next variable is the one
+  with the most distinct colors among its neighbours (its saturation), and it is
+  either given one of these colors or spilled. Only the lowest color not used so far
+  is tried as a new color, as all unused colors are interchangeable. A variable whose
+  neighbours use all K colors must be spilled, so the costs of all such variables are a
+  lower bound for the remaining search. The first branches taken yield the greedy
+  DSatur coloring, which serves as the initial bound.
+
+If the budget runs out before the search is complete, the allocation of
+`assembly.briggs` is used, unless the search has already found a cheaper one.
+"""
+
+from typing import *
+from dataclasses import dataclass
+from assembly.common import *
+import assembly.briggs as briggs
+import common.log as log
+import time
+
+# Time budget of the search in seconds
+DEFAULT_BUDGET = 1.0
+
+# Components of the core with more variables are not searched. The search recurses once
+# per variable of a component.
+MAX_SEARCH_SIZE = 500
+
+class _Timeout(Exception):
+    pass
+
+@dataclass
+class Coloring[V]:
+    colors: dict[V, int]
+    spilled: set[V]
+    cost: float
+    # True if the search was completed, so the cost is minimal
+    optimal: bool
+    # Number of nodes of the search tree visited
+    nodes: int
+
+class _Search[V]:
+    def __init__(self, vertices: list[V], adj: dict[V, set[V]], costs: dict[V, float],
+                 maxRegs: int, deadline: float):
+        self.vertices = vertices
+        self.adj = adj
+        self.costs = costs
+        self.maxRegs = maxRegs
+        self.deadline = deadline
+        self.colors: dict[V, int] = {}
+        self.spilled: set[V] = set()
+        # For each variable and color, the number of neighbours with this color
+        self.neighbourColors = {x: [0] * maxRegs for x in vertices}
+        self.saturation = {x: 0 for x in vertices}
+        # Cost of the variables with saturation K not yet spilled
+        self.forcedCost = sum(costs.get(x, 0) for x in vertices) if maxRegs == 0 else 0.0
+        self.bestCost = float('inf')
+        self.best: Optional[tuple[dict[V, int], set[V]]] = None
+        self.nodes = 0
+
+    def _setColor(self, x: V, c: int, delta: int):
+        for y in self.adj[x]:
+            if y in self.colors or y in self.spilled:
+                continue
+            counts = self.neighbourColors[y]
+            counts[c] += delta
+            if delta > 0 and counts[c] == 1:
+                self.saturation[y] += 1
+                if self.saturation[y] == self.maxRegs:
+                    self.forcedCost += self.costs.get(y, 0)
+            elif delta < 0 and counts[c] == 0:
+                self.saturation[y] -= 1
+                if self.saturation[y] == self.maxRegs - 1:
+                    self.forcedCost -= self.costs.get(y, 0)
+
+    def _next(self) -> Optional[V]:
+        best: Optional[V] = None
+        bestKey = (-1, -1)
+        for x in self.vertices:
+            if x in self.colors or x in self.spilled:
+                continue
+            key = (self.saturation[x], len(self.adj[x]))
+            if key > bestKey:
+                best = x
+                bestKey = key
+        return best
+
+    def search(self, cost: float, usedColors: int):
+        self.nodes += 1
+        if self.nodes % 1024 == 0 and time.monotonic() > self.deadline:
+            raise _Timeout()
+        if cost + self.forcedCost >= self.bestCost:
+            return
+        x = self._next()
+        if x is None:
+            self.bestCost = cost
+            self.best = (dict(self.colors), set(self.spilled))
+            return
+        counts = self.neighbourColors[x]
+        forced = self.saturation[x] == self.maxRegs
+        for c in range(min(usedColors + 1, self.maxRegs)):
+            if counts[c] == 0:
+                self.colors[x] = c
+                self._setColor(x, c, 1)
+                self.search(cost, max(usedColors, c + 1))
+                self._setColor(x, c, -1)
+                del self.colors[x]
+        if forced:
+            self.forcedCost -= self.costs.get(x, 0)
+        self.spilled.add(x)
+        self.search(cost + self.costs.get(x, 0), usedColors)
+        self.spilled.remove(x)
+        if forced:
+            self.forcedCost += self.costs.get(x, 0)
+
+def _components[V](vertices: Iterable[V], adj: dict[V, set[V]]) -> list[list[V]]:
+    seen: set[V] = set()
+    res: list[list[V]] = []
+    for x in vertices:
+        if x in seen:
+            continue
+        seen.add(x)
+        comp = [x]
+        k = 0
+        while k < len(comp):
+            for y in adj[comp[k]]:
+                if y not in seen:
+                    seen.add(y)
+                    comp.append(y)
+            k += 1
+        res.append(comp)
+    return res
+
+def minCostColoring[V](adj: dict[V, set[V]], costs: dict[V, float], maxRegs: int,
+                       budget: float = DEFAULT_BUDGET) -> Coloring[V]:
+    """
+    Colors the graph given by adj with maxRegs colors, spilling vertices of minimal total
+    cost. If the budget (in seconds) runs out, the result is the best coloring found so
+    far. Components of the core too large to be searched, or for which not even the
+    first coloring was found in time, are spilled completely.
+    """
+    deadline = time.monotonic() + budget
+    degree = {x: len(ys) for x, ys in adj.items()}
+    removed: set[V] = set()
+    stack = [x for x in adj if degree[x] < maxRegs]
+    order: list[V] = []
+    while stack:
+        x = stack.pop()
+        if x in removed:
+            continue
+        removed.add(x)
+        order.append(x)
+        for y in adj[x]:
+            if y not in removed:
+                degree[y] -= 1
+                if degree[y] == maxRegs - 1:
+                    stack.append(y)
+    core = [x for x in adj if x not in removed]
+    colors: dict[V, int] = {}
+    spilled: set[V] = set()
+    optimal = True
+    nodes = 0
+    coreAdj = {x: adj[x] - removed for x in core}
+    for comp in _components(core, coreAdj):
+        s = _Search(comp, coreAdj, costs, maxRegs, deadline)
+        if len(comp) > MAX_SEARCH_SIZE:
+            optimal = False
+        else:
+            try:
+                s.search(0.0, 0)
+            except _Timeout:
+                optimal = False
+        nodes += s.nodes
+        if s.best is None:
+            # Not even the first dive finished, spill the whole component
+            spilled.update(comp)
+        else:
+            colors.update(s.best[0])
+            spilled.update(s.best[1])
+    for x in reversed(order):
+        taken = {colors[y] for y in adj[x] if y in colors}
+        colors[x] = min(c for c in range(maxRegs) if c not in taken)
+    cost = sum(costs.get(x, 0) for x in spilled)
+    return Coloring(colors, spilled, cost, optimal, nodes)
+
+def optimalAlloc(g: ControlFlowGraph, interfG: InterfGraph, maxRegs: int,
+                 budget: float = DEFAULT_BUDGET) -> RegisterMap:
+    costs = briggs.spillCosts(g)
+    adj = {x: set(interfG.succs(x)) for x in interfG.vertices}
+    res = minCostColoring(adj, costs, maxRegs, budget)
+    log.info(f'Optimal allocation: spill cost {res.cost} for {len(res.spilled)} variables, ' \
+             f'{res.nodes} nodes searched, optimal={res.optimal}')
+    if res.optimal:
+        return RegisterAllocMap(res.colors, maxRegs)
+    heuristic = briggs.briggsAlloc(g, interfG, maxRegs)
+    heuristicCost = sum(costs.get(x, 0) for x in adj if heuristic.resolve(x) is None)
+    if heuristicCost <= res.cost:
+        log.info(f'Time budget of {budget}s exceeded, using the Briggs allocation')
+        return heuristic
+    return RegisterAllocMap(res.colors, maxRegs)
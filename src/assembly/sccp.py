@@ -0,0 +1,193 @@
+"""
+Sparse conditional constant propagation for functions in SSA form (see `assembly.ssa`).
+The entry point is the function `sccp`. The algorithm follows Wegman and Zadeck,
+"Constant Propagation with Conditional Branches".
+
+Each SSA variable has a lattice value: not yet known (no entry in the value map), a
+constant, or overdefined (None). Only blocks reachable through executable edges are
+evaluated, and phi functions only consider values flowing in through executable
+edges. Whenever the value of a variable changes, the executable blocks using the
+variable are evaluated again. As every variable is defined only once, a single map
+describes the values in the whole function, which makes the analysis sparse compared
+to `assembly.constProp`.
+
+Afterwards, constant variables are replaced by their values, with the same
+restrictions as in `assembly.constProp`, and blocks never executed are removed.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.constProp as constProp
+import assembly.dominators as dominators
+import assembly.tacRuntime as tacRuntime
+from assembly.graph import Graph
+from assembly.ssa import SsaFun, Phi, ENTRY_PRED, instrDefs, instrPrims
+
+# Lattice values of the variables: a missing entry means not yet known, None means
+# overdefined.
+type Values = dict[tac.ident, Optional[int]]
+
+_UNKNOWN = 'unknown'
+
+def _meet(v1: Optional[int] | str, v2: Optional[int] | str) -> Optional[int] | str:
+    if v1 == _UNKNOWN:
+        return v2
+    if v2 == _UNKNOWN:
+        return v1
+    return v1 if v1 == v2 else None
+
+class _Sccp:
+    def __init__(self, ssa: SsaFun):
+        self.ssa = ssa
+        self.values: Values = {}
+        self.execEdges: set[tuple[int, int]] = set()
+        self.execBlocks: set[int] = set()
+        self.work: list[int] = []
+        self.defined: set[tac.ident] = set()
+        self.useBlocks: dict[tac.ident, set[int]] = {}
+        self.labels: dict[str, int] = {}
+        for b in ssa.g.vertices:
+            bb = ssa.g.getData(b)
+            for l in bb.labels:
+                self.labels[l] = b
+            for phi in ssa.phis.get(b, []):
+                self.defined.add(phi.var)
+                for p in phi.args.values():
+                    self.addUse(p, b)
+            for i in bb.instrs:
+                x = instrDefs(i)
+                if x is not None:
+                    self.defined.add(x)
+                for p in instrPrims(i):
+                    self.addUse(p, b)
+
+    def addUse(self, p: tac.prim, b: int):
+        if isinstance(p, tac.Name):
+            self.useBlocks.setdefault(p.var, set()).add(b)
+
+    def prim(self, p: tac.prim) -> Optional[int] | str:
+        match p:
+            case tac.Const(c):
+                return c
+            case tac.Name(x):
+                if x not in self.defined:
+                    # Parameters and initial values of locals
+                    return None
+                return self.values.get(x, _UNKNOWN)
+
+    def exp(self, e: tac.exp) -> Optional[int] | str:
+        match e:
+            case tac.Prim(p):
+                return self.prim(p)
+            case tac.BinOp(p1, op, p2):
+                v1 = self.prim(p1)
+                v2 = self.prim(p2)
+                f = tacRuntime.binOps.get(op.name)
+                if v1 is None or v2 is None or f is None:
+                    return None
+                if isinstance(v1, str) or isinstance(v2, str):
+                    return _UNKNOWN
+                return constProp.fitsImm(f(v1, v2))
+            case tac.UnOp(op, p):
+                v = self.prim(p)
+                f = tacRuntime.unOps.get(op.name)
+                if v is None or f is None:
+                    return None
+                if isinstance(v, str):
+                    return _UNKNOWN
+                return constProp.fitsImm(f(v))
+
+    def setValue(self, x: tac.ident, v: Optional[int] | str):
+        old = self.values.get(x, _UNKNOWN)
+        new = _meet(old, v)
+        if new == old or isinstance(new, str):
+            return
+        self.values[x] = new
+        for b in self.useBlocks.get(x, set()):
+            if b in self.execBlocks:
+                self.work.append(b)
+
+    def markEdge(self, src: int, tgt: int):
+        if (src, tgt) in self.execEdges:
+            return
+        self.execEdges.add((src, tgt))
+        self.execBlocks.add(tgt)
+        self.work.append(tgt)
+
+    def evalPhi(self, b: int, phi: Phi):
+        v: Optional[int] | str = _UNKNOWN
+        for p, arg in phi.args.items():
+            if (p, b) in self.execEdges:
+                v = _meet(v, self.prim(arg))
+        self.setValue(phi.var, v)
+
+    def evalBlock(self, b: int):
+        bb = self.ssa.g.getData(b)
+        for phi in self.ssa.phis.get(b, []):
+            self.evalPhi(b, phi)
+        for i in bb.instrs:
+            match i:
+                case tac.Assign(x, e):
+                    self.setValue(x, self.exp(e))
+                case _:
+                    x = instrDefs(i)
+                    if x is not None:
+                        self.setValue(x, None)
+        for s in self.feasibleSuccs(bb):
+            self.markEdge(b, s)
+
+    def feasibleSuccs(self, bb: BasicBlock) -> list[int]:
+        succs = self.ssa.g.succs(bb.index)
+        match bb.last:
+            case tac.GotoIf(test, label):
+                v = self.prim(test)
+                if v is None:
+                    return succs
+                if isinstance(v, str):
+                    return []
+                target = self.labels[label]
+                if v != 0:
+                    return [target]
+                return [s for s in succs if s != target or s == bb.index + 1]
+            case _:
+                return succs
+
+    def run(self):
+        self.markEdge(ENTRY_PRED, dominators.ENTRY)
+        while self.work:
+            self.evalBlock(self.work.pop())
+
+def sccp(ssa: SsaFun, stats: PassStats):
+    """
+    Runs sparse conditional constant propagation on a function in SSA form, modifying it
+    in place.
+    """
+    s = _Sccp(ssa)
+    if ssa.g.hasVertex(dominators.ENTRY):
+        s.run()
+    consts: constProp.ConstEnv = {x: v for x, v in s.values.items() if v is not None}
+    for b in sorted(ssa.g.vertices):
+        if b not in s.execBlocks:
+            stats.inc('blocksRemoved')
+            continue
+        bb = ssa.g.getData(b)
+        newInstrs: list[tac.instr] = []
+        for i in bb.instrs:
+            newI = constProp.rewriteInstr(i, consts, stats)
+            if newI is not None:
+                newInstrs.append(newI)
+        bb.instrs = newInstrs
+        phis: list[Phi] = []
+        for phi in ssa.phis.get(b, []):
+            args = {p: constProp.rewritePrim(arg, consts)
+                    for p, arg in phi.args.items() if (p, b) in s.execEdges}
+            phis.append(Phi(phi.var, args))
+        ssa.phis[b] = phis
+    g = Graph[int, BasicBlock]('directed')
+    for b in sorted(s.execBlocks):
+        g.addVertex(b, ssa.g.getData(b))
+    for (src, tgt) in sorted(s.execEdges):
+        if src != ENTRY_PRED:
+            g.addEdge(src, tgt)
+    ssa.g = g
@@ -0,0 +1,382 @@
+"""
+Static single assignment (SSA) form for TAC functions. The function `toSsa` translates
+the control flow graph of a function into SSA form, `fromSsa` translates it back to a
+list of TAC instructions.
+
+In SSA form, every variable is assigned at most once. The i-th definition of a variable
+x is renamed to x.i. The variable x itself denotes the value of x at the start of the
+function, that is, the value of a parameter or the initial value of a local. At join
+points, phi functions select the value depending on the predecessor block from which
+control arrives. Phi functions are placed with dominance frontiers, see the paper by
+Cytron et al., "Efficiently Computing Static Single Assignment Form and the Control
+Dependence Graph". As in the semi-pruned SSA form of Briggs et al., variables only
+used in the block defining them do not get phi functions.
+
+To translate out of SSA form, every predecessor assigns the value for a phi function
+x.i to x.i before leaving the block. This is not possible if the predecessor has other
+successors, where x.i might still be live, or if another phi function of the same
+block reads x.i. In these cases, the predecessors assign a fresh variable x.i.in
+instead, and the block of the phi function starts by copying x.i.in to x.i. As x.i.in
+is only read at the start of this block, assigning it on edges to other blocks does
+no harm. Finally, versions of the same variable that do not interfere are renamed back
+to a common name, which turns many of the copies into self copies.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from dataclasses import dataclass, field
+from assembly.common import *
+from assembly.graph import Graph
+import assembly.dominators as dominators
+import assembly.controlFlow as controlFlow
+import assembly.bitLiveness as bitLiveness
+
+# Predecessor of the entry block standing for the start of the function
+ENTRY_PRED = -1
+
+@dataclass
+class Phi:
+    var: tac.ident
+    # Maps the index of each predecessor block to the value flowing in from this block
+    args: dict[int, tac.prim]
+
+@dataclass
+class SsaFun:
+    # The blocks reachable from the entry, with instructions in SSA form
+    g: ControlFlowGraph
+    phis: dict[int, list[Phi]]
+    names: set[str]
+    # Maps each variable introduced by the translation to the variable it renames
+    origins: dict[tac.ident, tac.ident] = field(default_factory=dict[tac.ident, tac.ident])
+    def origin(self, x: tac.ident) -> tac.ident:
+        return self.origins.get(x, x)
+    def fresh(self, base: str, k: int = 0) -> tac.ident:
+        """
+        Returns a new variable named base.k, trying increasing values of k. If k is 0,
+        the name base itself is tried first.
+        """
+        name = base if k == 0 else f'{base}.{k}'
+        while name in self.names:
+            k += 1
+            name = f'{base}.{k}'
+        self.names.add(name)
+        return tac.Ident(name)
+
+def instrDefs(i: tac.instr) -> Optional[tac.ident]:
+    """
+    Returns the variable defined by an instruction.
+    """
+    match i:
+        case tac.Assign(x) | tac.Load(x) | tac.GlobalGet(x):
+            return x
+        case tac.Call(x) | tac.CallIndirect(x):
+            return x
+        case _:
+            return None
+
+def instrPrims(i: tac.instr) -> list[tac.prim]:
+    """
+    Returns the operands read by an instruction.
+    """
+    match i:
+        case tac.Assign(_, tac.Prim(p)):
+            return [p]
+        case tac.Assign(_, tac.BinOp(p1, _, p2)):
+            return [p1, p2]
+        case tac.Assign(_, tac.UnOp(_, p)):
+            return [p]
+        case tac.Call(_, _, args):
+            return args
+        case tac.CallIndirect(_, idx, args):
+            return [idx] + args
+        case tac.GotoIf(p) | tac.Load(_, _, p) | tac.GlobalSet(_, p):
+            return [p]
+        case tac.Store(_, addr, value):
+            return [addr, value]
+        case tac.Return(value):
+            return [value] if value is not None else []
+        case tac.Goto() | tac.Label() | tac.GlobalGet() | tac.Trap():
+            return []
+
+def mapPrims(i: tac.instr, f: Callable[[tac.prim], tac.prim]) -> tac.instr:
+    """
+    Applies f to all operands read by an instruction.
+    """
+    match i:
+        case tac.Assign(x, tac.Prim(p)):
+            return tac.Assign(x, tac.Prim(f(p)))
+        case tac.Assign(x, tac.BinOp(p1, op, p2)):
+            return tac.Assign(x, tac.BinOp(f(p1), op, f(p2)))
+        case tac.Assign(x, tac.UnOp(op, p)):
+            return tac.Assign(x, tac.UnOp(op, f(p)))
+        case tac.Call(x, name, args):
+            return tac.Call(x, name, [f(a) for a in args])
+        case tac.CallIndirect(x, idx, args):
+            return tac.CallIndirect(x, f(idx), [f(a) for a in args])
+        case tac.GotoIf(p, label):
+            return tac.GotoIf(f(p), label)
+        case tac.Load(x, size, addr):
+            return tac.Load(x, size, f(addr))
+        case tac.Store(size, addr, value):
+            return tac.Store(size, f(addr), f(value))
+        case tac.GlobalSet(glob, value):
+            return tac.GlobalSet(glob, f(value))
+        case tac.Return(value):
+            return tac.Return(f(value) if value is not None else None)
+        case tac.Goto() | tac.Label() | tac.GlobalGet() | tac.Trap():
+            return i
+
+def setDef(i: tac.instr, x: tac.ident) -> tac.instr:
+    """
+    Replaces the variable defined by an instruction with x.
+    """
+    match i:
+        case tac.Assign(_, e):
+            return tac.Assign(x, e)
+        case tac.Load(_, size, addr):
+            return tac.Load(x, size, addr)
+        case tac.GlobalGet(_, glob):
+            return tac.GlobalGet(x, glob)
+        case tac.Call(_, name, args):
+            return tac.Call(x, name, args)
+        case tac.CallIndirect(_, idx, args):
+            return tac.CallIndirect(x, idx, args)
+        case _:
+            raise ValueError(f'Instruction does not define a variable: {i}')
+
+def reachableSubgraph(g: ControlFlowGraph, blocks: Iterable[int]) -> ControlFlowGraph:
+    """
+    Returns the subgraph of g with the given blocks and the edges between them.
+    """
+    keep = set(blocks)
+    res = Graph[int, BasicBlock]('directed')
+    for v in sorted(keep):
+        bb = g.getData(v)
+        res.addVertex(v, BasicBlock(list(bb.instrs), v, list(bb.labels)))
+    for v in sorted(keep):
+        for s in g.succs(v):
+            if s in keep:
+                res.addEdge(v, s)
+    return res
+
+def _globalNames(g: ControlFlowGraph) -> set[tac.ident]:
+    """
+    Returns the variables used in some block before being defined in this block. Only
+    these variables may be live at the start of a block.
+    """
+    res: set[tac.ident] = set()
+    for bb in g.values:
+        defined: set[tac.ident] = set()
+        for i in bb.instrs:
+            res.update(p.var for p in instrPrims(i)
+                       if isinstance(p, tac.Name) and p.var not in defined)
+            x = instrDefs(i)
+            if x is not None:
+                defined.add(x)
+    return res
+
+def _placePhis(g: ControlFlowGraph, df: dict[int, set[int]]) -> dict[int, list[tac.ident]]:
+    globalNames = _globalNames(g)
+    defBlocks: dict[tac.ident, set[int]] = {}
+    for v in g.vertices:
+        for i in g.getData(v).instrs:
+            x = instrDefs(i)
+            if x is not None and x in globalNames:
+                defBlocks.setdefault(x, {dominators.ENTRY}).add(v)
+    phiVars: dict[int, list[tac.ident]] = {v: [] for v in g.vertices}
+    for x in sorted(defBlocks, key=lambda x: x.name):
+        hasPhi: set[int] = set()
+        worklist = list(defBlocks[x])
+        while worklist:
+            b = worklist.pop()
+            for d in df[b]:
+                if d not in hasPhi:
+                    hasPhi.add(d)
+                    phiVars[d].append(x)
+                    if d not in defBlocks[x]:
+                        worklist.append(d)
+    return phiVars
+
+def _allNames(instrs: list[tac.instr]) -> set[str]:
+    names: set[str] = set()
+    for i in instrs:
+        x = instrDefs(i)
+        if x is not None:
+            names.add(x.name)
+        names.update(p.var.name for p in instrPrims(i) if isinstance(p, tac.Name))
+    return names
+
+def toSsa(g: ControlFlowGraph) -> SsaFun:
+    """
+    Translates the control flow graph of a function into SSA form. Unreachable blocks
+    are dropped.
+    """
+    idom = dominators.immediateDominators(g)
+    g = reachableSubgraph(g, idom.keys())
+    df = dominators.dominanceFrontiers(g, idom)
+    tree = dominators.dominatorTree(idom)
+    names = _allNames([i for bb in g.values for i in bb.instrs])
+    ssa = SsaFun(g, {}, names)
+    phiVars = _placePhis(g, df)
+    # The original variable of each phi
+    phiOrig: dict[int, list[tac.ident]] = {}
+    for v, xs in phiVars.items():
+        ssa.phis[v] = [Phi(x, {}) for x in xs]
+        phiOrig[v] = xs
+    stacks: dict[tac.ident, list[tac.ident]] = {}
+    def current(x: tac.ident) -> tac.ident:
+        s = stacks.get(x)
+        return s[-1] if s else x
+    def rename(p: tac.prim) -> tac.prim:
+        match p:
+            case tac.Name(x): return tac.Name(current(x))
+            case tac.Const(): return p
+    counters: dict[tac.ident, int] = {}
+    def push(x: tac.ident, pushed: list[tac.ident]) -> tac.ident:
+        newX = ssa.fresh(x.name, counters.get(x, 0) + 1)
+        ssa.origins[newX] = x
+        counters[x] = int(newX.name.rsplit('.', 1)[1])
+        stacks.setdefault(x, []).append(newX)
+        pushed.append(x)
+        return newX
+    for (phi, x) in zip(ssa.phis.get(dominators.ENTRY, []), phiOrig.get(dominators.ENTRY, [])):
+        phi.args[ENTRY_PRED] = tac.Name(x)
+    # Rename in a preorder traversal of the dominator tree. The second element of each
+    # stack entry holds the variables pushed while processing the block.
+    todo: list[tuple[int, Optional[list[tac.ident]]]] = \
+        [(dominators.ENTRY, None)] if idom else []
+    while todo:
+        (b, done) = todo.pop()
+        if done is not None:
+            for x in done:
+                stacks[x].pop()
+            continue
+        pushed: list[tac.ident] = []
+        for (phi, x) in zip(ssa.phis[b], phiOrig[b]):
+            phi.var = push(x, pushed)
+        bb = g.getData(b)
+        newInstrs: list[tac.instr] = []
+        for i in bb.instrs:
+            i = mapPrims(i, rename)
+            x = instrDefs(i)
+            if x is not None:
+                i = setDef(i, push(x, pushed))
+            newInstrs.append(i)
+        bb.instrs = newInstrs
+        for s in g.succs(b):
+            for (phi, x) in zip(ssa.phis[s], phiOrig[s]):
+                phi.args[b] = tac.Name(current(x))
+        todo.append((b, pushed))
+        for c in reversed(tree[b]):
+            todo.append((c, None))
+    return ssa
+
+def buildSsa(instrs: list[tac.instr]) -> SsaFun:
+    return toSsa(controlFlow.buildControlFlowGraph(instrs))
+
+def _insertBeforeJump(instrs: list[tac.instr], copies: list[tac.instr]) -> list[tac.instr]:
+    if instrs and isinstance(instrs[-1], tac.Goto | tac.GotoIf):
+        return instrs[:-1] + copies + instrs[-1:]
+    return instrs + copies
+
+def _needsTmp(ssa: SsaFun, b: int, phi: Phi) -> bool:
+    """
+    Returns True if the copies for phi cannot assign phi.var directly at the end of the
+    predecessors. This is the case if a predecessor has other successors, where phi.var
+    may still be live, or if another phi function of block b reads phi.var.
+    """
+    for p in phi.args:
+        if p == ENTRY_PRED:
+            continue
+        if ssa.g.succs(p) != [b] or isinstance(ssa.g.getData(p).last, tac.GotoIf):
+            return True
+    for other in ssa.phis.get(b, []):
+        if other is not phi and tac.Name(phi.var) in other.args.values():
+            return True
+    return False
+
+def fromSsa(ssa: SsaFun) -> list[tac.instr]:
+    """
+    Translates a function in SSA form back to TAC instructions.
+    """
+    entryCopies: list[tac.instr] = []
+    predCopies: dict[int, list[tac.instr]] = {}
+    startCopies: dict[int, list[tac.instr]] = {}
+    for b in sorted(ssa.g.vertices):
+        for phi in ssa.phis.get(b, []):
+            target = phi.var
+            if _needsTmp(ssa, b, phi):
+                target = ssa.fresh(f'{phi.var.name}.in')
+                ssa.origins[target] = ssa.origin(phi.var)
+                startCopies.setdefault(b, []).append(
+                    tac.Assign(phi.var, tac.Prim(tac.Name(target))))
+            for p, arg in sorted(phi.args.items()):
+                copy = tac.Assign(target, tac.Prim(arg))
+                if p == ENTRY_PRED:
+                    entryCopies.append(copy)
+                else:
+                    predCopies.setdefault(p, []).append(copy)
+    res = entryCopies
+    for b in sorted(ssa.g.vertices):
+        bb = ssa.g.getData(b)
+        res.extend(tac.Label(l) for l in bb.labels)
+        res.extend(startCopies.get(b, []))
+        res.extend(_insertBeforeJump(bb.instrs, predCopies.get(b, [])))
+    return mergeVersions(ssa, res)
+
+def mergeVersions(ssa: SsaFun, instrs: list[tac.instr]) -> list[tac.instr]:
+    """
+    Renames the versions of a variable back to a common name if their live ranges do
+    not overlap, that is, if they do not interfere. Versions connected by a copy are
+    merged first, so that the copy becomes a self copy removed by `assembly.copyProp`.
+    """
+    interfG = bitLiveness.analyze(controlFlow.buildControlFlowGraph(instrs)).interfGraph()
+    classes: dict[tac.ident, set[tac.ident]] = {}
+    def classOf(x: tac.ident) -> set[tac.ident]:
+        if x not in classes:
+            classes[x] = {x}
+        return classes[x]
+    def tryMerge(x: tac.ident, y: tac.ident):
+        c1 = classOf(x)
+        c2 = classOf(y)
+        if c1 is c2 or ssa.origin(x) != ssa.origin(y):
+            return
+        if any(w in c2 for u in c1 for w in interfG.succs(u)):
+            return
+        c1.update(c2)
+        for z in c2:
+            classes[z] = c1
+    vars: list[tac.ident] = []
+    for i in instrs:
+        x = instrDefs(i)
+        used = [p.var for p in instrPrims(i) if isinstance(p, tac.Name)]
+        vars.extend(used + ([x] if x is not None else []))
+        match i:
+            case tac.Assign(x, tac.Prim(tac.Name(y))):
+                tryMerge(x, y)
+            case _:
+                pass
+    for x in vars:
+        tryMerge(ssa.origin(x), x)
+    # The class of the original variable keeps its name, all other classes are named
+    # after one of their members.
+    renaming: dict[tac.ident, tac.ident] = {}
+    for x in vars:
+        c = classOf(x)
+        orig = ssa.origin(x)
+        if orig in c:
+            renaming[x] = orig
+        else:
+            renaming[x] = min(c, key=lambda y: y.name)
+    def rename(p: tac.prim) -> tac.prim:
+        match p:
+            case tac.Name(x): return tac.Name(renaming.get(x, x))
+            case tac.Const(): return p
+    res: list[tac.instr] = []
+    for i in instrs:
+        i = mapPrims(i, rename)
+        x = instrDefs(i)
+        if x is not None:
+            i = setDef(i, renaming.get(x, x))
+        res.append(i)
+    return res
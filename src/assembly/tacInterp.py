@@ -1,11 +1,22 @@
 """
-An interpreter for TAC.
+An interpreter for TAC. The function `interpProgram` interprets a TAC program directly,
+`interpInstrs` interprets the instructions of a single function without memory and
+globals. The function `interpFile` uses the faster engine from `assembly.tacVm` by default
+or compiles the program to Python with `assembly.tacToPython`.
 """
 from assembly.tac_ast import *
+from typing import *
+import sys
 import common.utils as utils
+import common.log as log
+import common.constants as constants
+import assembly.tacVm as tacVm
+import assembly.tacToPython as tacToPython
+import assembly.tacRuntime as tacRuntime
 import common.genericCompiler as genCompiler
 import assembly.tacPretty as tacPretty
-from assembly.loopToTac import loopToTac
+import assembly.tacOpt as tacOpt
+from assembly.loopToTac import fileToTac
 
 type Vars = dict[ident, int]
 
@@ -14,72 +25,134 @@ def evalPrim(p: prim, vars: Vars) -> int:
         case Const(v): return v
         case Name(x): return vars[x]
 
-def bi(b: bool) -> int:
-    return 1 if b else 0
-
 def evalExp(e: exp, vars: Vars) -> int:
     match e:
         case Prim(p): return evalPrim(p, vars)
         case BinOp(p1, op, p2):
             v1 = evalPrim(p1, vars)
             v2 = evalPrim(p2, vars)
-            match op.name:
-                case 'ADD': return v1 + v2
-                case 'SUB': return v1 - v2
-                case 'MUL': return v1 * v2
-                case 'EQ': return bi(v1 == v2)
-                case 'NE': return bi(v1 != v2)
-                case 'LT_S': return bi(v1 < v2)
-                case 'GT_S': return bi(v1 > v2)
-                case 'LE_S': return bi(v1 <= v2)
-                case 'GE_S': return bi(v1 >= v2)
-                case s:
-                    raise ValueError(f'Unhandled operator: {s}')
+            return tacRuntime.binOp(op.name)(v1, v2)
+        case UnOp(op, p):
+            return tacRuntime.unOp(op.name)(evalPrim(p, vars))
 
-def findLabel(instrs: list[instr], label: str) -> int:
+def labelIndices(instrs: list[instr]) -> dict[str, int]:
+    res: dict[str, int] = {}
     for idx, instr in enumerate(instrs):
         match instr:
-            case Label(l) if l == label:
-                return idx
+            case Label(l):
+                res[l] = idx
             case _:
                 pass
-    raise ValueError(f'Label {label} not found in {instrs}')
+    return res
 
-def interpInstrs(instrs: list[instr]):
-    pc = 0
-    vars: Vars = {}
-    while pc < len(instrs):
-        instr = instrs[pc]
-        match instr:
-            case Assign(x, e):
-                vars[x] = evalExp(e, vars)
-                pc += 1
-            case Call(x, fun, args):
-                match (fun, args):
-                    case (Ident('$input_i64'), []):
-                        vars[utils.assertNotNone(x)] = utils.inputInt('Enter some int: ')
-                    case (Ident('$print_i32'), [p]) | (Ident('$print_i64'), [p]):
-                        print(evalPrim(p, vars))
-                    case _:
-                        raise ValueError(f'Invalid call: {instr}')
-                pc += 1
-            case GotoIf(test, label):
-                v = evalPrim(test, vars)
-                if v != 0:
-                    pc = findLabel(instrs, label)
-                else:
+def findLabel(labels: dict[str, int], label: str) -> int:
+    idx = labels.get(label)
+    if idx is None:
+        raise ValueError(f'Label {label} not found')
+    return idx
+
+class _Interp:
+    def __init__(self, prog: program):
+        self.rt = tacRuntime.Runtime(prog)
+        self.funs: dict[ident, fun] = {f.name: f for f in prog.funs}
+        self.labels: dict[ident, dict[str, int]] = {}
+
+    def callFun(self, name: ident, args: list[int]) -> Optional[int]:
+        if tacRuntime.isBuiltin(name):
+            return self.rt.callBuiltin(name, args)
+        f = self.funs.get(name)
+        if f is None:
+            raise ValueError(f'Invalid call: {name.name}')
+        labels = self.labels.get(name)
+        if labels is None:
+            labels = labelIndices(f.body)
+            self.labels[name] = labels
+        vars: Vars = {x: 0 for x in f.locals}
+        vars.update(zip(f.params, args))
+        return self.interpBody(f.body, labels, vars)
+
+    def interpBody(self, instrs: list[instr], labels: dict[str, int],
+                   vars: Vars) -> Optional[int]:
+        pc = 0
+        rt = self.rt
+        while pc < len(instrs):
+            instr = instrs[pc]
+            match instr:
+                case Assign(x, e):
+                    vars[x] = evalExp(e, vars)
+                    pc += 1
+                case Call(x, fun, args):
+                    res = self.callFun(fun, [evalPrim(a, vars) for a in args])
+                    if x is not None:
+                        vars[x] = utils.assertNotNone(res)
+                    pc += 1
+                case CallIndirect(x, idx, args):
+                    fun = rt.tableEntry(evalPrim(idx, vars))
+                    res = self.callFun(fun, [evalPrim(a, vars) for a in args])
+                    if x is not None:
+                        vars[x] = utils.assertNotNone(res)
+                    pc += 1
+                case GotoIf(test, label):
+                    v = evalPrim(test, vars)
+                    if v != 0:
+                        pc = findLabel(labels, label)
+                    else:
+                        pc += 1
+                case Goto(label):
+                    pc = findLabel(labels, label)
+                case Label(_):
                     pc += 1
-            case Goto(label):
-                pc = findLabel(instrs, label)
-            case Label(_):
-                pc += 1
+                case Load(x, size, addr):
+                    vars[x] = rt.memory.load(size, evalPrim(addr, vars))
+                    pc += 1
+                case Store(size, addr, v):
+                    rt.memory.storeInt(size, evalPrim(addr, vars), evalPrim(v, vars))
+                    pc += 1
+                case GlobalGet(x, g):
+                    vars[x] = rt.globalGet(g)
+                    pc += 1
+                case GlobalSet(g, v):
+                    rt.globalSet(g, evalPrim(v, vars))
+                    pc += 1
+                case Return(v):
+                    return evalPrim(v, vars) if v is not None else None
+                case Trap():
+                    raise tacRuntime.TacTrap('unreachable executed')
+        return None
+
+def interpInstrs(instrs: list[instr]):
+    interp = _Interp(TacProgram([], [], [], 0, []))
+    interp.interpBody(instrs, labelIndices(instrs), {})
+
+def interpProgram(prog: program):
+    _Interp(prog).callFun(tacRuntime.MAIN_FUN, [])
+
+type Engine = Literal['vm', 'ast', 'pycompile']
 
-def interpFile(args: genCompiler.Args, printTac: bool):
-    tacInstrs = loopToTac(args)
+def interpFile(args: genCompiler.Args, printTac: bool, engine: Engine = 'vm',
+               profileFile: Optional[str] = None, lang: str = 'loop'):
+    prog = tacOpt.optimizeProgram(fileToTac(args, lang), args.optLevel)
     if printTac:
         halfDelim = '-----------------------------'
         delim = f'{halfDelim} TAC {halfDelim}'
         print(delim)
-        print(tacPretty.prettyInstrs(tacInstrs))
+        print(tacPretty.prettyProgram(prog))
         print(delim)
-    interpInstrs(tacInstrs)
+    if profileFile is not None and engine != 'vm':
+        utils.abort('Profiling is only supported by the vm engine')
+    try:
+        match engine:
+            case 'vm':
+                mod = tacVm.decodeProgram(prog, profile=profileFile is not None)
+                tacVm.runProgram(mod)
+                if profileFile is not None:
+                    utils.writeTextFile(profileFile, tacVm.profileToJson(mod))
+                    log.info(f'Wrote block profile to {profileFile}')
+            case 'ast':
+                interpProgram(prog)
+            case 'pycompile':
+                tacToPython.run(tacToPython.programToPython(prog))
+    except tacRuntime.TacTrap as e:
+        sys.stdout.flush()
+        log.error(f'TAC program trapped: {e}')
+        sys.exit(constants.RUN_ERROR_EXIT_CODE)
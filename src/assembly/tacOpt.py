@@ -0,0 +1,79 @@
+"""
+This module runs the optimization passes over TAC. The entry points are the
+functions `optimize`, which optimizes the instructions of a single function, and
+`optimizeProgram`.
+
+Optimization level 0 disables all passes. Level 1 enables constant propagation
+and folding (see `assembly.constProp`), followed by copy propagation and dead
+assignment elimination (see `assembly.copyProp`). Level 2 additionally runs local
+value numbering (see `assembly.valueNumbering`) before copy propagation, and then
+loop-invariant code motion (see `assembly.licm`) followed by another round of copy
+propagation. Level 3
+translates each function into SSA form (see `assembly.ssa`) and runs sparse
+conditional constant propagation (`assembly.sccp`) and global value numbering
+(`assembly.gvn`) before the passes of level 2.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.constProp as constProp
+import assembly.copyProp as copyProp
+import assembly.valueNumbering as valueNumbering
+import assembly.licm as licm
+import assembly.ssa as ssa
+import assembly.sccp as sccp
+import assembly.gvn as gvn
+import common.log as log
+
+MAX_OPT_LEVEL = 3
+
+type Pass = Callable[[list[tac.instr], PassStats], list[tac.instr]]
+
+def ssaOpt(instrs: list[tac.instr], stats: PassStats) -> list[tac.instr]:
+    f = ssa.buildSsa(instrs)
+    sccp.sccp(f, stats)
+    gvn.gvn(f, stats)
+    return ssa.fromSsa(f)
+
+def passesForLevel(level: int) -> list[tuple[str, Pass]]:
+    passes: list[tuple[str, Pass]] = []
+    if level >= 3:
+        passes.append(('ssa', ssaOpt))
+    if level >= 1:
+        passes.append(('constProp', constProp.constProp))
+    if level >= 2:
+        passes.append(('valueNumbering', valueNumbering.valueNumbering))
+    if level >= 1:
+        passes.append(('copyProp', copyProp.copyPropDce))
+    if level >= 2:
+        passes.append(('licm', licm.licm))
+        passes.append(('copyProp', copyProp.copyPropDce))
+    return passes
+
+def runPass(name: str, p: Pass, instrs: list[tac.instr],
+            stats: list[PassStats]) -> list[tac.instr]:
+    s = PassStats(name, len(instrs))
+    instrs = p(instrs, s)
+    s.instrsAfter = len(instrs)
+    log.info(f'Pass statistics: {s}')
+    stats.append(s)
+    return instrs
+
+def optimize(instrs: list[tac.instr], level: int,
+             stats: Optional[list[PassStats]] = None) -> list[tac.instr]:
+    """
+    Optimizes the instructions of a function with the passes enabled for the given level.
+    If stats is given, the statistics of all passes are appended to it.
+    """
+    if stats is None:
+        stats = []
+    for (name, p) in passesForLevel(level):
+        instrs = runPass(name, p, instrs, stats)
+    return instrs
+
+def optimizeProgram(prog: tac.program, level: int,
+                    stats: Optional[list[PassStats]] = None) -> tac.program:
+    funs = [tac.Fun(f.name, f.params, f.locals, optimize(f.body, level, stats))
+            for f in prog.funs]
+    return tac.TacProgram(prog.globals, prog.data, prog.funTable, prog.memSize, funs)
@@ -2,6 +2,7 @@
 A pretty printer for TAC.
 """
 from assembly.tac_ast import *
+from typing import *
 
 def prettyPrim(p: prim) -> str:
     match p:
@@ -13,6 +14,15 @@ def prettyExp(e: exp) -> str:
         case Prim(p): return prettyPrim(p)
         case BinOp(l, Op(op), r):
             return f'{op}({prettyPrim(l)}, {prettyPrim(r)})'
+        case UnOp(Op(op), p):
+            return f'{op}({prettyPrim(p)})'
+
+def prettyCall(x: Optional[ident], callStr: str) -> str:
+    match x:
+        case None:
+            return f'  {callStr}'
+        case _:
+            return f'  {x.name} = {callStr}'
 
 def prettyInstr(instr: instr) -> str:
     match instr:
@@ -25,17 +35,28 @@ def prettyInstr(instr: instr) -> str:
                 callStr = f'CALL({fun.name}, {argStr})'
             else:
                 callStr = f'CALL({fun.name})'
-            match x:
-                case None:
-                    return f'  {callStr}'
-                case _:
-                    return f'  {x.name} = {callStr}'
+            return prettyCall(x, callStr)
+        case CallIndirect(x, idx, args):
+            argStr = ''.join(', ' + prettyPrim(a) for a in args)
+            return prettyCall(x, f'CALL_INDIRECT({prettyPrim(idx)}{argStr})')
         case GotoIf(test, label):
             return f'  IF {prettyPrim(test)} GOTO {label}'
         case Goto(label):
             return f'  GOTO {label}'
         case Label(label):
             return f'{label}:'
+        case Load(x, size, addr):
+            return f'  {x.name} = LOAD{size * 8}({prettyPrim(addr)})'
+        case Store(size, addr, v):
+            return f'  STORE{size * 8}({prettyPrim(addr)}, {prettyPrim(v)})'
+        case GlobalGet(x, g):
+            return f'  {x.name} = {g.name}'
+        case GlobalSet(g, v):
+            return f'  {g.name} = {prettyPrim(v)}'
+        case Return(v):
+            return f'  RETURN {prettyPrim(v)}' if v is not None else '  RETURN'
+        case Trap():
+            return '  TRAP'
 
 def prettyInstrs(l: list[instr], oneLine: bool=False) -> str:
     out = [prettyInstr(i) for i in l]
@@ -43,3 +64,21 @@ def prettyInstrs(l: list[instr], oneLine: bool=False) -> str:
         return ';'.join([x.strip() for x in out])
     else:
         return '\n'.join(out)
+
+def prettyFun(f: fun) -> str:
+    params = ', '.join(x.name for x in f.params)
+    lines = [f'FUN {f.name.name}({params}):']
+    if f.locals:
+        lines.append('  LOCALS ' + ', '.join(x.name for x in f.locals))
+    lines.append(prettyInstrs(f.body))
+    return '\n'.join(lines)
+
+def prettyProgram(p: program) -> str:
+    lines: list[str] = []
+    for g in p.globals:
+        lines.append(f'GLOBAL {g.name.name} = {g.init}')
+    for d in p.data:
+        lines.append(f'DATA {d.start} {d.content!r}')
+    if p.funTable:
+        lines.append('TABLE ' + ', '.join(x.name for x in p.funTable))
+    return '\n\n'.join(['\n'.join(lines)] + [prettyFun(f) for f in p.funs]).lstrip('\n')
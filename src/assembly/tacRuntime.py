@@ -0,0 +1,154 @@
+"""
+Runtime support shared by the TAC execution engines (`assembly.tacInterp`,
+`assembly.tacVm`, and `assembly.tacToPython`): the semantics of operators, linear memory,
+global variables, and the builtin functions imported by wasm modules.
+
+TAC values are Python ints without a fixed width. Loading 4 bytes from memory yields an
+unsigned value, loading 8 bytes a signed value. The conversion operators mirror the wasm
+conversions between i32 and i64.
+"""
+
+from __future__ import annotations
+from assembly.tac_ast import *
+from typing import *
+import operator
+import sys
+import common.utils as utils
+
+MAIN_FUN = Ident('$main')
+
+_MASK32 = (1 << 32) - 1
+_MASK64 = (1 << 64) - 1
+
+class TacTrap(Exception):
+    """
+    Raised when a TAC program executes a trap or accesses memory out of bounds.
+    """
+    pass
+
+def _bi(f: Callable[[int, int], bool]) -> Callable[[int, int], int]:
+    return lambda x, y: 1 if f(x, y) else 0
+
+def _unsigned(f: Callable[[int, int], bool]) -> Callable[[int, int], int]:
+    return lambda x, y: 1 if f(x & _MASK64, y & _MASK64) else 0
+
+def toI32(x: int) -> int:
+    """
+    Interprets the lower 32 bits of x as a signed integer.
+    """
+    x = x & _MASK32
+    return x - (1 << 32) if x >= (1 << 31) else x
+
+binOps: dict[str, Callable[[int, int], int]] = {
+    'ADD': operator.add,
+    'SUB': operator.sub,
+    'MUL': operator.mul,
+    'SHL': lambda x, y: x << y,
+    'SHR_U': lambda x, y: (x & _MASK64) >> y,
+    'XOR': lambda x, y: x ^ y,
+    'EQ': _bi(operator.eq),
+    'NE': _bi(operator.ne),
+    'LT_S': _bi(operator.lt),
+    'GT_S': _bi(operator.gt),
+    'LE_S': _bi(operator.le),
+    'GE_S': _bi(operator.ge),
+    'LT_U': _unsigned(operator.lt),
+    'GT_U': _unsigned(operator.gt),
+    'LE_U': _unsigned(operator.le),
+    'GE_U': _unsigned(operator.ge),
+}
+
+unOps: dict[str, Callable[[int], int]] = {
+    'WRAP_I64': lambda x: x & _MASK32,
+    'EXTEND_I32_U': lambda x: x & _MASK32,
+    'EXTEND_I32_S': toI32,
+}
+
+def binOp(name: str) -> Callable[[int, int], int]:
+    f = binOps.get(name)
+    if f is None:
+        raise ValueError(f'Unhandled operator: {name}')
+    return f
+
+def unOp(name: str) -> Callable[[int], int]:
+    f = unOps.get(name)
+    if f is None:
+        raise ValueError(f'Unhandled operator: {name}')
+    return f
+
+class Memory:
+    """
+    Linear memory of a fixed size, zero-initialized.
+    """
+    def __init__(self, size: int, data: list[dataSegment] = []):
+        self.bytes = bytearray(size)
+        for d in data:
+            content = d.content.encode('utf-8')
+            self.store(d.start, content)
+
+    def store(self, addr: int, content: bytes):
+        if addr < 0 or addr + len(content) > len(self.bytes):
+            raise TacTrap(f'out of bounds memory access at address {addr}')
+        self.bytes[addr:addr + len(content)] = content
+
+    def load(self, size: int, addr: int) -> int:
+        if addr < 0 or addr + size > len(self.bytes):
+            raise TacTrap(f'out of bounds memory access at address {addr}')
+        return int.from_bytes(self.bytes[addr:addr + size], 'little', signed=(size == 8))
+
+    def storeInt(self, size: int, addr: int, value: int):
+        mask = _MASK64 if size == 8 else _MASK32
+        self.store(addr, (value & mask).to_bytes(size, 'little'))
+
+    def string(self, start: int, n: int) -> str:
+        return self.bytes[start:start + n].decode('utf-8', errors='replace')
+
+class Runtime:
+    """
+    State of a running TAC program outside the variables of its functions: memory,
+    global variables, and builtins.
+    """
+    def __init__(self, prog: Optional[program] = None):
+        if prog is None:
+            prog = TacProgram([], [], [], 0, [])
+        self.memory = Memory(prog.memSize, prog.data)
+        self.globals: dict[ident, int] = {g.name: g.init for g in prog.globals}
+        self.funTable = prog.funTable
+
+    def globalGet(self, g: ident) -> int:
+        return self.globals[g]
+
+    def globalSet(self, g: ident, v: int):
+        self.globals[g] = v
+
+    def tableEntry(self, idx: int) -> ident:
+        if idx < 0 or idx >= len(self.funTable):
+            raise TacTrap(f'undefined element {idx} in function table')
+        return self.funTable[idx]
+
+    def callBuiltin(self, name: ident, args: list[int]) -> Optional[int]:
+        match (name.name, args):
+            case ('$input_i64', []):
+                return utils.inputInt('Enter some int: ')
+            case ('$input_i32', []):
+                return utils.inputInt('Enter some int: ') & _MASK32
+            case ('$print_i64', [x]):
+                print(x)
+            case ('$print_i32', [x]):
+                print(toI32(x))
+            case ('$print_bool', [x]):
+                print('True' if x != 0 else 'False')
+            case ('$print', [start, n]):
+                print(self.memory.string(start, n))
+            case ('$print_err', [start, n]):
+                sys.stdout.flush()
+                sys.stderr.write(f'ERROR: {self.memory.string(start, n)}\n')
+            case _:
+                raise ValueError(f'Invalid call: {name.name}{tuple(args)}')
+        return None
+
+_builtins = {'$input_i64', '$input_i32', '$print_i64', '$print_i32', '$print_bool',
+             '$print', '$print_err'}
+
+def isBuiltin(name: ident) -> bool:
+    return name.name in _builtins
@@ -0,0 +1,69 @@
+"""
+An interpreter for TACspill, used to measure the code produced by register allocation.
+The entry point is the function `run`.
+
+The interpreter behaves like the MIPS code generated by `assembly.tacSpillToMips`:
+registers hold 32-bit values, spilled variables live in a stack frame addressed by
+their original name, and calls of the print and input builtins act like the
+corresponding system calls. While running, it counts the executed instructions
+(without labels) and the loads and stores of spilled variables.
+"""
+
+import assembly.tacSpill_ast as tacSpill
+import assembly.tac_ast as tac
+from typing import *
+from dataclasses import dataclass
+import assembly.tacRuntime as tacRuntime
+
+@dataclass
+class Counts:
+    instrs: int = 0
+    loads: int = 0
+    stores: int = 0
+
+def _evalPrim(p: tacSpill.prim, regs: dict[str, int]) -> int:
+    match p:
+        case tacSpill.Const(v): return v
+        case tacSpill.Name(x): return regs.get(x.name, 0)
+
+def _evalExp(e: tacSpill.exp, regs: dict[str, int]) -> int:
+    match e:
+        case tacSpill.Prim(p):
+            return _evalPrim(p, regs)
+        case tacSpill.BinOp(p1, op, p2):
+            f = tacRuntime.binOp(op.name)
+            return f(_evalPrim(p1, regs), _evalPrim(p2, regs))
+
+def run(instrs: list[tacSpill.instr]) -> Counts:
+    labels = {i.label: k for k, i in enumerate(instrs) if isinstance(i, tacSpill.Label)}
+    rt = tacRuntime.Runtime()
+    regs: dict[str, int] = {}
+    stack: dict[str, int] = {}
+    counts = Counts()
+    pc = 0
+    while pc < len(instrs):
+        i = instrs[pc]
+        pc += 1
+        if not isinstance(i, tacSpill.Label):
+            counts.instrs += 1
+        match i:
+            case tacSpill.Assign(x, e):
+                regs[x.name] = tacRuntime.toI32(_evalExp(e, regs))
+            case tacSpill.Call(x, f, args):
+                res = rt.callBuiltin(tac.Ident(f.name), [_evalPrim(a, regs) for a in args])
+                if x is not None:
+                    regs[x.name] = tacRuntime.toI32(res if res is not None else 0)
+            case tacSpill.GotoIf(p, label):
+                if _evalPrim(p, regs) != 0:
+                    pc = labels[label]
+            case tacSpill.Goto(label):
+                pc = labels[label]
+            case tacSpill.Label():
+                pass
+            case tacSpill.Spill(x, name):
+                counts.stores += 1
+                stack[name] = regs.get(x.name, 0)
+            case tacSpill.Unspill(x, name):
+                counts.loads += 1
+                regs[x.name] = stack.get(name, 0)
+    return counts
@@ -0,0 +1,242 @@
+"""
+This module translates TAC programs into Python source code, which is then compiled with
+the builtin `compile` function. Entry points are the functions `programToPython`,
+`tacToPython` (for the instructions of a single function), and `run`.
+
+Each TAC function becomes a Python function nested inside a single outer function;
+global TAC variables become local variables of the outer function. TAC variables become
+local variables of the function they belong to. The basic blocks of the control flow
+graph are executed by a state machine: the variable `block` holds the index of the next
+block, and a binary tree of if statements dispatches to the code of this block. Each
+block ends by assigning the index of its successor to `block`, or by returning when the
+end of the function is reached. The entry function returns the values of all its
+variables.
+"""
+
+from __future__ import annotations
+from assembly.tac_ast import *
+from typing import *
+from dataclasses import dataclass
+import assembly.controlFlow as controlFlow
+import assembly.tacRuntime as tacRuntime
+import common.utils as utils
+import common.log as log
+
+_binOps: dict[str, str] = {
+    'ADD': '{} + {}',
+    'SUB': '{} - {}',
+    'MUL': '{} * {}',
+    'SHL': '{} << {}',
+    'SHR_U': '({} & 0xffffffffffffffff) >> {}',
+    'XOR': '{} ^ {}',
+    'EQ': '1 if {} == {} else 0',
+    'NE': '1 if {} != {} else 0',
+    'LT_S': '1 if {} < {} else 0',
+    'GT_S': '1 if {} > {} else 0',
+    'LE_S': '1 if {} <= {} else 0',
+    'GE_S': '1 if {} >= {} else 0',
+    'LT_U': '1 if ({} & 0xffffffffffffffff) < ({} & 0xffffffffffffffff) else 0',
+    'GT_U': '1 if ({} & 0xffffffffffffffff) > ({} & 0xffffffffffffffff) else 0',
+    'LE_U': '1 if ({} & 0xffffffffffffffff) <= ({} & 0xffffffffffffffff) else 0',
+    'GE_U': '1 if ({} & 0xffffffffffffffff) >= ({} & 0xffffffffffffffff) else 0',
+}
+
+_unOps: dict[str, str] = {
+    'WRAP_I64': '{} & 0xffffffff',
+    'EXTEND_I32_U': '{} & 0xffffffff',
+    'EXTEND_I32_S': 'toI32({})',
+}
+
+FUN_NAME = 'tacProgram'
+
+@dataclass(frozen=True)
+class PythonProgram:
+    source: str
+    vars: dict[ident, str] # maps TAC variables of the entry function to Python variables
+    funs: list[ident] # the TAC functions, the i-th function is named f{i} in the source
+    prog: program
+
+class _Translator:
+    def __init__(self, funs: dict[ident, str], globals: dict[ident, str]):
+        self.vars: dict[ident, str] = {}
+        self.lines: list[str] = []
+        self.funs = funs
+        self.globals = globals
+
+    def var(self, x: ident) -> str:
+        v = self.vars.get(x)
+        if v is None:
+            v = f'v{len(self.vars)}'
+            self.vars[x] = v
+        return v
+
+    def prim(self, p: prim) -> str:
+        match p:
+            case Const(v):
+                return str(v)
+            case Name(x):
+                return self.var(x)
+
+    def emit(self, indent: int, line: str):
+        self.lines.append('    ' * indent + line)
+
+    def call(self, f: ident, args: list[prim]) -> str:
+        argStr = ', '.join(self.prim(a) for a in args)
+        if tacRuntime.isBuiltin(f):
+            return f'builtin(Ident({repr(f.name)}), [{argStr}])'
+        pyFun = self.funs.get(f)
+        if pyFun is None:
+            return f'invalidCall({repr(f.name)})'
+        return f'{pyFun}({argStr})'
+
+    def instr(self, indent: int, i: instr):
+        match i:
+            case Assign(x, e):
+                match e:
+                    case Prim(p):
+                        rhs = self.prim(p)
+                    case BinOp(p1, op, p2):
+                        fmt = _binOps.get(op.name)
+                        if fmt is None:
+                            raise ValueError(f'Unhandled operator: {op.name}')
+                        rhs = fmt.format(self.prim(p1), self.prim(p2))
+                    case UnOp(op, p):
+                        fmt = _unOps.get(op.name)
+                        if fmt is None:
+                            raise ValueError(f'Unhandled operator: {op.name}')
+                        rhs = fmt.format(self.prim(p))
+                self.emit(indent, f'{self.var(x)} = {rhs}')
+            case Call(x, Ident('$input_i64'), []):
+                self.emit(indent, f'{self.var(utils.assertNotNone(x))} = inputInt()')
+            case Call(_, Ident('$print_i64'), [p]):
+                self.emit(indent, f'print({self.prim(p)})')
+            case Call(None, f, args):
+                self.emit(indent, self.call(f, args))
+            case Call(x, f, args):
+                self.emit(indent, f'{self.var(utils.assertNotNone(x))} = {self.call(f, args)}')
+            case CallIndirect(x, idx, args):
+                argStr = ', '.join(self.prim(a) for a in args)
+                rhs = f'callIndirect({self.prim(idx)}, [{argStr}])'
+                self.emit(indent, rhs if x is None else f'{self.var(x)} = {rhs}')
+            case Load(x, size, addr):
+                self.emit(indent, f'{self.var(x)} = load({size}, {self.prim(addr)})')
+            case Store(size, addr, v):
+                self.emit(indent, f'storeInt({size}, {self.prim(addr)}, {self.prim(v)})')
+            case GlobalGet(x, g):
+                self.emit(indent, f'{self.var(x)} = {self.globals[g]}')
+            case GlobalSet(g, v):
+                self.emit(indent, f'{self.globals[g]} = {self.prim(v)}')
+            case Trap():
+                self.emit(indent, "raise TacTrap('unreachable executed')")
+            case GotoIf() | Goto() | Label() | Return():
+                raise ValueError(f'Unexpected jump, return, or label inside basic block: {i}')
+
+def _funToPython(f: fun, pyName: str, t: _Translator, isEntry: bool):
+    cfg = controlFlow.buildControlFlowGraph(f.body)
+    blocks = [cfg.getData(i) for i in sorted(cfg.vertices)]
+    labelToBlock: dict[str, int] = {}
+    for b in blocks:
+        for l in b.labels:
+            labelToBlock[l] = b.index
+    exitBlock = len(blocks)
+    fallOff = 'return locals()' if isEntry else 'return None'
+
+    def emitBlock(indent: int, idx: int):
+        if idx == exitBlock:
+            t.emit(indent, fallOff)
+            return
+        b = blocks[idx]
+        t.emit(indent, f'# block {idx} {b.labels}')
+        body = b.instrs
+        last = b.last
+        if isinstance(last, Goto | GotoIf | Return):
+            body = body[:-1]
+        for i in body:
+            t.instr(indent, i)
+        match last:
+            case Goto(label):
+                t.emit(indent, f'block = {labelToBlock[label]}')
+            case GotoIf(test, label):
+                t.emit(indent, f'block = {labelToBlock[label]} if {t.prim(test)} != 0 ' \
+                       f'else {idx + 1}')
+            case Return(p):
+                t.emit(indent, fallOff if isEntry or p is None else f'return {t.prim(p)}')
+            case Trap():
+                pass
+            case _:
+                t.emit(indent, f'block = {idx + 1}')
+
+    def emitDispatch(indent: int, lo: int, hi: int):
+        """
+        Emits code dispatching to the blocks with index lo (inclusive) to hi (exclusive).
+        """
+        if hi - lo == 1:
+            emitBlock(indent, lo)
+            return
+        mid = (lo + hi) // 2
+        t.emit(indent, f'if block < {mid}:')
+        emitDispatch(indent + 1, lo, mid)
+        t.emit(indent, 'else:')
+        emitDispatch(indent + 1, mid, hi)
+
+    params = [t.var(x) for x in f.params]
+    t.emit(1, f'def {pyName}({", ".join(params)}):')
+    if t.globals:
+        t.emit(2, f'nonlocal {", ".join(t.globals.values())}')
+    # Translate the blocks first to collect all variables
+    header = len(t.lines)
+    t.emit(2, 'block = 0')
+    t.emit(2, 'while True:')
+    emitDispatch(3, 0, exitBlock + 1)
+    localVars = set(f.locals)
+    initVars = [f'        {v} = {0 if x in localVars else None}' for x, v in t.vars.items()
+                if x not in f.params]
+    t.lines[header:header] = initVars
+    log.debug(f'Translated {len(f.body)} TAC instructions of {f.name.name} in ' \
+              f'{len(blocks)} blocks to Python')
+
+def programToPython(prog: program, entry: ident = tacRuntime.MAIN_FUN) -> PythonProgram:
+    funs = {f.name: f'f{k}' for k, f in enumerate(prog.funs)}
+    globals = {g.name: f'g{k}' for k, g in enumerate(prog.globals)}
+    lines = [f'def {FUN_NAME}(inputInt, print, load, storeInt, builtin, callIndirect):']
+    for g in prog.globals:
+        lines.append(f'    {globals[g.name]} = {g.init}')
+    vars: dict[ident, str] = {}
+    for f in prog.funs:
+        t = _Translator(funs, globals)
+        _funToPython(f, funs[f.name], t, f.name == entry)
+        lines.extend(t.lines)
+        if f.name == entry:
+            vars = t.vars
+    lines.append(f'    return [{", ".join(funs.values())}]')
+    return PythonProgram('\n'.join(lines) + '\n', vars, [f.name for f in prog.funs], prog)
+
+def tacToPython(instrs: list[instr]) -> PythonProgram:
+    return programToPython(TacProgram([], [], [], 0, [Fun(tacRuntime.MAIN_FUN, [], [], instrs)]))
+
+def run(prog: PythonProgram, entry: ident = tacRuntime.MAIN_FUN) -> dict[ident, Optional[int]]:
+    """
+    Compiles and runs the program. Returns the final values of all variables of the
+    entry function.
+    """
+    code = compile(prog.source, '<tac>', 'exec')
+    rt = tacRuntime.Runtime(prog.prog)
+    def invalidCall(name: str):
+        raise ValueError(f'Invalid call: {name}')
+    env: dict[str, Any] = {'Ident': Ident, 'TacTrap': tacRuntime.TacTrap,
+                           'toI32': tacRuntime.toI32, 'invalidCall': invalidCall}
+    exec(code, env)
+    funs: dict[ident, Any] = {}
+    def callIndirect(idx: int, args: list[int]) -> Optional[int]:
+        name = rt.tableEntry(idx)
+        f = funs.get(name)
+        if f is not None:
+            return f(*args)
+        return rt.callBuiltin(name, args)
+    pyFuns = env[FUN_NAME](lambda: utils.inputInt('Enter some int: '), print,
+                           rt.memory.load, rt.memory.storeInt, rt.callBuiltin, callIndirect)
+    funs.update(zip(prog.funs, pyFuns))
+    if entry not in funs:
+        raise ValueError(f'TAC program does not define function {entry.name}')
+    res = funs[entry]()
+    return {x: res[v] for x, v in prog.vars.items()}
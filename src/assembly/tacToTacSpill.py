@@ -6,10 +6,23 @@ register allocation by graph coloring, and then assigns
 variable to register. Some variables potentially require spilling.
 
 The resulting TACspill program use MIPS register names as variable
-names. It uses at most as many $s registers as specified in the
-parameter of the function `tacToTacSpill`. Besides $s registers,
-it uses three temporary registers $t0, $t1, and $t3,  as well as
-some special MIPS registers ($v0, $a0, $sp).
+names. It uses at most as many registers from `assembly.common.REGISTERS`
+as specified in the parameter of the function `tacToTacSpill`: up to 8,
+only $s registers are used, beyond that also $t3-$t9 and $a1-$a3. Besides
+these registers, it uses three temporary registers $t0, $t1, and $t2, as
+well as some special MIPS registers ($v0, $a0, $sp).
+
+Before register allocation, the optimization passes from `assembly.tacOpt` for the
+given optimization level run over the TAC program.
+
+The parameter regAlloc selects the register allocator: 'color' (the default) colors
+the interference graph with the modules below, 'briggs' uses the Chaitin-Briggs
+allocator from `assembly.briggs`, which prefers to spill variables used rarely and
+outside of loops. 'linear' uses the linear-scan allocator from `assembly.linearScan`,
+which does not build the interference graph and is much faster on huge programs, at
+the price of more spills. 'optimal' searches for an allocation of minimal spill cost
+with `assembly.optimalAlloc` within the time budget given by budget, and records the
+spill costs of the 'color' and 'briggs' allocators for comparison.
 
 This module relies on the two following two modules to be implemented
 by students (for templates see the templates/assembly directory):
@@ -24,6 +37,14 @@ import assembly.mips_ast as mips
 from typing import *
 from assembly.common import *
 import assembly.controlFlow as controlFlow
+import assembly.tacOpt as tacOpt
+import assembly.constProp as constProp
+import assembly.ssa as ssa
+import assembly.bitLiveness as bitLiveness
+import assembly.briggs as briggs
+import assembly.linearScan as linearScan
+import assembly.liveRangeSplit as liveRangeSplit
+import assembly.optimalAlloc as optimalAlloc
 import assembly.loopToTac as asCommon
 from common.compilerSupport import *
 import common.utils as utils
@@ -36,8 +57,12 @@ class Regs:
     a0 = mips.Reg('$a0')
     sp = mips.Reg('$sp')
 
+# Maps spilled variables that always hold the same constant to that constant
+type Remat = dict[tac.ident, int]
+
 def spillIdent(x: tac.ident, regMap: RegisterMap,
-               tmp: tacSpill.ident, mode: Literal['load', 'store'] = 'load') \
+               tmp: tacSpill.ident, mode: Literal['load', 'store'] = 'load',
+               remat: Remat = {}) \
                    ->  tuple[tacSpill.ident, list[tacSpill.instr]]:
     newX = regMap.resolve(x)
     if newX is not None:
@@ -45,35 +70,52 @@ def spillIdent(x: tac.ident, regMap: RegisterMap,
     else:
         match mode:
             case 'load':
+                c = remat.get(x)
+                if c is not None:
+                    return (tmp, [tacSpill.Assign(tmp, tacSpill.Prim(tacSpill.Const(c)))])
                 return (tmp, [tacSpill.Unspill(tmp, x.name)])
             case 'store':
                 return (tmp, [tacSpill.Spill(tmp, x.name)])
 
-def spillPrim(p: tac.prim, regMap: RegisterMap, tmp: tacSpill.ident) ->  tuple[tacSpill.prim, list[tacSpill.instr]]:
+def spillPrim(p: tac.prim, regMap: RegisterMap, tmp: tacSpill.ident,
+              remat: Remat = {}) ->  tuple[tacSpill.prim, list[tacSpill.instr]]:
     match p:
         case tac.Const(n): return (tacSpill.Const(n), [])
         case tac.Name(x):
-            (newX, instrs) = spillIdent(x, regMap, tmp)
+            (newX, instrs) = spillIdent(x, regMap, tmp, 'load', remat)
             return (tacSpill.Name(newX), instrs)
 
-def spillExp(e: tac.exp, regMap: RegisterMap) ->  tuple[tacSpill.exp, list[tacSpill.instr]]:
+def spillExp(e: tac.exp, regMap: RegisterMap,
+             remat: Remat = {}) ->  tuple[tacSpill.exp, list[tacSpill.instr]]:
     match e:
+        case tac.Prim(tac.Name(x)) if regMap.resolve(x) is None and x in remat:
+            return (tacSpill.Prim(tacSpill.Const(remat[x])), [])
         case tac.Prim(p):
-            (newP, instrs) = spillPrim(p, regMap, Regs.t1)
+            (newP, instrs) = spillPrim(p, regMap, Regs.t1, remat)
             return (tacSpill.Prim(newP), instrs)
         case tac.BinOp(p1, op, p2):
-            (newP1, instrs1) = spillPrim(p1, regMap, Regs.t1)
-            (newP2, instrs2) = spillPrim(p2, regMap, Regs.t2)
+            (newP1, instrs1) = spillPrim(p1, regMap, Regs.t1, remat)
+            (newP2, instrs2) = spillPrim(p2, regMap, Regs.t2, remat)
             return (tacSpill.BinOp(newP1, tacSpill.Op(op.name), newP2), instrs1 + instrs2)
+        case tac.UnOp():
+            raise ValueError(f'Expression not supported by the MIPS backend: {e}')
 
 def spillIfNeeded(isSpilled: bool, x: tac.ident, newX: tacSpill.ident) -> list[tacSpill.instr]:
     return [tacSpill.Spill(newX, x.name)] if isSpilled else []
 
-def spillInstr(i: tac.instr, regMap: RegisterMap) -> list[tacSpill.instr]:
+def spillInstr(i: tac.instr, regMap: RegisterMap, remat: Remat = {}) -> list[tacSpill.instr]:
     match i:
+        case tac.Assign(x, tac.Prim(tac.Name(y))) if x == y:
+            return []
+        case tac.Assign(x) if x in remat:
+            # The value is recomputed at every use
+            return []
         case tac.Assign(x, e):
-            (newE, spillLoads) = spillExp(e, regMap)
+            (newE, spillLoads) = spillExp(e, regMap, remat)
             (newX, spillStores) = spillIdent(x, regMap, Regs.t1, 'store')
+            if newE == tacSpill.Prim(tacSpill.Name(newX)):
+                # A move between the same register, for example after coalescing
+                return spillLoads + spillStores
             return spillLoads + [tacSpill.Assign(newX, newE)] + spillStores
         case tac.Call(x, f, args):
             # Assumptions: all registers in use are callee-save registers (no temporaries)
@@ -81,7 +123,7 @@ def spillInstr(i: tac.instr, regMap: RegisterMap) -> list[tacSpill.instr]:
             spillLoads: list[tacSpill.instr] = []
             newArgs: list[tacSpill.prim] = []
             for a in args:
-                (newA, l) = spillPrim(a, regMap, Regs.t1)
+                (newA, l) = spillPrim(a, regMap, Regs.t1, remat)
                 newArgs.append(newA)
                 spillLoads.extend(l)
             if x is not None:
@@ -91,21 +133,166 @@ def spillInstr(i: tac.instr, regMap: RegisterMap) -> list[tacSpill.instr]:
                 spillStores = []
             return spillLoads + [tacSpill.Call(newX, tacSpill.Ident(f.name), newArgs)] + spillStores
         case tac.GotoIf(p, label):
-            (newP, spillLoads) = spillPrim(p, regMap, Regs.t1)
+            (newP, spillLoads) = spillPrim(p, regMap, Regs.t1, remat)
             return spillLoads + [tacSpill.GotoIf(newP, label)]
         case tac.Goto(label):
             return [tacSpill.Goto(label)]
         case tac.Label(label):
             return [tacSpill.Label(label)]
+        case _:
+            raise ValueError(f'Instruction not supported by the MIPS backend: {i}')
+
+def _usedVars(i: tac.instr) -> list[tac.ident]:
+    return [p.var for p in ssa.instrPrims(i) if isinstance(p, tac.Name)]
+
+def _definedVars(i: tac.instr) -> list[tac.ident]:
+    x = ssa.instrDefs(i)
+    return [x] if x is not None else []
+
+def rematerializable(g: ControlFlowGraph) -> Remat:
+    """
+    Returns the variables that always hold the same constant: all their definitions
+    assign the same constant fitting into an immediate, and they are not live at the
+    start of the function, so no use can see the initial value of the variable.
+    """
+    values: dict[tac.ident, Optional[int]] = {}
+    for b in g.vertices:
+        for i in g.getData(b).instrs:
+            match i:
+                case tac.Assign(x, e):
+                    v = constProp.evalExp(e, {})
+                    values[x] = v if values.get(x, v) == v else None
+                case _:
+                    x = ssa.instrDefs(i)
+                    if x is not None:
+                        values[x] = None
+    entryLive = bitLiveness.analyze(g).liveIn(0) if g.hasVertex(0) else set()
+    return {x: v for x, v in values.items() if v is not None and x not in entryLive}
+
+def spillStats(instrs: list[tac.instr], regMap: RegisterMap, remat: Remat,
+               res: list[tacSpill.instr]) -> PassStats:
+    """
+    Counts the spilled variables and the memory traffic they cause, separately for
+    true spills and rematerialized constants.
+    """
+    s = PassStats('regAlloc', len(instrs), len(res))
+    spilled: set[tac.ident] = set()
+    for i in instrs:
+        used = _usedVars(i)
+        for x in used + _definedVars(i):
+            if regMap.resolve(x) is None and x not in remat:
+                spilled.add(x)
+        s.inc('rematLoads', sum(1 for x in used if x in remat))
+    s.inc('spilled', len(spilled))
+    s.inc('rematerialized', len(remat))
+    s.inc('spillLoads', sum(1 for i in res if isinstance(i, tacSpill.Unspill)))
+    s.inc('spillStores', sum(1 for i in res if isinstance(i, tacSpill.Spill)))
+    return s
+
+type RegAlloc = Literal['color', 'briggs', 'linear', 'optimal']
+
+def allocRegisters(g: ControlFlowGraph, maxRegs: int, regAlloc: RegAlloc,
+                   splitVars: AbstractSet[tac.ident]=frozenset(),
+                   budget: float=optimalAlloc.DEFAULT_BUDGET) -> RegisterMap:
+    """
+    Allocates registers with the given allocator. Moves from or to a variable in
+    splitVars are not coalesced, as this would undo live-range splitting. budget is
+    the time budget in seconds for the optimal allocator.
+    """
+    match regAlloc:
+        case 'color':
+            liveness = utils.importModuleNotInStudent('compilers.assembly.liveness')
+            graphColoring = utils.importModuleNotInStudent('compilers.assembly.graphColoring')
+            interfGraph = liveness.buildInterfGraph(g)
+            # Variables without any interference need a register as well
+            for b in g.vertices:
+                for i in g.getData(b).instrs:
+                    for x in _usedVars(i) + _definedVars(i):
+                        if not interfGraph.hasVertex(x):
+                            interfGraph.addVertex(x, None)
+            log.debug(f'interference graph: {interfGraph}')
+            return graphColoring.colorInterfGraph(interfGraph, maxRegs=maxRegs)
+        case 'briggs':
+            live = bitLiveness.analyze(g)
+            interfGraph = live.interfGraph()
+            log.debug(f'interference graph: {interfGraph}')
+            moves = [(x, y) for (x, y) in live.moves()
+                     if x not in splitVars and y not in splitVars]
+            return briggs.briggsAlloc(g, interfGraph, maxRegs, moves,
+                                      set(rematerializable(g)))
+        case 'linear':
+            return linearScan.linearScanAlloc(g, maxRegs)
+        case 'optimal':
+            interfGraph = bitLiveness.analyze(g).interfGraph()
+            log.debug(f'interference graph: {interfGraph}')
+            return optimalAlloc.optimalAlloc(g, interfGraph, maxRegs, budget)
+
+def spillCost(g: ControlFlowGraph, regMap: RegisterMap) -> float:
+    """
+    Estimates the memory traffic of an allocation: the number of occurrences of spilled
+    variables, weighted by loop depth as in `assembly.briggs.spillCosts`.
+    """
+    return sum(c for x, c in briggs.spillCosts(g).items() if regMap.resolve(x) is None)
+
+def splitLiveRanges(instrs: list[tac.instr], g: ControlFlowGraph, regMap: RegisterMap,
+                    maxRegs: int, regAlloc: RegAlloc, budget: float, stats: list[PassStats]) \
+                        -> tuple[list[tac.instr], ControlFlowGraph, RegisterMap]:
+    """
+    Splits live ranges at loop boundaries and allocates the registers again. The split
+    program is only kept if its spill cost is lower.
+    """
+    s = PassStats('split', len(instrs))
+    newInstrs = liveRangeSplit.splitLiveRanges(instrs, s)
+    splitVars = {x for i in newInstrs for x in _usedVars(i) + _definedVars(i)} - \
+        {x for i in instrs for x in _usedVars(i) + _definedVars(i)}
+    newG = controlFlow.buildControlFlowGraph(newInstrs)
+    newRegMap = allocRegisters(newG, maxRegs, regAlloc, splitVars, budget)
+    (oldCost, newCost) = (spillCost(g, regMap), spillCost(newG, newRegMap))
+    s.inc('spillCostBefore', round(oldCost))
+    s.inc('spillCostAfter', round(min(oldCost, newCost)))
+    if newCost < oldCost:
+        (instrs, g, regMap) = (newInstrs, newG, newRegMap)
+    else:
+        s.inc('rejected')
+    s.instrsAfter = len(instrs)
+    log.info(f'Pass statistics: {s}')
+    stats.append(s)
+    return (instrs, g, regMap)
+
+def reportGap(g: ControlFlowGraph, maxRegs: int, s: PassStats):
+    """
+    Records the spill costs of the heuristic allocators next to the spill cost in s,
+    which stems from the optimal allocator.
+    """
+    cost = s.counters['spillCost']
+    for h in ['color', 'briggs']:
+        hCost = round(spillCost(g, allocRegisters(g, maxRegs, h)))
+        s.inc(f'{h}SpillCost', hCost)
+        gap = f'{100 * (hCost - cost) / hCost:.1f}%' if hCost > 0 else '0%'
+        log.info(f'Spill cost of {h}: {hCost}, optimal: {cost}, gap: {gap}')
 
-def tacToTacSpill(instrs: list[tac.instr], maxRegs: int=asCommon.MAX_REGISTERS) -> list[tacSpill.instr]:
-    log.info(f'Starting TAC to TACspill transformation, maxRegs={maxRegs}')
-    liveness =  utils.importModuleNotInStudent('compilers.assembly.liveness')
-    graphColoring = utils.importModuleNotInStudent('compilers.assembly.graphColoring')
+def tacToTacSpill(instrs: list[tac.instr], maxRegs: int=len(asCommon.REGISTERS),
+                  optLevel: int=0, stats: Optional[list[PassStats]]=None,
+                  regAlloc: RegAlloc='color', split: bool=False,
+                  budget: float=optimalAlloc.DEFAULT_BUDGET) -> list[tacSpill.instr]:
+    log.info(f'Starting TAC to TACspill transformation, maxRegs={maxRegs}, ' \
+             f'optLevel={optLevel}, regAlloc={regAlloc}, split={split}')
+    if stats is None:
+        stats = []
+    instrs = tacOpt.optimize(instrs, optLevel, stats)
     ctrlFlowG = controlFlow.buildControlFlowGraph(instrs)
     log.debug(f'control flow graph: {ctrlFlowG}')
-    interfGraph = liveness.buildInterfGraph(ctrlFlowG)
-    log.debug(f'interference graph: {interfGraph}')
-    regMap = graphColoring.colorInterfGraph(interfGraph, maxRegs=maxRegs)
+    regMap = allocRegisters(ctrlFlowG, maxRegs, regAlloc, budget=budget)
+    if split:
+        (instrs, ctrlFlowG, regMap) = splitLiveRanges(instrs, ctrlFlowG, regMap, maxRegs,
+                                                      regAlloc, budget, stats)
     log.debug(f'Register map: {regMap}')
-    return [x for i in instrs for x in spillInstr(i, regMap)]
+    remat = {x: v for x, v in rematerializable(ctrlFlowG).items() if regMap.resolve(x) is None}
+    res = [x for i in instrs for x in spillInstr(i, regMap, remat)]
+    s = spillStats(instrs, regMap, remat, res)
+    s.inc('spillCost', round(spillCost(ctrlFlowG, regMap)))
+    if regAlloc == 'optimal':
+        reportGap(ctrlFlowG, maxRegs, s)
+    log.info(f'Register allocation statistics: {s}')
+    stats.append(s)
+    return res
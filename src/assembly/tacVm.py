@@ -0,0 +1,328 @@
+"""
+A fast execution engine for TAC. Entry points are the functions `decode` and `run` for
+the instructions of a single function, and `decodeProgram` and `runProgram` for whole
+TAC programs.
+
+Before execution, the TAC instructions are decoded into a program of flat tuples:
+the first component is an opcode, the remaining components are slot indices, program
+counters, or operator functions. Variables and constants live in a single list of
+slots, labels are resolved to program counters once, and labels themselves do not
+appear in the decoded program. Thus, executing a jump takes constant time.
+
+Calls of TAC functions are executed by recursive calls of the engine. Memory, globals,
+and builtins are provided by `assembly.tacRuntime`.
+
+Optionally, the engine counts how often each basic block is executed. The basic blocks
+are numbered in the same way as by `assembly.controlFlow.buildControlFlowGraph`.
+"""
+
+from __future__ import annotations
+from assembly.tac_ast import *
+from typing import *
+from dataclasses import dataclass, field
+import json
+import common.utils as utils
+import assembly.controlFlow as controlFlow
+import assembly.tacRuntime as tacRuntime
+
+# Opcodes of the decoded program
+OP_BINOP = 0   # (OP_BINOP, dst, fun, left, right)
+OP_MOVE = 1    # (OP_MOVE, dst, src)
+OP_JUMP_IF = 2 # (OP_JUMP_IF, test, target)
+OP_JUMP = 3    # (OP_JUMP, target)
+OP_INPUT = 4   # (OP_INPUT, dst)
+OP_PRINT = 5   # (OP_PRINT, src)
+OP_COUNT = 6   # (OP_COUNT, blockIndex), only present if the program is profiled
+OP_INVALID = 7 # (OP_INVALID, message)
+OP_UNOP = 8    # (OP_UNOP, dst, fun, src)
+OP_LOAD = 9    # (OP_LOAD, dst, size, addr)
+OP_STORE = 10  # (OP_STORE, size, addr, src)
+OP_GLOBAL_GET = 11 # (OP_GLOBAL_GET, dst, global)
+OP_GLOBAL_SET = 12 # (OP_GLOBAL_SET, global, src)
+OP_BUILTIN = 13 # (OP_BUILTIN, dst or -1, name, args)
+OP_CALL = 14   # (OP_CALL, dst or -1, fun, args), fun is resolved to a Program
+OP_CALL_INDIRECT = 15 # (OP_CALL_INDIRECT, dst or -1, index, args)
+OP_RETURN = 16 # (OP_RETURN, src or -1)
+OP_TRAP = 17   # (OP_TRAP,)
+
+type Code = tuple[Any, ...]
+
+@dataclass
+class ProfiledBlock:
+    index: int
+    labels: list[str]
+    count: int = 0
+
+@dataclass
+class Program:
+    """
+    The decoded instructions of a single function.
+    """
+    code: list[Code]
+    slots: list[Optional[int]] # initial values of all slots, constants are already set
+    varSlots: dict[ident, int]
+    blocks: Optional[list[ProfiledBlock]] # only present if the program is profiled
+    paramSlots: list[int] = field(default_factory=list[int])
+    name: ident = tacRuntime.MAIN_FUN
+
+@dataclass
+class Module:
+    """
+    A decoded TAC program.
+    """
+    funs: dict[ident, Program]
+    runtime: tacRuntime.Runtime
+
+class _Decoder:
+    def __init__(self):
+        self.slots: list[Optional[int]] = []
+        self.varSlots: dict[ident, int] = {}
+        self.constSlots: dict[int, int] = {}
+
+    def var(self, x: ident) -> int:
+        i = self.varSlots.get(x)
+        if i is None:
+            i = len(self.slots)
+            self.slots.append(None)
+            self.varSlots[x] = i
+        return i
+
+    def prim(self, p: prim) -> int:
+        match p:
+            case Const(v):
+                i = self.constSlots.get(v)
+                if i is None:
+                    i = len(self.slots)
+                    self.slots.append(v)
+                    self.constSlots[v] = i
+                return i
+            case Name(x):
+                return self.var(x)
+
+    def dst(self, x: Optional[ident]) -> int:
+        return self.var(x) if x is not None else -1
+
+    def instr(self, i: instr) -> Code:
+        """
+        Decodes an instruction other than a label. Jump targets are still labels, called
+        functions are still names.
+        """
+        match i:
+            case Assign(x, e):
+                match e:
+                    case Prim(p):
+                        return (OP_MOVE, self.var(x), self.prim(p))
+                    case BinOp(p1, op, p2):
+                        return (OP_BINOP, self.var(x), tacRuntime.binOp(op.name),
+                                self.prim(p1), self.prim(p2))
+                    case UnOp(op, p):
+                        return (OP_UNOP, self.var(x), tacRuntime.unOp(op.name), self.prim(p))
+            case Call(x, Ident('$input_i64'), []):
+                return (OP_INPUT, self.var(utils.assertNotNone(x)))
+            case Call(_, Ident('$print_i64'), [p]):
+                return (OP_PRINT, self.prim(p))
+            case Call(x, f, args):
+                argSlots = tuple(self.prim(a) for a in args)
+                if tacRuntime.isBuiltin(f):
+                    return (OP_BUILTIN, self.dst(x), f, argSlots)
+                return (OP_CALL, self.dst(x), f, argSlots)
+            case CallIndirect(x, idx, args):
+                argSlots = tuple(self.prim(a) for a in args)
+                return (OP_CALL_INDIRECT, self.dst(x), self.prim(idx), argSlots)
+            case GotoIf(test, label):
+                return (OP_JUMP_IF, self.prim(test), label)
+            case Goto(label):
+                return (OP_JUMP, label)
+            case Load(x, size, addr):
+                return (OP_LOAD, self.var(x), size, self.prim(addr))
+            case Store(size, addr, v):
+                return (OP_STORE, size, self.prim(addr), self.prim(v))
+            case GlobalGet(x, g):
+                return (OP_GLOBAL_GET, self.var(x), g)
+            case GlobalSet(g, v):
+                return (OP_GLOBAL_SET, g, self.prim(v))
+            case Return(v):
+                return (OP_RETURN, self.prim(v) if v is not None else -1)
+            case Trap():
+                return (OP_TRAP,)
+            case Label():
+                raise ValueError(f'Cannot decode label {i}')
+
+def _blockStarts(instrs: list[instr]) -> dict[int, list[str]]:
+    """
+    Returns the indices of instructions that start a basic block, together with the labels
+    of the block. A block starting with labels starts at its first label.
+    """
+    starts: dict[int, list[str]] = {}
+    current: Optional[list[str]] = None # labels of the block currently being started
+    newBlock = True
+    for idx, i in enumerate(instrs):
+        match i:
+            case Label(l):
+                if current is None:
+                    current = []
+                    starts[idx] = current
+                current.append(l)
+                newBlock = False
+            case _:
+                if newBlock:
+                    starts[idx] = []
+                current = None
+                newBlock = controlFlow.endsBlock(i)
+    return starts
+
+def decode(instrs: list[instr], profile: bool = False, params: list[ident] = [],
+           locals: list[ident] = []) -> Program:
+    d = _Decoder()
+    paramSlots = [d.var(x) for x in params]
+    for x in locals:
+        d.slots[d.var(x)] = 0
+    code: list[Code] = []
+    labelPcs: dict[str, int] = {}
+    blocks: Optional[list[ProfiledBlock]] = [] if profile else None
+    starts = _blockStarts(instrs)
+    countPc = 0
+    for idx, i in enumerate(instrs):
+        if blocks is not None and idx in starts:
+            countPc = len(code)
+            code.append((OP_COUNT, len(blocks)))
+            blocks.append(ProfiledBlock(len(blocks), starts[idx]))
+        match i:
+            case Label(l):
+                # With profiling, a jump to a label must also count the block of the label
+                labelPcs[l] = countPc if blocks is not None else len(code)
+            case _:
+                code.append(d.instr(i))
+    # Resolve labels
+    for pc, c in enumerate(code):
+        if c[0] == OP_JUMP_IF:
+            code[pc] = (OP_JUMP_IF, c[1], labelPcs[c[2]])
+        elif c[0] == OP_JUMP:
+            code[pc] = (OP_JUMP, labelPcs[c[1]])
+    return Program(code, d.slots, d.varSlots, blocks, paramSlots)
+
+def decodeProgram(prog: program, profile: bool = False) -> Module:
+    funs: dict[ident, Program] = {}
+    for f in prog.funs:
+        p = decode(f.body, profile, f.params, f.locals)
+        p.name = f.name
+        funs[f.name] = p
+    # Resolve calls of TAC functions
+    for p in funs.values():
+        for pc, c in enumerate(p.code):
+            if c[0] == OP_CALL:
+                callee = funs.get(c[2])
+                if callee is None:
+                    p.code[pc] = (OP_INVALID, f'Invalid call: {c[2].name}')
+                else:
+                    p.code[pc] = (OP_CALL, c[1], callee, c[3])
+    return Module(funs, tacRuntime.Runtime(prog))
+
+def _call(prog: Program, args: list[int], mod: Module) -> Optional[int]:
+    vars: list[Any] = prog.slots[:]
+    for s, a in zip(prog.paramSlots, args):
+        vars[s] = a
+    return _exec(prog, vars, mod)
+
+def _exec(prog: Program, vars: list[Any], mod: Module) -> Optional[int]:
+    """
+    Executes the program with the given slots. Returns the value returned by the
+    program, if any.
+    """
+    code = prog.code
+    counts = [0] * len(prog.blocks) if prog.blocks is not None else []
+    rt = mod.runtime
+    n = len(code)
+    pc = 0
+    res: Optional[int] = None
+    while pc < n:
+        c = code[pc]
+        op = c[0]
+        if op == OP_BINOP:
+            vars[c[1]] = c[2](vars[c[3]], vars[c[4]])
+            pc += 1
+        elif op == OP_JUMP_IF:
+            if vars[c[1]] != 0:
+                pc = c[2]
+            else:
+                pc += 1
+        elif op == OP_MOVE:
+            vars[c[1]] = vars[c[2]]
+            pc += 1
+        elif op == OP_JUMP:
+            pc = c[1]
+        elif op == OP_COUNT:
+            counts[c[1]] += 1
+            pc += 1
+        elif op == OP_LOAD:
+            vars[c[1]] = rt.memory.load(c[2], vars[c[3]])
+            pc += 1
+        elif op == OP_STORE:
+            rt.memory.storeInt(c[1], vars[c[2]], vars[c[3]])
+            pc += 1
+        elif op == OP_UNOP:
+            vars[c[1]] = c[2](vars[c[3]])
+            pc += 1
+        elif op == OP_GLOBAL_GET:
+            vars[c[1]] = rt.globals[c[2]]
+            pc += 1
+        elif op == OP_GLOBAL_SET:
+            rt.globals[c[1]] = vars[c[2]]
+            pc += 1
+        elif op == OP_CALL or op == OP_CALL_INDIRECT or op == OP_BUILTIN:
+            args = [vars[a] for a in c[3]]
+            if op == OP_CALL:
+                r = _call(c[2], args, mod)
+            else:
+                f = c[2] if op == OP_BUILTIN else rt.tableEntry(vars[c[2]])
+                if tacRuntime.isBuiltin(f):
+                    r = rt.callBuiltin(f, args)
+                elif f in mod.funs:
+                    r = _call(mod.funs[f], args, mod)
+                else:
+                    raise ValueError(f'Invalid call: {f.name}')
+            if c[1] >= 0:
+                vars[c[1]] = r
+            pc += 1
+        elif op == OP_INPUT:
+            vars[c[1]] = utils.inputInt('Enter some int: ')
+            pc += 1
+        elif op == OP_PRINT:
+            print(vars[c[1]])
+            pc += 1
+        elif op == OP_RETURN:
+            if c[1] >= 0:
+                res = vars[c[1]]
+            break
+        elif op == OP_TRAP:
+            raise tacRuntime.TacTrap('unreachable executed')
+        else:
+            raise ValueError(c[1])
+    if prog.blocks is not None:
+        for b in prog.blocks:
+            b.count += counts[b.index]
+    return res
+
+def run(prog: Program) -> dict[ident, Optional[int]]:
+    """
+    Runs the instructions of a single function without memory and globals, and returns
+    the final values of all variables. If the program is profiled, the counts of its
+    blocks are updated.
+    """
+    vars: list[Any] = prog.slots[:]
+    _exec(prog, vars, Module({prog.name: prog}, tacRuntime.Runtime()))
+    return {x: vars[i] for x, i in prog.varSlots.items()}
+
+def runProgram(mod: Module):
+    main = mod.funs.get(tacRuntime.MAIN_FUN)
+    if main is None:
+        raise ValueError(f'TAC program does not define function {tacRuntime.MAIN_FUN.name}')
+    _call(main, [], mod)
+
+def profileToJson(mod: Module) -> str:
+    entries: list[dict[str, Any]] = []
+    for p in mod.funs.values():
+        for b in p.blocks or []:
+            entries.append({'function': p.name.name, 'block': b.index, 'labels': b.labels,
+                            'count': b.count})
+    return json.dumps(entries, indent=2)
@@ -1,4 +1,4 @@
-# AUTOMATICALLY GENERATED (2024-03-13 17:58:48)
+# AUTOMATICALLY GENERATED (2026-10-19 15:14:21)
 from __future__ import annotations
 from dataclasses import dataclass
 
@@ -37,7 +37,12 @@ class BinOp:
     op: op
     right: prim
 
-type exp = Prim | BinOp
+@dataclass
+class UnOp:
+    op: op
+    arg: prim
+
+type exp = Prim | BinOp | UnOp
 
 @dataclass
 class Assign:
@@ -50,6 +55,12 @@ class Call:
     name: ident
     args: list[prim]
 
+@dataclass
+class CallIndirect:
+    var: optional[ident]
+    index: prim
+    args: list[prim]
+
 @dataclass
 class GotoIf:
     test: prim
@@ -63,4 +74,67 @@ class Goto:
 class Label:
     label: string
 
-type instr = Assign | Call | GotoIf | Goto | Label
\ No newline at end of file
+@dataclass
+class Load:
+    var: ident
+    size: int
+    addr: prim
+
+@dataclass
+class Store:
+    size: int
+    addr: prim
+    value: prim
+
+@dataclass
+class GlobalGet:
+    var: ident
+    glob: ident
+
+@dataclass
+class GlobalSet:
+    glob: ident
+    value: prim
+
+@dataclass
+class Return:
+    value: optional[prim] = None
+
+@dataclass
+class Trap:
+    pass
+
+type instr = Assign | Call | CallIndirect | GotoIf | Goto | Label | Load | Store | GlobalGet | GlobalSet | Return | Trap
+
+@dataclass
+class Fun:
+    name: ident
+    params: list[ident]
+    locals: list[ident]
+    body: list[instr]
+
+type fun = Fun
+
+@dataclass
+class Global:
+    name: ident
+    init: int
+
+type globalVar = Global
+
+@dataclass
+class Data:
+    start: int
+    content: string
+
+type dataSegment = Data
+
+@dataclass
+class TacProgram:
+    globals: list[globalVar]
+    data: list[dataSegment]
+    funTable: list[ident]
+    memSize: int
+    funs: list[fun]
+
+type program = TacProgram
\ No newline at end of file
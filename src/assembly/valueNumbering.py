@@ -0,0 +1,114 @@
+"""
+Local value numbering for TAC. The entry point is the function `valueNumbering`.
+
+Each basic block is processed on its own. Every value computed in the block gets a
+value number, and each variable refers to the value number of its current value.
+Operations are identified by their operator and the value numbers of their operands,
+so two operations with equal operands compute the same value, even if the operands
+are held by different variables. For the commutative operators ADD, MUL, EQ, and NE,
+the order of the operands does not matter.
+
+If an operation computes a value already held by some variable, the operation is
+replaced by a copy of this variable. Redefining a variable gives it a new value
+number, so operations on its old value no longer match and the variable no longer
+holds the old value. Copy propagation and dead assignment elimination (see
+`assembly.copyProp`) then remove most of the copies introduced.
+"""
+
+import assembly.tac_ast as tac
+from typing import *
+from assembly.common import *
+import assembly.controlFlow as controlFlow
+import common.utils as utils
+
+_commutative = {'ADD', 'MUL', 'EQ', 'NE'}
+
+type ValueKey = tuple[str, int] | tuple[str, int, int]
+
+class _ValueTable:
+    def __init__(self):
+        self.varNums: dict[tac.ident, int] = {}
+        self.constNums: dict[int, int] = {}
+        self.opNums: dict[ValueKey, int] = {}
+        # The variables that held a value number at some point
+        self.holders: dict[int, list[tac.ident]] = {}
+        self.next = 0
+
+    def fresh(self) -> int:
+        n = self.next
+        self.next += 1
+        return n
+
+    def primNum(self, p: tac.prim) -> int:
+        match p:
+            case tac.Const(c):
+                if c not in self.constNums:
+                    self.constNums[c] = self.fresh()
+                return self.constNums[c]
+            case tac.Name(x):
+                if x not in self.varNums:
+                    self.define(x, self.fresh())
+                return self.varNums[x]
+
+    def expKey(self, e: tac.exp) -> Optional[ValueKey]:
+        match e:
+            case tac.Prim():
+                return None
+            case tac.BinOp(p1, op, p2):
+                n1 = self.primNum(p1)
+                n2 = self.primNum(p2)
+                if op.name in _commutative and n2 < n1:
+                    (n1, n2) = (n2, n1)
+                return (op.name, n1, n2)
+            case tac.UnOp(op, p):
+                return (op.name, self.primNum(p))
+
+    def holder(self, n: int) -> Optional[tac.ident]:
+        """
+        Returns a variable currently holding the value with number n.
+        """
+        for x in self.holders.get(n, []):
+            if self.varNums.get(x) == n:
+                return x
+        return None
+
+    def define(self, x: tac.ident, n: int):
+        self.varNums[x] = n
+        self.holders.setdefault(n, []).append(x)
+
+def numberBlock(bb: BasicBlock, stats: PassStats) -> BasicBlock:
+    t = _ValueTable()
+    instrs: list[tac.instr] = []
+    for i in bb.instrs:
+        match i:
+            case tac.Assign(x, tac.Prim(p)):
+                t.define(x, t.primNum(p))
+            case tac.Assign(x, e):
+                key = utils.assertNotNone(t.expKey(e))
+                n = t.opNums.get(key)
+                h = t.holder(n) if n is not None else None
+                if n is not None and h is not None:
+                    stats.inc('replaced')
+                    i = tac.Assign(x, tac.Prim(tac.Name(h)))
+                else:
+                    n = t.fresh()
+                    t.opNums[key] = n
+                t.define(x, n)
+            case tac.Call(x) | tac.CallIndirect(x):
+                if x is not None:
+                    t.define(x, t.fresh())
+            case tac.Load(x) | tac.GlobalGet(x):
+                t.define(x, t.fresh())
+            case _:
+                pass
+        instrs.append(i)
+    return BasicBlock(instrs, bb.index, bb.labels)
+
+def valueNumbering(instrs: list[tac.instr], stats: PassStats) -> list[tac.instr]:
+    g = controlFlow.buildControlFlowGraph(instrs)
+    res: list[tac.instr] = []
+    for idx in sorted(g.vertices):
+        bb = numberBlock(g.getData(idx), stats)
+        res.extend(tac.Label(l) for l in bb.labels)
+        res.extend(bb.instrs)
+    return res
@@ -1,18 +1,31 @@
 """
 This module implements the translation from Wasm to TAC.
-Note that only Wasm instructions required by compiling L_loop are supported.
-Entry point for the translation is the function `wasmToTac`
+Entry points are the function `wasmToTac`, which translates the body of a single
+function, and the function `moduleToTac`, which translates a whole module into a
+TAC program with one unit per function.
+
+The translation is a single forward pass over the instructions. Operands are kept on an
+explicit stack, and all TAC instructions of a function are appended to one emitter, so
+labels and registers are unique within the function. Wasm labels may be shadowed by
+nested blocks of the same name; such labels are renamed to keep them unique in TAC.
 """
 from common.wasm import *
 from typing import *
 import assembly.tac_ast as tac
 from common.utils import assertNotNone
 
+# Maps the ID of a function to its number of arguments and whether it returns a value
+type FunInfo = dict[str, tuple[int, bool]]
+
+WASM_PAGE_SIZE = 64 * 1024
+
 class _Emitter:
-    def __init__(self):
+    def __init__(self, funs: FunInfo):
         self.instrs: list[tac.instr] = []
         self.regCount: int = 0
         self.labelCount: int = 0
+        self.usedLabels: set[str] = set()
+        self.funs = funs
     def emit(self, i: tac.instr):
         self.instrs.append(i)
     def add(self, l: list[tac.instr]):
@@ -25,131 +38,263 @@ class _Emitter:
         i = self.labelCount
         self.labelCount = self.labelCount + 1
         return f'L_{hint}_{i}'
+    def bindLabel(self, wasmLabel: str) -> str:
+        """
+        Returns a TAC label for a wasm label, unique within the function.
+        """
+        label = wasmLabel
+        k = 0
+        while label in self.usedLabels:
+            k += 1
+            label = f'{wasmLabel}_{k}'
+        self.usedLabels.add(label)
+        return label
+
+# Maps wasm labels in scope to TAC labels
+type _Scope = dict[str, str]
+
+def wasmToTac(instrs: Sequence[WasmInstr], funs: Optional[FunInfo] = None) \
+        -> tuple[Optional[tac.prim], list[tac.instr]]:
+    """
+    Translates the instructions of a wasm function body. Returns the value on top of
+    the operand stack after the last instruction (if any), together with the TAC
+    instructions. The argument funs describes the functions that can be called, the
+    default are the functions imported by all wasm modules.
+    """
+    e = _Emitter(funs if funs is not None else _importedFuns)
+    val = _toTacBody(instrs, e, {})
+    return (val, e.instrs)
 
-def wasmToTac(instrs: list[WasmInstrL]) -> tuple[Optional[tac.prim], list[tac.instr]]:
-    return _toTacR(list(reversed(instrs)))
+def _funInfo(imports: list[WasmImport], funcs: list[WasmFunc]) -> FunInfo:
+    funs: FunInfo = {}
+    for i in imports:
+        match i.desc:
+            case WasmImportFunc(id, params, result):
+                funs[id.id] = (len(params), result is not None)
+            case WasmImportMemory():
+                pass
+    for f in funcs:
+        funs[f.id.id] = (len(f.params), f.result is not None)
+    return funs
 
-def _toTacR(rInstrs: list[WasmInstrL]) -> tuple[Optional[tac.prim], list[tac.instr]]:
-    e = _Emitter()
-    (val, rest) = _toTacSingle(rInstrs, None, e)
-    if rest:
-        (_, l) = _toTacR(rest)
-    else:
-        l = []
-    return (val, l + e.instrs)
+_importedFuns: FunInfo = {
+    '$print': (2, False),
+    '$print_err': (2, False),
+    '$print_i32': (1, False),
+    '$print_bool': (1, False),
+    '$print_i64': (1, False),
+    '$input_i32': (0, True),
+    '$input_i64': (0, True),
+}
 
-def _callInfo(id: WasmId) -> tuple[int, bool]:
+def funToTac(f: WasmFunc, funs: FunInfo) -> tac.Fun:
+    (val, instrs) = wasmToTac(f.instrs, funs)
+    if f.result is not None and not _endsWithTrap(instrs):
+        instrs.append(tac.Return(assertNotNone(val)))
+    return tac.Fun(tac.Ident(f.id.id),
+                   [tac.Ident(x.id) for (x, _) in f.params],
+                   [tac.Ident(x.id) for (x, _) in f.locals],
+                   instrs)
+
+def moduleToTac(m: WasmModule) -> tac.program:
     """
-    Given the ID of a function, returns the number of arguments and
-    wether the function returns a value.
+    Translates a wasm module. The memory size of the program is the minimal size of the
+    imported memory.
     """
-    match id.id:
-        case '$print_i64' | '$print_i32' | '$print_bool': return (1, False)
-        case '$input_i64': return (0, True)
-        case s:
-            raise ValueError(f'Unknown function: {s}')
+    funs = _funInfo(m.imports, m.funcs)
+    memSize = 0
+    for i in m.imports:
+        if isinstance(i.desc, WasmImportMemory):
+            memSize += i.desc.min * WASM_PAGE_SIZE
+    globals: list[tac.globalVar] = []
+    for g in m.globals:
+        match g.init:
+            case [WasmInstrConst(_, int(v))]:
+                globals.append(tac.Global(tac.Ident(g.id.id), v))
+            case _:
+                raise ValueError(f'Unsupported initializer of global {g.id.id}: {g.init}')
+    data = [tac.Data(d.start, d.content) for d in m.data]
+    funTable = [tac.Ident(x.id) for x in m.funcTable.elems]
+    return tac.TacProgram(globals, data, funTable, memSize, [funToTac(f, funs) for f in m.funcs])
 
 def downcast(l: list[WasmInstr]) -> list[WasmInstrL]:
     return cast(list[WasmInstrL], l)
 
-def _toTacSingle(rInstrs: list[WasmInstrL], targetVar: Optional[tac.ident], e: _Emitter) -> tuple[Optional[tac.prim], list[WasmInstrL]]:
-    match rInstrs:
-        case [WasmInstrVarLocal(op, x), *rest]:
-            if op == 'get':
-                return (tac.Name(tac.Ident(x.id)), rest)
-            else:
+def _endsWithTrap(instrs: list[tac.instr]) -> bool:
+    return bool(instrs) and isinstance(instrs[-1], tac.Trap)
+
+def _targetVar(instrs: Sequence[WasmInstr], idx: int, stack: list[tac.prim],
+               e: _Emitter) -> tac.ident:
+    """
+    Returns the variable for the value produced by instruction idx. If the value is
+    immediately stored in a local variable, this is the variable itself, so no
+    intermediate register is needed. Otherwise, it is a fresh register.
+    """
+    if idx + 1 < len(instrs):
+        match instrs[idx + 1]:
+            case WasmInstrVarLocal('set' | 'tee', x):
+                tacVar = tac.Ident(x.id)
+                _protect(stack, tacVar, e)
+                return tacVar
+            case _:
+                pass
+    return e.freshReg()
+
+def _protect(stack: list[tac.prim], x: tac.ident, e: _Emitter):
+    """
+    Must be called before assigning to local variable x: operands on the stack still
+    referring to x are copied to registers, so that they keep the old value of x.
+    """
+    for k, p in enumerate(stack):
+        if p == tac.Name(x):
+            r = e.freshReg()
+            e.emit(tac.Assign(r, tac.Prim(p)))
+            stack[k] = tac.Name(r)
+
+def _pop(stack: list[tac.prim], i: WasmInstr) -> tac.prim:
+    if not stack:
+        raise ValueError(f'Operand stack empty when translating {i}')
+    return stack.pop()
+
+def _popArgs(stack: list[tac.prim], n: int, i: WasmInstr) -> list[tac.prim]:
+    args: list[tac.prim] = []
+    for _ in range(n):
+        args.append(_pop(stack, i))
+    args.reverse()
+    return args
+
+def _assignResult(e: _Emitter, x: tac.ident, val: Optional[tac.prim]):
+    """
+    Assigns the result of a block to x, unless the block ends with a trap.
+    """
+    if val is None and _endsWithTrap(e.instrs):
+        return
+    e.emit(tac.Assign(x, tac.Prim(assertNotNone(val))))
+
+def _memSize(ty: WasmValtype) -> int:
+    return 8 if ty in ['i64', 'f64'] else 4
+
+def _toTacBody(instrs: Sequence[WasmInstr], e: _Emitter, scope: _Scope) -> Optional[tac.prim]:
+    """
+    Translates a sequence of instructions in a single forward pass, keeping the operands
+    of pending instructions on an explicit stack. Returns the value on top of the
+    stack at the end.
+    """
+    stack: list[tac.prim] = []
+    for idx, i in enumerate(instrs):
+        match i:
+            case WasmInstrVarLocal(op, x):
                 tacVar = tac.Ident(x.id)
-                (val, rest) = _toTacSingleNotNone(rest, tacVar, e)
-                e.emit(tac.Assign(tacVar, tac.Prim(val)))
-                if op == 'set':
-                    res = None
+                if op == 'get':
+                    stack.append(tac.Name(tacVar))
+                else:
+                    val = _pop(stack, i)
+                    _protect(stack, tacVar, e)
+                    e.emit(tac.Assign(tacVar, tac.Prim(val)))
+                    if op == 'tee':
+                        stack.append(tac.Name(tacVar))
+            case WasmInstrVarGlobal('get', x):
+                targetReg = _targetVar(instrs, idx, stack, e)
+                e.emit(tac.GlobalGet(targetReg, tac.Ident(x.id)))
+                stack.append(tac.Name(targetReg))
+            case WasmInstrVarGlobal('set', x):
+                val = _pop(stack, i)
+                e.emit(tac.GlobalSet(tac.Ident(x.id), val))
+            case WasmInstrNumBinOp(_, op) | WasmInstrIntRelOp(_, op):
+                right = _pop(stack, i)
+                left = _pop(stack, i)
+                # no optimization
+                opCode = op.upper()
+                targetReg = _targetVar(instrs, idx, stack, e)
+                e.emit(tac.Assign(targetReg, tac.BinOp(left, tac.Op(opCode), right)))
+                stack.append(tac.Name(targetReg))
+            case WasmInstrConvOp(op):
+                val = _pop(stack, i)
+                opCode = op.split('.')[1].upper()
+                targetReg = _targetVar(instrs, idx, stack, e)
+                e.emit(tac.Assign(targetReg, tac.UnOp(tac.Op(opCode), val)))
+                stack.append(tac.Name(targetReg))
+            case WasmInstrMem(ty, 'load'):
+                addr = _pop(stack, i)
+                targetReg = _targetVar(instrs, idx, stack, e)
+                e.emit(tac.Load(targetReg, _memSize(ty), addr))
+                stack.append(tac.Name(targetReg))
+            case WasmInstrMem(ty, 'store'):
+                val = _pop(stack, i)
+                addr = _pop(stack, i)
+                e.emit(tac.Store(_memSize(ty), addr, val))
+            case WasmInstrCall(name):
+                info = e.funs.get(name.id)
+                if info is None:
+                    raise ValueError(f'Unknown function: {name.id}')
+                (n, hasResult) = info
+                args = _popArgs(stack, n, i)
+                targetReg = _targetVar(instrs, idx, stack, e) if hasResult else None
+                e.emit(tac.Call(targetReg, tac.Ident(name.id), args))
+                if targetReg:
+                    stack.append(tac.Name(targetReg))
+            case WasmInstrCallIndirect(params, result):
+                funIdx = _pop(stack, i)
+                args = _popArgs(stack, len(params), i)
+                targetReg = _targetVar(instrs, idx, stack, e) if result is not None else None
+                e.emit(tac.CallIndirect(targetReg, funIdx, args))
+                if targetReg:
+                    stack.append(tac.Name(targetReg))
+            case WasmInstrConst(_, v):
+                if isinstance(v, int):
+                    stack.append(tac.Const(v))
                 else:
-                    res = tac.Name(tacVar)
-                return (res, rest)
-        case [WasmInstrNumBinOp(_, op), *rest] | [WasmInstrIntRelOp(_, op), *rest]:
-            (right, rest) = _toTacSingleNotNone(rest, None, e)
-            (left, rest) = _toTacSingleNotNone(rest, None, e)
-            # no optimization
-            opCode = op.upper()
-            targetReg = targetVar or e.freshReg()
-            e.emit(tac.Assign(targetReg, tac.BinOp(left, tac.Op(opCode), right)))
-            return (tac.Name(targetReg), rest)
-        case [WasmInstrCall(name), *rest]:
-            (n, hasResult) = _callInfo(name)
-            args = []
-            for _ in range(n):
-                (arg, rest) = _toTacSingleNotNone(rest, None, e)
-                args = [arg] + args
-            if hasResult:
-                targetReg = targetVar or e.freshReg()
-            else:
+                    raise ValueError(f'float constants not supported in TAC')
+            case WasmInstrDrop():
+                _pop(stack, i)
+            case WasmInstrComment():
+                pass
+            case WasmInstrTrap():
+                e.emit(tac.Trap())
+            case WasmInstrBranch(target, True): # conditional branch
+                val = _pop(stack, i)
+                e.emit(tac.GotoIf(val, scope.get(target.id, target.id)))
+            case WasmInstrBranch(target, False): # unconditional branch
+                e.emit(tac.Goto(scope.get(target.id, target.id)))
+            case WasmInstrIf(_, [], elseInstrs):
+                val = _pop(stack, i)
+                labelEnd = e.freshLabel('end')
+                e.emit(tac.GotoIf(val, labelEnd))
+                _toTacBody(elseInstrs, e, scope)
+                e.emit(tac.Label(labelEnd))
+            case WasmInstrIf(resTy, thenInstrs, elseInstrs):
+                val = _pop(stack, i)
+                labelThen = e.freshLabel('then')
+                labelEnd = e.freshLabel('end')
+                e.emit(tac.GotoIf(val, labelThen))
                 targetReg = None
-            e.emit(tac.Call(targetReg, tac.Ident(name.id), args))
-            return (tac.Name(targetReg) if targetReg else None, rest)
-        case [WasmInstrConst(_, v), *rest]:
-            if isinstance(v, int):
-                return (tac.Const(v), rest)
-            else:
-                raise ValueError(f'float constants not supported in TAC')
-        case [WasmInstrBranch(target, True), *rest]: # conditional branch
-            (val, rest) = _toTacSingleNotNone(rest, None, e)
-            e.emit(tac.GotoIf(val, target.id))
-            return (None, rest)
-        case [WasmInstrBranch(target, False), *rest]: # unconditional branch
-            e.emit(tac.Goto(target.id))
-            return (None, rest)
-        case [WasmInstrIf(_, [], elseInstrs), *rest]:
-            (val, rest) = _toTacSingleNotNone(rest, None, e)
-            labelEnd = e.freshLabel('end')
-            e.emit(tac.GotoIf(val, labelEnd))
-            (_, elseInstrsTac) = wasmToTac(downcast(elseInstrs))
-            e.add(elseInstrsTac)
-            e.emit(tac.Label(labelEnd))
-            return (None, rest)
-        case [WasmInstrIf(resTy, thenInstrs, elseInstrs), *rest]:
-            (val, rest) = _toTacSingleNotNone(rest, None, e)
-            targetReg = targetVar or e.freshReg()
-            (valElse, elseInstrsTac) = wasmToTac(downcast(elseInstrs))
-            (valThen, thenInstrsTac) = wasmToTac(downcast(thenInstrs))
-            labelThen = e.freshLabel('then')
-            labelEnd = e.freshLabel('end')
-            e.emit(tac.GotoIf(val, labelThen))
-            e.add(elseInstrsTac)
-            if resTy is not None:
-                e.emit(tac.Assign(targetReg, tac.Prim(assertNotNone(valElse))))
-            e.emit(tac.Goto(labelEnd))
-            e.emit(tac.Label(labelThen))
-            e.add(thenInstrsTac)
-            if resTy is not None:
-                e.emit(tac.Assign(targetReg, tac.Prim(assertNotNone(valThen))))
-            e.emit(tac.Label(labelEnd))
-            if resTy is not None:
-                return (tac.Name(targetReg), rest)
-            else:
-                return (None, rest)
-        case [WasmInstrLoop(label, body), *rest]:
-            (_, instrsTac) = wasmToTac(downcast(body))
-            e.emit(tac.Label(label.id))
-            e.add(instrsTac)
-            return (None, rest)
-        case [WasmInstrBlock(label, resultTy, body), *rest]:
-            (val, instrsTac) = wasmToTac(downcast(body))
-            e.add(instrsTac)
-            if resultTy is not None:
-                targetReg = targetVar or e.freshReg()
-                e.emit(tac.Assign(targetReg, tac.Prim(assertNotNone(val))))
-                e.emit(tac.Label(label.id))
-                return (tac.Name(targetReg), rest)
-            else:
-                e.emit(tac.Label(label.id))
-                return (None, rest)
-        case []:
-            return (None, [])
-        case _:
-            raise ValueError(f"Don't know what to do with reversed stack {rInstrs}")
-
-def _toTacSingleNotNone(rInstrs: list[WasmInstrL], targetVar: Optional[tac.ident], e: _Emitter) -> tuple[tac.prim, list[WasmInstrL]]:
-    (x, rest) = _toTacSingle(rInstrs, targetVar, e)
-    if x is None:
-        raise ValueError(f'toTacSingle returned None for rInstrs={rInstrs}')
-    return (x, rest)
+                if resTy is not None:
+                    targetReg = _targetVar(instrs, idx, stack, e)
+                valElse = _toTacBody(elseInstrs, e, scope)
+                if targetReg is not None:
+                    _assignResult(e, targetReg, valElse)
+                e.emit(tac.Goto(labelEnd))
+                e.emit(tac.Label(labelThen))
+                valThen = _toTacBody(thenInstrs, e, scope)
+                if targetReg is not None:
+                    _assignResult(e, targetReg, valThen)
+                e.emit(tac.Label(labelEnd))
+                if targetReg is not None:
+                    stack.append(tac.Name(targetReg))
+            case WasmInstrLoop(label, body):
+                tacLabel = e.bindLabel(label.id)
+                e.emit(tac.Label(tacLabel))
+                _toTacBody(body, e, scope | {label.id: tacLabel})
+            case WasmInstrBlock(label, resultTy, body):
+                tacLabel = e.bindLabel(label.id)
+                val = _toTacBody(body, e, scope | {label.id: tacLabel})
+                if resultTy is not None:
+                    targetReg = _targetVar(instrs, idx, stack, e)
+                    _assignResult(e, targetReg, val)
+                    e.emit(tac.Label(tacLabel))
+                    stack.append(tac.Name(targetReg))
+                else:
+                    e.emit(tac.Label(tacLabel))
+            case _:
+                raise ValueError(f"Don't know what to do with instruction {i}")
+    return stack[-1] if stack else None
@@ -41,6 +41,7 @@ class Args:
     maxMemSize: Optional[int] = None
     maxArraySize: Optional[int] = None
     maxRegisters: Optional[int] = None
+    optLevel: int = 0
 
 def compileMain(args: Args, compileFun: CompileFun, astMod: Any) -> WasmModule:
     output = args.output
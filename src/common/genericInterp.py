@@ -11,12 +11,16 @@ import sys
 @dataclass(frozen=True)
 class Args:
     filename: str
+    memoSize: Optional[int] = None
 
-def interpMain(args: Args, interpFun: Callable[[Any], None], astMod: Any):
+def interpMain(args: Args, interpFun: Callable[..., None], astMod: Any):
     ast = parser.parseFile(args.filename, astMod)
     log.info(f'Interpreting AST with {interpFun} from file {inspect.getmodule(interpFun)}')
     try:
-        interpFun(ast)
+        if args.memoSize is not None:
+            interpFun(ast, memoSize=args.memoSize)
+        else:
+            interpFun(ast)
     except compilerSupport.CompileError as e:
         e.displayAndDie()
     except Exception:
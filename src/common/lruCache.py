@@ -0,0 +1,44 @@
+from typing import *
+from collections import OrderedDict
+
+class LruCache[K, V]:
+    """
+    A cache with at most maxSize entries. If the cache is full, adding a new entry
+    evicts the entry that was least recently used. The cache counts hits and misses
+    of lookups.
+    """
+    def __init__(self, maxSize: int):
+        if maxSize <= 0:
+            raise ValueError(f'Size of LRU cache must be positive, given: {maxSize}')
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.__entries: OrderedDict[K, V] = OrderedDict()
+
+    def __repr__(self):
+        return f'LruCache(size={len(self)}, maxSize={self.maxSize}, hits={self.hits}, ' \
+            f'misses={self.misses})'
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """
+        Returns the value for key, or None if the cache has no entry for key.
+        """
+        v = self.__entries.get(key)
+        if v is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.__entries.move_to_end(key)
+        return v
+
+    def put(self, key: K, value: V):
+        """
+        Adds or updates the entry for key. The value must not be None.
+        """
+        self.__entries[key] = value
+        self.__entries.move_to_end(key)
+        if len(self.__entries) > self.maxSize:
+            self.__entries.popitem(last=False)
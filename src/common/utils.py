@@ -21,7 +21,44 @@ def writeTextFile(path: str, content: str):
     with open(path, 'w') as f:
         return f.write(content)
 
+class BulkInput:
+    """
+    Serves the whitespace-separated tokens of all of stdin, read at once. A token is
+    converted to int only when it is consumed, so invalid input is reported at the same
+    point as with line-by-line reading.
+    """
+    def __init__(self, data: bytes):
+        self.tokens = data.split()
+        self.pos = 0
+
+    def nextInt(self) -> int:
+        if self.pos >= len(self.tokens):
+            raise EOFError('no more input on stdin')
+        t = self.tokens[self.pos]
+        self.pos += 1
+        try:
+            return int(t)
+        except ValueError:
+            raise ValueError(f'input read from stdin was not integer: {t.decode(errors="replace")}')
+
+_bulkInputEnabled = False
+_bulkInput: Optional[BulkInput] = None
+
+def enableBulkInput():
+    """
+    Switches inputInt to bulk mode: the first call reads all of stdin and subsequent
+    calls serve ints from this buffer without prompting. Ints may then be separated by
+    any whitespace, not only by newlines.
+    """
+    global _bulkInputEnabled
+    _bulkInputEnabled = True
+
 def inputInt(prompt: str) -> int:
+    global _bulkInput
+    if _bulkInputEnabled:
+        if _bulkInput is None:
+            _bulkInput = BulkInput(sys.stdin.buffer.read())
+        return _bulkInput.nextInt()
     if sys.stdout.isatty():
         s = input(prompt)
     else:
@@ -29,7 +66,7 @@ def inputInt(prompt: str) -> int:
     try:
         return int(s)
     except ValueError:
-        raise ValueError('input read from stdin was not integer: {s}')
+        raise ValueError(f'input read from stdin was not integer: {s}')
 
 def assertType(x: Any, ty: type):
     if not type(x) is ty:
@@ -1,7 +1,7 @@
 from assembly.common import *
 from assembly.graph import Graph
 import assembly.tac_ast as tac
-import copy
+import assembly.bitLiveness as bitLiveness
 
 def instrDef(instr: tac.instr) -> set[tac.ident]:
     """
@@ -12,15 +12,19 @@ def instrDef(instr: tac.instr) -> set[tac.ident]:
     match instr:
         case tac.Assign(var):
             defs.add(var)
-        case tac.Call(var):
+        case tac.Call(var) | tac.CallIndirect(var):
             if var is not None:
                 defs.add(var)
+        case tac.Load(var) | tac.GlobalGet(var):
+            defs.add(var)
         case tac.GotoIf(): 
             pass
         case tac.Goto():
             pass
         case tac.Label():
             pass
+        case tac.Store() | tac.GlobalSet() | tac.Return() | tac.Trap():
+            pass
     
     return defs
 
@@ -33,11 +37,10 @@ def instrUse(instr: tac.instr) -> set[tac.ident]:
     match instr:
         case tac.Assign(_, left):
             uses = uses.union(expUse(left))
-        case tac.Call(_, name, args):
-            if "print" in name.name:
-                for arg in args:
-                    if isinstance(arg, tac.Name):
-                        uses.add(arg.var)
+        case tac.Call(_, _, args):
+            uses = uses.union(primsUse(args))
+        case tac.CallIndirect(_, idx, args):
+            uses = uses.union(primsUse([idx] + args))
         case tac.GotoIf(test): 
             if isinstance(test, tac.Name):
                 uses.add(test.var)
@@ -45,6 +48,17 @@ def instrUse(instr: tac.instr) -> set[tac.ident]:
             pass
         case tac.Label():
             pass
+        case tac.Load(_, _, addr):
+            uses = uses.union(primsUse([addr]))
+        case tac.Store(_, addr, value):
+            uses = uses.union(primsUse([addr, value]))
+        case tac.GlobalSet(_, value):
+            uses = uses.union(primsUse([value]))
+        case tac.Return(value):
+            if value is not None:
+                uses = uses.union(primsUse([value]))
+        case tac.GlobalGet() | tac.Trap():
+            pass
 
     return uses
 
@@ -63,9 +77,18 @@ def expUse(exp: tac.exp) -> set[tac.ident]:
                 uses.add(left.var)
             if isinstance(right, tac.Name):
                 uses.add(right.var)
+        case tac.UnOp(_, arg):
+            if isinstance(arg, tac.Name):
+                uses.add(arg.var)
     
     return uses
 
+def primsUse(prims: list[tac.prim]) -> set[tac.ident]:
+    """
+    Returns the set of Identifiers used in a list of primitive operands
+    """
+    return {p.var for p in prims if isinstance(p, tac.Name)}
+
 # Each individual instruction has an identifier. This identifier is the tuple
 # (index of basic block, index of instruction inside the basic block)
 type InstrId = tuple[int, int]
@@ -77,85 +100,18 @@ class InterfGraphBuilder:
         # self.after holds, for each instruction I, to set of variables live after I.
         self.after: dict[InstrId, set[tac.ident]] = {}
 
-    def __liveStart(self, bb: BasicBlock, s: set[tac.ident]) -> set[tac.ident]:
-        """
-        Given a set of variables s and a basic block bb, __liveStart computes
-        the set of variables live at the beginning of bb, assuming that s
-        are the variables live at the end of the block.
-
-        Essentially, you have to implement the subalgorithm "Computing L_start" from
-        slide 46 here. You should update self.after and self.before while traversing
-        the instructions of the basic block in reverse.
-        """
-        
-        # number of instructions in block
-        n = len(bb.instrs)
-        
-        # which block
-        block_idx = bb.index
-        
-        # start at the bottom and work to the top
-        instr_idx = len(bb.instrs) -1
-        for instr in reversed(bb.instrs):
-            # If last instruction -> after is the input to the next block
-            if instr_idx + 1 == n:
-                self.after[(block_idx, instr_idx)] = s
-
-            # Else after is the input to the next instruction
-            else: 
-                self.after[(block_idx, instr_idx)] = self.before[(block_idx, instr_idx+1)]
-            
-            # calculate new before value for the instruction
-            new_before: set[tac.ident] = copy.deepcopy(self.after[(block_idx, instr_idx)])
-            new_before.difference_update(instrDef(instr))
-            new_before = new_before.union(instrUse(instr))
-            
-            self.before[(block_idx, instr_idx)] = new_before
-
-            instr_idx -= 1
-            
-        # Return the input to the block
-        return self.before.get((block_idx, 0), set())
-        
-    
     def __liveness(self, g: ControlFlowGraph):
-        """+
+        """
         This method computes liveness information and fills the sets self.before and
-        self.after.
-
-        You have to implement the algorithm for computing liveness in a CFG from
-        slide 46 here.
+        self.after. The fixed point is computed by assembly.bitLiveness.
         """
-        
-        # Inputs to the blocks
-        IN: dict[int, set[tac.Ident]] = {}
-        
-        # Add sets to all basic blocks in dict
-        for bb in list(g.vertices):
-            IN[bb] = set()
-        
-        # Until nothing changes        
-        while True:
-            # Make a copy of the input
-            in_check = copy.deepcopy(IN)
-            
-            # go through the vertices in reverse
-            for vert in reversed(list(g.vertices)):
-                out: set[tac.ident] = set()
-                
-                # get all inputs for the successors of the current block
-                for succ in g.succs(vert):
-                    if g.getData(succ).instrs:
-                        out = out.union(IN[succ])
-                
-                # calc l_start for current block        
-                IN[vert] = self.__liveStart(g.getData(vert), out)
-                
-            if in_check == IN:
-                break
-        
-        
-            
+        live = bitLiveness.analyze(g)
+        for vert in g.vertices:
+            afters = live.afterMasks(vert)
+            for i, after in enumerate(afters):
+                self.after[(vert, i)] = live.idx.toSet(after)
+                self.before[(vert, i)] = live.before((vert, i))
+
     def __addEdgesForInstr(self, instrId: InstrId, instr: tac.instr, interfG: InterfGraph):
         """
         Given an instruction and its ID, adds the edges resulting from the instruction
@@ -187,7 +187,7 @@ def compileCall(exp: Call) -> list[WasmInstr]:
                 instr.extend(compileExp(arg))
     if exp.name.name == "print":
         # check if print must be int or bool
-        print_type = "i64" if isinstance(tyOfExp(exp.args[0]), Int) else "i32"
+        print_type = "i64" if isinstance(tyOfExp(exp.args[0]), Int) else "bool"
         instr.append(WasmInstrCall(WasmId(f"$print_{print_type}")))
     else:
         instr.append(WasmInstrCall(WasmId("$input_i64")))
@@ -1,35 +1,69 @@
 from lang_array.array_ast import *
 import lang_array.array_tychecker as array_tychecker
 import common.utils as utils
+import lang_array.array_vectorize as array_vectorize
 import common.log as log
 from typing import *
+from array import array
 
-@dataclass(frozen=True)
-class Address:
-    value: int
-    def __repr__(self):
-        return f'Address({self.value})'
-
+# An address is the index of an array buffer in the store.
+type Address = int
 type Env = dict[Ident, TyValue]
 type TyValue = int | bool | Address
-type StoreValue = list[TyValue]
+type Buffer = array[int] | bytearray
 
 class Store:
+    """
+    The store holds the content of all arrays. Each array is kept in a compact,
+    typed buffer with the same element size as in the compiled wasm code: ints are
+    stored as 64 bit integers, array references as 32 bit integers, and bools
+    in a single byte.
+    """
     def __init__(self):
-        self.content: dict[Address, StoreValue] = {}
-        self.__freshAddress = Address(0)
-    def alloc(self, val: StoreValue):
-        x = self.__freshAddress
-        self.__freshAddress = Address(x.value + 1)
-        self.content[x] = val
-        return x
-    def resolve(self, a: Address) -> StoreValue:
-        return self.content[a]
+        self.buffers: list[Buffer] = []
+    def alloc(self, elemTy: ty, vals: list[TyValue]) -> Address:
+        return self.__add(newBuffer(elemTy, vals))
+    def allocDyn(self, elemTy: ty, n: int, v: TyValue) -> Address:
+        """
+        Allocates an array of length n with all elements initialized to v.
+        """
+        return self.__add(newBuffer(elemTy, [v]) * n)
+    def __add(self, buf: Buffer) -> Address:
+        self.buffers.append(buf)
+        return len(self.buffers) - 1
+    def resolve(self, a: Address) -> Buffer:
+        return self.buffers[a]
+    def length(self, a: Address) -> int:
+        return len(self.buffers[a])
+    def load(self, a: Address, i: int) -> TyValue:
+        buf = self.buffers[a]
+        if isinstance(buf, bytearray):
+            return bool(buf[i])
+        else:
+            return buf[i]
     def storeValue(self, a: Address, i: int, v: TyValue):
-        l = self.content[a]
-        l[i] = v
+        self.buffers[a][i] = v
     def __repr__(self):
-        return f'Store({self.content})'
+        return f'Store({dict(enumerate(self.buffers))})'
+
+def newBuffer(elemTy: ty, vals: list[TyValue]) -> Buffer:
+    match elemTy:
+        case Int():
+            return array('q', vals)
+        case Bool():
+            return bytearray(vals)
+        case Array():
+            return array('i', vals)
+
+def elemTyOf(e: exp) -> ty:
+    """
+    Returns the element type of an array expression, as computed by the type checker.
+    """
+    match e.ty:
+        case NotVoid(Array(elemTy)):
+            return elemTy
+        case t:
+            raise ValueError(f'Expression {e} has no array type but {t}')
 
 def interpFuncall(id: ident, args: list[exp], env: Env, store: Store) -> Optional[TyValue]:
     match (id.name, args):
@@ -41,7 +75,7 @@ def interpFuncall(id: ident, args: list[exp], env: Env, store: Store) -> Optiona
             return None
         case ('len', [e]):
             v = asAddress(interpExp(e, env, store))
-            return len(store.resolve(v))
+            return store.length(v)
         case _:
             raise ValueError(f'Invalid function call of {id.name} with {len(args)} arguments')
 
@@ -58,7 +92,7 @@ def asValue(v: Optional[TyValue]) -> TyValue:
     return v
 
 def asAddress(v: Optional[TyValue]) -> Address:
-    assert isinstance(v, Address)
+    assert isinstance(v, int) and not isinstance(v, bool)
     return v
 
 def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
@@ -102,48 +136,43 @@ def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
         case ArrayInitDyn(lenExp, initExp):
             n = asInt(interpExp(lenExp, env, store))
             v = asValue(interpExp(initExp, env, store))
-            return store.alloc(n * [v])
+            return store.allocDyn(elemTyOf(e), n, v)
         case ArrayInitStatic(es):
             l = [asValue(interpExp(e, env, store)) for e in es]
-            return store.alloc(l)
+            return store.alloc(elemTyOf(e), l)
         case Subscript(arrayExp, indexExp):
             a = asAddress(interpExp(arrayExp, env, store))
             i = asInt(interpExp(indexExp, env, store))
-            l = store.resolve(a)
-            return l[i]
+            return store.load(a, i)
     raise Exception(f'No match for expression {e}')
 
-def interpStmt(s: stmt, env: Env, store: Store, cont: list[stmt]) -> None:
+def interpStmt(s: stmt, env: Env, store: Store) -> None:
     match s:
         case StmtExp(e):
             interpExp(e, env, store)
-            interpStmts(cont, env, store)
         case Assign(x, e):
             v: Any = interpExp(e, env, store)
             env[x] = v
-            interpStmts(cont, env, store)
         case IfStmt(cond, thenBody, elseBody):
             v = asBool(interpExp(cond, env, store))
             if v:
-                interpStmts(thenBody + cont, env, store)
+                interpStmts(thenBody, env, store)
             else:
-                interpStmts(elseBody + cont, env, store)
+                interpStmts(elseBody, env, store)
         case WhileStmt(cond, body):
-            v = asBool(interpExp(cond, env, store))
-            if v:
-                interpStmts(body + [s] + cont, env, store)
-            else:
-                interpStmts(cont, env, store)
+            if array_vectorize.runVectorized(s, env, store):
+                return
+            while asBool(interpExp(cond, env, store)):
+                interpStmts(body, env, store)
         case SubscriptAssign(leftExp, idxExp, rightExp):
             idx = asInt(interpExp(idxExp, env, store))
-            v = interpExp(rightExp, env, store)
+            v = asValue(interpExp(rightExp, env, store))
             a = asAddress(interpExp(leftExp, env, store))
             store.storeValue(a, idx, v)
-            interpStmts(cont, env, store)
 
 def interpStmts(stmts: list[stmt], env: Env, store: Store) -> None:
-    if len(stmts) > 0:
-        interpStmt(stmts[0], env, store, stmts[1:])
+    for s in stmts:
+        interpStmt(s, env, store)
 
 def interpModule(m: mod):
     utils.assertType(m, Module)
@@ -0,0 +1,232 @@
+"""
+This module implements vectorized execution of simple counted loops of lang_array
+programs with NumPy. Entry point is the function `runVectorized`.
+
+Two kinds of loops are recognized. Here, i is the counter, n the bound, and e an
+element expression:
+
+    while i < n:            while i < n:
+        a[i] = e                s = s + e
+        i = i + 1               i = i + 1
+
+The condition may also be written as i != n. The bound n is either len(x), a variable,
+or a constant. The element expression e is built from int constants, variables not
+assigned in the loop, the counter i, subscripts x[i] of int arrays, and the operators
++, -, and *. Such a loop has no effect except for the store to a[i] or the update of
+the accumulator s. All arrays are accessed only at index i, so the loop can be executed
+as a single NumPy operation over the backing buffers of the arrays, even if the
+arrays alias.
+
+A loop is only vectorized if NumPy is available and if vectorization does not change
+the semantics of the loop: all arrays must be large enough and no intermediate result
+may exceed the range of 64 bit integers. Otherwise, the loop is left to the
+scalar interpreter.
+"""
+
+from __future__ import annotations
+from lang_array.array_ast import *
+import lang_array.array_interp as array_interp
+from typing import *
+from dataclasses import dataclass
+from array import array
+import importlib
+import common.log as log
+
+def _importNumpy() -> Any:
+    try:
+        return importlib.import_module('numpy')
+    except ImportError:
+        return None
+
+_np = _importNumpy()
+
+MAX_INT64 = 2**63 - 1
+
+@dataclass(frozen=True)
+class VectorLoop:
+    counter: Ident
+    bound: exp
+    untilEqual: bool # condition is i != n
+    target: Optional[Ident] # the array stored to
+    acc: Optional[Ident] # the accumulator of a reduction
+    elem: exp
+
+def _isIncrement(s: stmt, x: Ident) -> bool:
+    match s:
+        case Assign(y, BinOp(Name(z), Add(), IntConst(1))) if x == y and x == z:
+            return True
+        case _:
+            return False
+
+def _isBound(e: exp, counter: Ident) -> bool:
+    match e:
+        case IntConst(_):
+            return True
+        case Name(x):
+            return x != counter
+        case Call(Ident('len'), [Name(_)]):
+            return True
+        case _:
+            return False
+
+def _isElemExp(e: exp, counter: Ident, assigned: set[Ident]) -> bool:
+    match e:
+        case IntConst(_):
+            return True
+        case Name(x):
+            return x == counter or x not in assigned
+        case Subscript(Name(_), Name(x)):
+            return x == counter
+        case BinOp(left, Add() | Sub() | Mul(), right):
+            return _isElemExp(left, counter, assigned) and _isElemExp(right, counter, assigned)
+        case _:
+            return False
+
+def matchLoop(s: WhileStmt) -> Optional[VectorLoop]:
+    """
+    Checks whether the while loop s has one of the forms supported for vectorization.
+    """
+    match s:
+        case WhileStmt(BinOp(Name(i), Less() | NotEq() as op, bound), [work, incr]):
+            pass
+        case _:
+            return None
+    if not _isBound(bound, i) or not _isIncrement(incr, i):
+        return None
+    untilEqual = isinstance(op, NotEq)
+    match work:
+        case SubscriptAssign(Name(a), Name(j), e) if j == i and _isElemExp(e, i, {i}):
+            return VectorLoop(i, bound, untilEqual, a, None, e)
+        case Assign(x, BinOp(Name(y), Add(), e)) | Assign(x, BinOp(e, Add(), Name(y))) \
+                if x == y and x != i and bound != Name(x) and _isElemExp(e, i, {i, x}):
+            return VectorLoop(i, bound, untilEqual, None, x, e)
+        case _:
+            return None
+
+def _intValue(v: Optional[array_interp.TyValue]) -> Optional[int]:
+    if isinstance(v, int) and not isinstance(v, bool):
+        return v
+    else:
+        return None
+
+def _intBuffer(x: Ident, env: array_interp.Env, store: array_interp.Store,
+               hi: int) -> Optional[array[int]]:
+    """
+    Returns the buffer of the int array stored in x if it has at least hi elements.
+    """
+    a = _intValue(env.get(x))
+    if a is None or a < 0 or a >= len(store.buffers):
+        return None
+    buf = store.resolve(a)
+    if isinstance(buf, array) and buf.typecode == 'q' and len(buf) >= hi:
+        return buf
+    else:
+        return None
+
+def _magnitude(v: Any) -> int:
+    """
+    Returns the maximal absolute value of a non-empty NumPy array.
+    """
+    return max(abs(int(v.min())), abs(int(v.max())))
+
+def _evalElem(e: exp, loop: VectorLoop, env: array_interp.Env, store: array_interp.Store,
+              lo: int, hi: int) -> Optional[tuple[Any, int]]:
+    """
+    Evaluates the element expression e for all values of the counter between lo
+    (inclusive) and hi (exclusive). The result is either a NumPy array or an int (if
+    e does not depend on the counter), together with an upper bound of the absolute
+    values of the result. Returns None if e cannot be evaluated without changing
+    its semantics.
+    """
+    match e:
+        case IntConst(v):
+            return (v, abs(v))
+        case Name(x) if x == loop.counter:
+            return (_np.arange(lo, hi, dtype=_np.int64), max(abs(lo), abs(hi)))
+        case Name(x):
+            v = _intValue(env.get(x))
+            if v is None:
+                return None
+            return (v, abs(v))
+        case Subscript(Name(x), _):
+            buf = _intBuffer(x, env, store, hi)
+            if buf is None:
+                return None
+            v = _np.frombuffer(buf, dtype=_np.int64)[lo:hi]
+            return (v, _magnitude(v))
+        case BinOp(left, op, right):
+            l = _evalElem(left, loop, env, store, lo, hi)
+            if l is None:
+                return None
+            r = _evalElem(right, loop, env, store, lo, hi)
+            if r is None:
+                return None
+            (lv, lb) = l
+            (rv, rb) = r
+            match op:
+                case Add() | Sub():
+                    b = lb + rb
+                case _:
+                    b = lb * rb
+            if b > MAX_INT64:
+                return None
+            match op:
+                case Add():
+                    return (lv + rv, b)
+                case Sub():
+                    return (lv - rv, b)
+                case _:
+                    return (lv * rv, b)
+        case _:
+            return None
+
+def _evalBound(e: exp, env: array_interp.Env, store: array_interp.Store) -> Optional[int]:
+    match e:
+        case IntConst(v):
+            return v
+        case Name(x):
+            return _intValue(env.get(x))
+        case Call(_, [Name(x)]):
+            a = _intValue(env.get(x))
+            if a is None or a < 0 or a >= len(store.buffers):
+                return None
+            return store.length(a)
+        case _:
+            return None
+
+def runVectorized(s: WhileStmt, env: array_interp.Env, store: array_interp.Store) -> bool:
+    """
+    Tries to execute the while loop s as a vectorized operation. Returns True if the
+    loop was executed, False if the loop must be executed by the scalar interpreter.
+    In the latter case, neither env nor store have been modified.
+    """
+    if _np is None:
+        return False
+    loop = matchLoop(s)
+    if loop is None:
+        return False
+    lo = _intValue(env.get(loop.counter))
+    hi = _evalBound(loop.bound, env, store)
+    if lo is None or hi is None or lo < 0 or lo >= hi:
+        return False
+    elem = _evalElem(loop.elem, loop, env, store, lo, hi)
+    if elem is None:
+        return False
+    (v, b) = elem
+    if loop.target is not None:
+        buf = _intBuffer(loop.target, env, store, hi)
+        if buf is None:
+            return False
+        _np.frombuffer(buf, dtype=_np.int64)[lo:hi] = v
+    elif loop.acc is not None:
+        s0 = _intValue(env.get(loop.acc))
+        if s0 is None or abs(s0) + b * (hi - lo) > MAX_INT64:
+            return False
+        if isinstance(v, int):
+            total = v * (hi - lo)
+        else:
+            total = int(v.sum())
+        env[loop.acc] = s0 + total
+    env[loop.counter] = hi
+    log.debug(f'Executed loop over counter {loop.counter.name} from {lo} to {hi} vectorized')
+    return True
@@ -1,63 +1,235 @@
 from lang_fun.fun_ast import *
 import lang_fun.fun_tychecker as fun_tychecker
+import lang_fun.fun_purity as fun_purity
 import common.utils as utils
 import common.log as log
+from common.lruCache import LruCache
 from typing import *
+from array import array
+from dataclasses import dataclass
 
-@dataclass(frozen=True)
-class Address:
-    value: int
-    def __repr__(self):
-        return f'Address({self.value})'
-
+# An address is the index of an array buffer in the store.
+type Address = int
 type FunEnv = dict[Ident, FunDef]
-type Env = dict[Ident, TyValue]
 type TyValue = int | bool | Address | FunDef
-type StoreValue = list[TyValue]
+type Buffer = array[int] | bytearray | list[TyValue]
+
+class FunInfo:
+    """
+    Assigns a slot index to every parameter and local variable of a function body.
+    The slots of the parameters come first, in the order of the parameters.
+    """
+    def __init__(self, params: list[Ident], body: list[stmt]):
+        self.slots: dict[Ident, int] = {}
+        for x in params:
+            self.__addSlot(x)
+        self.__collectLocals(body)
+    def __addSlot(self, x: Ident):
+        if x not in self.slots:
+            self.slots[x] = len(self.slots)
+    def __collectLocals(self, stmts: list[stmt]):
+        for s in stmts:
+            match s:
+                case Assign(x, _):
+                    self.__addSlot(x)
+                case IfStmt(_, thenBody, elseBody):
+                    self.__collectLocals(thenBody)
+                    self.__collectLocals(elseBody)
+                case WhileStmt(_, body):
+                    self.__collectLocals(body)
+                case _:
+                    pass
+    @property
+    def size(self) -> int:
+        return len(self.slots)
+
+class Frame:
+    """
+    The activation record of a function call (or of the toplevel statements).
+    Local variables live in the slots given by the FunInfo of the function. A variable
+    without a slot, or whose slot has not been assigned yet, is resolved through the
+    parent link, the global function environment.
+    """
+    def __init__(self, info: FunInfo, args: list[TyValue], parent: FunEnv):
+        self.info = info
+        self.slots: list[Optional[TyValue]] = [*args, *([None] * (info.size - len(args)))]
+        self.parent = parent
+    def lookup(self, x: Ident) -> TyValue:
+        i = self.info.slots.get(x)
+        if i is not None:
+            v = self.slots[i]
+            if v is not None:
+                return v
+        return self.parent[x]
+    def assign(self, x: Ident, v: TyValue):
+        self.slots[self.info.slots[x]] = v
+    def __repr__(self):
+        d = {x.name: self.slots[i] for x, i in self.info.slots.items() if self.slots[i] is not None}
+        return f'Frame({d})'
+
+@dataclass
+class ReturnValue:
+    """
+    Signals that a function body executed a return statement.
+    """
+    value: Optional[TyValue]
+
+@dataclass
+class TailCall:
+    """
+    Signals that a function body returns the result of calling fun with args. The
+    call is performed by the caller of the function body, so that tail calls do not
+    consume Python stack.
+    """
+    fun: FunDef
+    args: list[TyValue]
+
+type Completion = ReturnValue | TailCall
+
+type MemoKey = tuple[TyValue, ...]
 
-class ReturnException(Exception):
-    def __init__(self, value: TyValue | None):
-        self.value = value
+class Memo:
+    """
+    Memoization of calls to pure functions (see lang_fun.fun_purity). Each pure
+    function gets its own LRU cache, mapping argument tuples to results.
+    """
+    def __init__(self, pureFuns: set[Ident], maxSize: int):
+        self.caches: dict[Ident, LruCache[MemoKey, TyValue]] = \
+            {f: LruCache(maxSize) for f in pureFuns}
+    def cache(self, f: FunDef) -> Optional[LruCache[MemoKey, TyValue]]:
+        return self.caches.get(f.name)
+    def stats(self) -> dict[str, tuple[int, int]]:
+        """
+        Returns a dictionary mapping function names to the number of hits and misses.
+        """
+        return {f.name: (c.hits, c.misses) for f, c in self.caches.items()}
 
 class Store:
+    """
+    The store holds the content of all arrays. Each array is kept in a compact,
+    typed buffer with the same element size as in the compiled wasm code: ints are
+    stored as 64 bit integers, array references as 32 bit integers, and bools
+    in a single byte. Arrays of functions are stored as plain lists.
+    """
     def __init__(self):
-        self.content: dict[Address, StoreValue] = {}
+        self.buffers: list[Buffer] = []
         self.funEnv: FunEnv = {}
-        self.__freshAddress = Address(0)
-    def alloc(self, val: StoreValue):
-        x = self.__freshAddress
-        self.__freshAddress = Address(x.value + 1)
-        self.content[x] = val
-        return x
-    def resolve(self, a: Address) -> StoreValue:
-        return self.content[a]
+        self.__funInfos: dict[Ident, FunInfo] = {}
+        self.memo: Optional[Memo] = None
+    def alloc(self, elemTy: ty, vals: list[TyValue]) -> Address:
+        return self.__add(newBuffer(elemTy, vals))
+    def allocDyn(self, elemTy: ty, n: int, v: TyValue) -> Address:
+        """
+        Allocates an array of length n with all elements initialized to v.
+        """
+        return self.__add(newBuffer(elemTy, [v]) * n)
+    def __add(self, buf: Buffer) -> Address:
+        self.buffers.append(buf)
+        return len(self.buffers) - 1
+    def resolve(self, a: Address) -> Buffer:
+        return self.buffers[a]
+    def length(self, a: Address) -> int:
+        return len(self.buffers[a])
+    def load(self, a: Address, i: int) -> TyValue:
+        buf = self.buffers[a]
+        if isinstance(buf, bytearray):
+            return bool(buf[i])
+        else:
+            return buf[i]
     def storeValue(self, a: Address, i: int, v: TyValue):
-        l = self.content[a]
-        l[i] = v
+        buf = self.buffers[a]
+        buf[i] = cast(Any, v)
+    def funInfo(self, f: FunDef) -> FunInfo:
+        info = self.__funInfos.get(f.name)
+        if info is None:
+            info = FunInfo([p.var for p in f.params], f.body)
+            self.__funInfos[f.name] = info
+        return info
     def __repr__(self):
-        return f'Store({self.content})'
+        return f'Store({dict(enumerate(self.buffers))})'
 
-def interpFuncall(fun: exp, args: list[exp], env: Env, store: Store) -> Optional[TyValue]:
+def newBuffer(elemTy: ty, vals: list[TyValue]) -> Buffer:
+    match elemTy:
+        case Int():
+            return array('q', cast(list[int], vals))
+        case Bool():
+            return bytearray(cast(list[int], vals))
+        case Array():
+            return array('i', cast(list[int], vals))
+        case Fun():
+            return vals
+
+def elemTyOf(e: exp) -> ty:
+    """
+    Returns the element type of an array expression, as computed by the type checker.
+    """
+    match e.ty:
+        case NotVoid(Array(elemTy)):
+            return elemTy
+        case t:
+            raise ValueError(f'Expression {e} has no array type but {t}')
+
+def isBuiltinCall(fun: exp) -> bool:
+    """
+    Checks whether fun is the target of a call to a builtin function. The scope of
+    the target is set by the type checker.
+    """
+    return isinstance(fun, Name) and isinstance(fun.scope, BuiltinFun)
+
+def interpFuncall(fun: exp, args: list[exp], frame: Frame, store: Store) -> Optional[TyValue]:
     match (fun, args):
         case (Name(Ident('input_int')), []):
             return int(utils.inputInt('Enter some int: '))
         case (Name(Ident('print')), [e]):
-            v = asInt(interpExp(e, env, store))
+            v = asInt(interpExp(e, frame, store))
             print(v)
             return None
         case (Name(Ident('len')), [e]):
-            v = asAddress(interpExp(e, env, store))
-            return len(store.resolve(v))
+            v = asAddress(interpExp(e, frame, store))
+            return store.length(v)
         case _:
-            f = asFunDef(interpExp(fun, env, store))
-            xs = [p.var for p in f.params]
-            vs = [asValue(interpExp(a, env, store)) for a in args]
-            localEnv = cast(Env, store.funEnv.copy())
-            localEnv.update(zip(xs, vs))
-            try:
-                interpStmts(f.body, localEnv, store)
-            except ReturnException as e:
-                return e.value
+            (f, vs) = interpCallTarget(fun, args, frame, store)
+            return callFun(f, vs, store)
+
+def interpCallTarget(fun: exp, args: list[exp], frame: Frame,
+                     store: Store) -> tuple[FunDef, list[TyValue]]:
+    f = asFunDef(interpExp(fun, frame, store))
+    vs = [asValue(interpExp(a, frame, store)) for a in args]
+    return (f, vs)
+
+def callFun(f: FunDef, args: list[TyValue], store: Store) -> Optional[TyValue]:
+    """
+    Calls the user-defined function f. Tail calls of the function body are
+    executed in the loop of callFun, so they run in constant Python stack.
+
+    If memoization is enabled, the result is also the result of all pure functions
+    entered through tail calls, so it is added to the caches of all these functions.
+    """
+    pending: list[tuple[LruCache[MemoKey, TyValue], MemoKey]] = []
+    result: Optional[TyValue] = None
+    while True:
+        cache = store.memo.cache(f) if store.memo is not None else None
+        if cache is not None:
+            key = tuple(args)
+            result = cache.get(key)
+            if result is not None:
+                break
+            pending.append((cache, key))
+        frame = Frame(store.funInfo(f), args, store.funEnv)
+        match interpStmts(f.body, frame, store):
+            case TailCall(g, vs):
+                f = g
+                args = vs
+            case ReturnValue(v):
+                result = v
+                break
+            case None:
+                result = None
+                break
+    if result is not None:
+        for (cache, key) in pending:
+            cache.put(key, result)
+    return result
 
 def asInt(v: Optional[TyValue]) -> int:
     assert isinstance(v, int)
@@ -72,112 +244,124 @@ def asValue(v: Optional[TyValue]) -> TyValue:
     return v
 
 def asAddress(v: Optional[TyValue]) -> Address:
-    assert isinstance(v, Address)
+    assert isinstance(v, int) and not isinstance(v, bool)
     return v
 
 def asFunDef(v: Optional[TyValue]) -> FunDef:
     assert isinstance(v, FunDef)
     return v
 
-def interpExp(e: exp, env: Env, store: Store) -> Optional[TyValue]:
+def interpExp(e: exp, frame: Frame, store: Store) -> Optional[TyValue]:
     match e:
         case IntConst(value):
             return value
         case BoolConst(value):
             return value
         case Call(fun, args):
-            return interpFuncall(fun, args, env, store)
+            return interpFuncall(fun, args, frame, store)
         case UnOp(op, sub):
-            x = interpExp(sub, env, store)
+            x = interpExp(sub, frame, store)
             match op:
                 case USub(): return -x
                 case Not(): return not x
         case BinOp(left, op, right):
-            x: Any = interpExp(left, env, store)
+            x: Any = interpExp(left, frame, store)
             match op:
-                case Sub(): return x - interpExp(right, env, store)
-                case Add(): return x + interpExp(right, env, store)
-                case Mul(): return x * interpExp(right, env, store)
-                case Less(): return x < interpExp(right, env, store)
-                case LessEq(): return x <= interpExp(right, env, store)
-                case Greater(): return x > interpExp(right, env, store)
-                case GreaterEq(): return x >= interpExp(right, env, store)
-                case Eq(): return x == interpExp(right, env, store)
-                case NotEq(): return x != interpExp(right, env, store)
-                case Is(): return x == interpExp(right, env, store) # compare Address values by ==
+                case Sub(): return x - interpExp(right, frame, store)
+                case Add(): return x + interpExp(right, frame, store)
+                case Mul(): return x * interpExp(right, frame, store)
+                case Less(): return x < interpExp(right, frame, store)
+                case LessEq(): return x <= interpExp(right, frame, store)
+                case Greater(): return x > interpExp(right, frame, store)
+                case GreaterEq(): return x >= interpExp(right, frame, store)
+                case Eq(): return x == interpExp(right, frame, store)
+                case NotEq(): return x != interpExp(right, frame, store)
+                case Is(): return x == interpExp(right, frame, store) # compare Address values by ==
                 case And():
                     if x:
-                        return interpExp(right, env, store)
+                        return interpExp(right, frame, store)
                     else:
                         return False
                 case Or():
                     if x:
                         return True
                     else:
-                        return interpExp(right, env, store)
+                        return interpExp(right, frame, store)
         case Name(name):
-            if name in env:
-                return env[name]
-            else:
-                return store.funEnv[name]
+            return frame.lookup(name)
         case ArrayInitDyn(lenExp, initExp):
-            n = asInt(interpExp(lenExp, env, store))
-            v = asValue(interpExp(initExp, env, store))
-            return store.alloc(n * [v])
+            n = asInt(interpExp(lenExp, frame, store))
+            v = asValue(interpExp(initExp, frame, store))
+            return store.allocDyn(elemTyOf(e), n, v)
         case ArrayInitStatic(es):
-            l = [asValue(interpExp(e, env, store)) for e in es]
-            return store.alloc(l)
+            l = [asValue(interpExp(e, frame, store)) for e in es]
+            return store.alloc(elemTyOf(e), l)
         case Subscript(arrayExp, indexExp):
-            a = asAddress(interpExp(arrayExp, env, store))
-            i = asInt(interpExp(indexExp, env, store))
-            l = store.resolve(a)
-            return l[i]
+            a = asAddress(interpExp(arrayExp, frame, store))
+            i = asInt(interpExp(indexExp, frame, store))
+            return store.load(a, i)
     raise Exception(f'No match for expression {e}')
 
-def interpStmt(s: stmt, env: Env, store: Store, cont: list[stmt]) -> None:
+def interpStmt(s: stmt, frame: Frame, store: Store) -> Optional[Completion]:
+    """
+    Executes a single statement. The result is not None if the statement completes
+    the execution of the enclosing function body.
+    """
     match s:
         case StmtExp(e):
-            interpExp(e, env, store)
-            interpStmts(cont, env, store)
+            interpExp(e, frame, store)
         case Assign(x, e):
-            v: Any = interpExp(e, env, store)
-            env[x] = v
-            interpStmts(cont, env, store)
+            v = asValue(interpExp(e, frame, store))
+            frame.assign(x, v)
         case IfStmt(cond, thenBody, elseBody):
-            v = asBool(interpExp(cond, env, store))
+            v = asBool(interpExp(cond, frame, store))
             if v:
-                interpStmts(thenBody + cont, env, store)
+                return interpStmts(thenBody, frame, store)
             else:
-                interpStmts(elseBody + cont, env, store)
+                return interpStmts(elseBody, frame, store)
         case WhileStmt(cond, body):
-            v = asBool(interpExp(cond, env, store))
-            if v:
-                interpStmts(body + [s] + cont, env, store)
-            else:
-                interpStmts(cont, env, store)
+            while asBool(interpExp(cond, frame, store)):
+                c = interpStmts(body, frame, store)
+                if c is not None:
+                    return c
         case SubscriptAssign(leftExp, idxExp, rightExp):
-            idx = asInt(interpExp(idxExp, env, store))
-            v = interpExp(rightExp, env, store)
-            a = asAddress(interpExp(leftExp, env, store))
+            idx = asInt(interpExp(idxExp, frame, store))
+            v = asValue(interpExp(rightExp, frame, store))
+            a = asAddress(interpExp(leftExp, frame, store))
             store.storeValue(a, idx, v)
-            interpStmts(cont, env, store)
+        case Return(Call(fun, args)) if not isBuiltinCall(fun):
+            (f, vs) = interpCallTarget(fun, args, frame, store)
+            return TailCall(f, vs)
         case Return(e):
             if e is not None:
-                x = interpExp(e, env, store)
+                x = interpExp(e, frame, store)
             else:
                 x = None
-            raise ReturnException(x)
+            return ReturnValue(x)
+    return None
 
-def interpStmts(stmts: list[stmt], env: Env, store: Store) -> None:
-    if len(stmts) > 0:
-        interpStmt(stmts[0], env, store, stmts[1:])
+def interpStmts(stmts: list[stmt], frame: Frame, store: Store) -> Optional[Completion]:
+    for s in stmts:
+        c = interpStmt(s, frame, store)
+        if c is not None:
+            return c
+    return None
 
-def interpModule(m: mod):
+def interpModule(m: mod, memoSize: Optional[int] = None):
+    """
+    Interprets the given module. If memoSize is not None, calls of pure functions are
+    memoized with an LRU cache of at most memoSize entries per function.
+    """
     utils.assertType(m, Module)
     fun_tychecker.tycheckModule(m)
-    env: Env = {}
     store = Store()
     for f in m.funs:
         store.funEnv[f.name] = f
-    interpStmts(m.stmts, env, store)
-    log.debug(f'After executing program.\nEnv: {env}\nStore: {store}')
+    if memoSize is not None:
+        store.memo = Memo(fun_purity.pureFunctions(m.funs), memoSize)
+    frame = Frame(FunInfo([], m.stmts), [], store.funEnv)
+    interpStmts(m.stmts, frame, store)
+    log.debug(f'After executing program.\nFrame: {frame}\nStore: {store}')
+    if store.memo is not None:
+        for name, (hits, misses) in store.memo.stats().items():
+            log.info(f'Memoization of {name}: {hits} hits, {misses} misses')
@@ -0,0 +1,114 @@
+"""
+This module implements an analysis that finds the pure functions of a lang_fun module.
+Entry point is the function `pureFunctions`.
+
+A function is pure if its result depends only on its arguments and calling it has no
+observable effect. We use the following conservative approximation: a function is pure if
+
+- all its parameters and its result have type int or bool,
+- its body neither calls input_int nor print,
+- its body contains no assignment to an array element, and
+- all functions called by its body are pure. The function called must be given
+  directly by the name of a user-defined function, calls through variables
+  are not considered pure.
+
+The analysis relies on the scope information computed by the type checker.
+"""
+
+from lang_fun.fun_ast import *
+from typing import *
+import common.log as log
+
+def isBaseTy(t: ty) -> bool:
+    return isinstance(t, Int) or isinstance(t, Bool)
+
+def hasPureSignature(f: FunDef) -> bool:
+    match f.result:
+        case NotVoid(t) if isBaseTy(t):
+            return all(isBaseTy(p.ty) for p in f.params)
+        case _:
+            return False
+
+class _Callees:
+    """
+    Collects the user-defined functions called by a function body. The attribute
+    `unknown` is set if the body has an effect or calls some function not known
+    at analysis time.
+    """
+    def __init__(self):
+        self.funs: set[Ident] = set()
+        self.unknown = False
+
+    def visitExp(self, e: exp):
+        match e:
+            case IntConst() | BoolConst() | Name():
+                pass
+            case Call(Name(Ident('input_int') | Ident('print'), BuiltinFun()), _):
+                self.unknown = True
+            case Call(Name(f, UserFun()), args):
+                self.funs.add(f)
+                self.visitExps(args)
+            case Call(Name(_, BuiltinFun()), args):
+                self.visitExps(args)
+            case Call():
+                self.unknown = True
+            case UnOp(_, sub):
+                self.visitExp(sub)
+            case BinOp(left, _, right):
+                self.visitExp(left)
+                self.visitExp(right)
+            case ArrayInitDyn(lenExp, initExp):
+                self.visitExp(lenExp)
+                self.visitExp(initExp)
+            case ArrayInitStatic(es):
+                self.visitExps(es)
+            case Subscript(arrayExp, indexExp):
+                self.visitExp(arrayExp)
+                self.visitExp(indexExp)
+
+    def visitExps(self, es: list[exp]):
+        for e in es:
+            self.visitExp(e)
+
+    def visitStmts(self, ss: list[stmt]):
+        for s in ss:
+            match s:
+                case StmtExp(e) | Assign(_, e):
+                    self.visitExp(e)
+                case IfStmt(cond, thenBody, elseBody):
+                    self.visitExp(cond)
+                    self.visitStmts(thenBody)
+                    self.visitStmts(elseBody)
+                case WhileStmt(cond, body):
+                    self.visitExp(cond)
+                    self.visitStmts(body)
+                case SubscriptAssign():
+                    self.unknown = True
+                case Return(e):
+                    if e is not None:
+                        self.visitExp(e)
+
+def pureFunctions(funs: list[FunDef]) -> set[Ident]:
+    """
+    Returns the names of all pure functions. The functions must have been
+    type checked before.
+    """
+    callees: dict[Ident, set[Ident]] = {}
+    for f in funs:
+        if not hasPureSignature(f):
+            continue
+        c = _Callees()
+        c.visitStmts(f.body)
+        if not c.unknown:
+            callees[f.name] = c.funs
+    # Remove functions calling impure functions until nothing changes
+    pure = set(callees.keys())
+    changed = True
+    while changed:
+        changed = False
+        for f in list(pure):
+            if not callees[f].issubset(pure):
+                pure.remove(f)
+                changed = True
+    log.debug(f'Pure functions: {sorted(f.name for f in pure)}')
+    return pure
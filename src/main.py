@@ -9,6 +9,7 @@ import common.constants as constants
 import parsers.lang_simple.simple_parser as simple_parser
 import assembly.compiler as tac_comp
 import assembly.tacInterp as tac_interp
+import assembly.tacOpt as tacOpt
 import importlib
 import shell
 import sys
@@ -16,12 +17,17 @@ import os
 import typing
 
 DEFAULT_OUTPUT = 'out.wasm'
+DEFAULT_MEMO_SIZE = 100000
 
 def parseArgs():
     parser = argparse.ArgumentParser(description=f'Run the compiler or interpreter for some language')
     parser.add_argument('--lang', choices=['simple', 'var', 'loop', 'array', 'fun', 'tinyJson'],
                         help='The language (guessed from path of input file if not given)')
     parser.add_argument('--level', help='The loglevel (debug, info, warn)')
+    parser.add_argument('--bulk-input', action='store_true',
+                        help='Read all of stdin at once when the program calls input_int ' \
+                            '(affects interp, tacInterp, and pyrun). Useful for programs ' \
+                            'consuming many inputs.')
     subparsers = parser.add_subparsers(help='Commands', dest='cmd')
 
     helpCompiler = f'''Compiles the given input file. Depending on the extension of the output file,
@@ -49,15 +55,36 @@ exit codes signal a bug in the compiler itself.'''
 
     interp = subparsers.add_parser('interp', help='Runs the given file through our own interpeter')
     interp.add_argument('--level', help='The loglevel (debug, info, warn)')
+    interp.add_argument('--memoize', action='store_true',
+                        help='Memoize calls of pure functions (only works for lang_fun). ' \
+                            'Use --level info to see hit/miss statistics.')
+    interp.add_argument('--memo-size', type=int, default=DEFAULT_MEMO_SIZE, metavar='N',
+                        help='Max number of cached results per function with --memoize ' \
+                            f'(default: {DEFAULT_MEMO_SIZE})')
     interp.add_argument('input', help='Input file .py')
 
     tacInterp = subparsers.add_parser('tacInterp',
                                       help='Compiles the given file to wasm, generates TAC, and ' \
-                                        'interpretes the TAC (only works for lang_var and lang_loop)')
+                                        'interpretes the TAC (works for all languages with ' \
+                                        'a wasm compiler)')
     tacInterp.add_argument('--level', help='The loglevel (debug, info, warn)')
+    tacInterp.add_argument('-O', '--opt-level', type=int, default=0, metavar='N',
+                           choices=range(tacOpt.MAX_OPT_LEVEL + 1),
+                           help='Optimization level for TAC (default: 0, no optimization)')
+    tacInterp.add_argument('--max-mem-size', type=int,
+                           help="Max memory size in number of 64kB pages")
+    tacInterp.add_argument('--max-array-size', type=int,
+                           help="Max size of an array in bytes")
     tacInterp.add_argument('input', help='Input file .py')
     tacInterp.add_argument('--print-tac', action='store_true',
                            help='Print the three-address code instructions')
+    tacInterp.add_argument('--engine', choices=['vm', 'ast', 'pycompile'], default='vm',
+                           help='Execution engine: vm decodes the instructions before ' \
+                               'execution, ast interpretes them directly, pycompile ' \
+                               'translates them to Python code (default: vm)')
+    tacInterp.add_argument('--profile', type=str, metavar='FILE',
+                           help='Write execution counts of basic blocks as JSON to FILE ' \
+                               '(only with --engine=vm)')
 
 
     assembly = subparsers.add_parser('assembly',
@@ -65,7 +92,25 @@ exit codes signal a bug in the compiler itself.'''
                                           '(only works for lang_var and lang_loop)')
     assembly.add_argument('--level', help='The loglevel (debug, info, warn)')
     assembly.add_argument('--max-registers', type=int,
-                          help="Max number of registers used")
+                          help='Max number of registers used for variables. Up to 8, ' \
+                              'only $s0-$s7 are used, up to 18 also $t3-$t9 and ' \
+                              '$a1-$a3 (default: 18)')
+    assembly.add_argument('-O', '--opt-level', type=int, default=0, metavar='N',
+                          choices=range(tacOpt.MAX_OPT_LEVEL + 1),
+                          help='Optimization level for TAC (default: 0, no optimization)')
+    assembly.add_argument('--regalloc', choices=['color', 'briggs', 'linear', 'optimal'],
+                          default='color',
+                          help='Register allocator: color colors the interference graph ' \
+                              'greedily, briggs uses Chaitin-Briggs with spill costs ' \
+                              'weighted by loop depth, linear uses linear scan, which is ' \
+                              'faster for huge programs, optimal searches for the ' \
+                              'allocation with the lowest spill cost (default: color)')
+    assembly.add_argument('--time-budget', type=float, default=1.0, metavar='SECONDS',
+                          help='Time budget of --regalloc=optimal, which falls back to ' \
+                              'briggs if the search does not finish in time (default: 1.0)')
+    assembly.add_argument('--split-live-ranges', action='store_true',
+                          help='Split the live ranges of variables used in loops at the ' \
+                              'loop boundaries if this lowers the estimated spill cost')
     assembly.add_argument('input', help='Input file .py')
     assembly.add_argument('output', default='out.as', help='Output file .as (default: out.as)')
 
@@ -138,6 +183,8 @@ def main():
     args = parseArgs()
     level = log.resolveLevelName(args.level or 'warn')
     log.init(level, 'minipy.log')
+    if args.bulk_input:
+        utils.enableBulkInput()
     if args.lang:
         lang = args.lang
     else:
@@ -167,7 +214,9 @@ def main():
             ast = importModule(lang, 'ast')
             interpMod = importModule(lang, 'interp')
             interpFun = getFun(interpMod, 'interpModule')
-            interpArgs = genericInterp.Args(args.input)
+            if args.memoize and lang != 'fun':
+                utils.abort('Option --memoize only available for language fun')
+            interpArgs = genericInterp.Args(args.input, args.memo_size if args.memoize else None)
             genericInterp.interpMain(interpArgs, interpFun, ast)
         case "pyrun":
             runWithPython(args.input)
@@ -188,12 +237,15 @@ def main():
                 parseFun = getFun(parseMod, 'parseModule')
                 genericParser.parseWithOwnParser(args.input, parserArgs, ast, parseFun)
         case "tacInterp":
-            compileArgs = genericCompiler.Args(args.input, '/tmp/dummy.wasm', 'wat2wasm', 1, 1)
-            tac_interp.interpFile(compileArgs, args.print_tac)
+            compileArgs = genericCompiler.Args(args.input, '/tmp/dummy.wat', 'wat2wasm',
+                                               args.max_mem_size, args.max_array_size,
+                                               optLevel=args.opt_level)
+            tac_interp.interpFile(compileArgs, args.print_tac, args.engine, args.profile, lang)
         case "assembly":
             compileArgs = genericCompiler.Args(args.input, args.output, 'wat2wasm', 1, 1,
-                                               args.max_registers)
-            tac_comp.compileFile(compileArgs)
+                                               args.max_registers, args.opt_level)
+            tac_comp.compileFile(compileArgs, lang, args.regalloc, args.split_live_ranges,
+                                 args.time_budget)
         case _:
             utils.abort(f'Unknown command: {args.cmd}')
 
@@ -0,0 +1,28 @@
+from lang_array.array_ast import *
+from lang_array.array_interp import Store
+
+def test_elementSizes():
+    s = Store()
+    ints = s.allocDyn(Int(), 1000, 0)
+    bools = s.allocDyn(Bool(), 1000, True)
+    arrays = s.allocDyn(Array(Int()), 1000, ints)
+    assert s.resolve(ints).itemsize == 8
+    assert len(s.resolve(bools)) == 1000
+    assert s.resolve(arrays).itemsize == 4
+    assert s.load(bools, 999) is True
+    assert s.load(arrays, 0) == ints
+
+def test_nestedAliasing():
+    s = Store()
+    inner = s.alloc(Int(), [1, 2])
+    outer = s.allocDyn(Array(Int()), 3, inner)
+    s.storeValue(s.load(outer, 0), 1, 42)
+    assert s.load(s.load(outer, 2), 1) == 42
+    assert s.load(inner, 1) == 42
+    other = s.alloc(Int(), [1, 42])
+    assert other != inner
+
+def test_negativeLength():
+    s = Store()
+    a = s.allocDyn(Bool(), -3, False)
+    assert s.length(a) == 0
@@ -0,0 +1,75 @@
+import common.genericParser as genericParser
+import common.utils as utils
+import lang_array.array_ast as array_ast
+import lang_array.array_interp as array_interp
+import lang_array.array_vectorize as array_vectorize
+import lang_array.array_tychecker as array_tychecker
+import shell
+import pytest
+
+def parseArray(src: str) -> array_ast.mod:
+    with shell.tempDir() as d:
+        srcFile = shell.pjoin(d, 'input.py')
+        utils.writeTextFile(srcFile, src)
+        m = genericParser.parseFile(srcFile, array_ast)
+        array_tychecker.tycheckModule(m)
+        return m
+
+def runArray(src: str, capsys: pytest.CaptureFixture[str]) -> str:
+    array_interp.interpModule(parseArray(src))
+    return capsys.readouterr().out.strip()
+
+def whileLoops(m: array_ast.mod) -> list[array_ast.WhileStmt]:
+    return [s for s in m.stmts if isinstance(s, array_ast.WhileStmt)]
+
+loops = """
+n = 3000
+a = n * [2]
+b = n * [0]
+i = 0
+while i < len(a):
+    b[i] = a[i] * i + 1
+    i = i + 1
+s = 0
+i = 0
+while i != n:
+    s = s + (b[i] - a[i])
+    i = i + 1
+i = 0
+while i < n:
+    if i > 0:
+        s = s + 1
+    i = i + 1
+print(s)
+print(b[n - 1])
+"""
+
+def test_matchLoop():
+    m = parseArray(loops)
+    matched = [array_vectorize.matchLoop(s) for s in whileLoops(m)]
+    assert matched[0] is not None and matched[0].target == array_ast.Ident('b')
+    assert matched[1] is not None and matched[1].acc == array_ast.Ident('s')
+    assert matched[2] is None
+
+def test_loops(capsys: pytest.CaptureFixture[str]):
+    # Also exercises the scalar interpreter on loops too long for recursive execution
+    assert runArray(loops, capsys) == '8996999\n5999'
+
+overflow = """
+a = [4611686018427387904, 4611686018427387904]
+s = 0
+i = 0
+while i < 2:
+    s = s + a[i]
+    i = i + 1
+print(s)
+"""
+
+def test_overflowFallsBack(capsys: pytest.CaptureFixture[str]):
+    pytest.importorskip('numpy')
+    m = parseArray(overflow)
+    env: array_interp.Env = {array_ast.Ident('s'): 0, array_ast.Ident('i'): 0}
+    store = array_interp.Store()
+    env[array_ast.Ident('a')] = store.alloc(array_ast.Int(), [2**62, 2**62])
+    assert not array_vectorize.runVectorized(whileLoops(m)[0], env, store)
+    assert runArray(overflow, capsys) == str(2**63)
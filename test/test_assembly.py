@@ -3,20 +3,20 @@ import pytest
 import common.testsupport as testsupport
 import common.log as log
 from common.utils import splitIf, readTextFile
+from assembly.common import REGISTERS
 import shell
 
 pytestmark = pytest.mark.instructor
 
 def params() -> list[tuple[str, str, int]]:
     l = testsupport.collectTestFiles(['test_files'], ['var', 'simple'], ignoreErrorFiles=True)
-    maxRegisters = [8, 2, 1, 0]
+    maxRegisters = [len(REGISTERS), 8, 2, 1, 0]
     return [(lang, src, maxReg) for (lang, src) in l for maxReg in maxRegisters]
 
 def checkMaxRegisters(asFile: str, maxRegisters: int):
-    # We use the registers $s0, $s1 ... for use variables
-    # and registers $t1, $t2, $t3 as temporary registers
-    forbiddenRegisters = [f'$t{i}' for i in range(4, 10)] + \
-        [f'$s{i}' for i in range(8) if i >= maxRegisters]
+    # We use the registers $s0, $s1 ..., then $t3 ... $t9 and $a1 ... $a3 for variables
+    # and registers $t0, $t1, $t2 as temporary registers
+    forbiddenRegisters = REGISTERS[maxRegisters:]
     code = readTextFile(asFile)
     for r in forbiddenRegisters:
         if r in code:
@@ -0,0 +1,112 @@
+from assembly.tac_ast import *
+import assembly.controlFlow as controlFlow
+import assembly.bitLiveness as bitLiveness
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+def names(s: set[ident]) -> set[str]:
+    return {x.name for x in s}
+
+# Block 0: n = input; s = 0
+# Block 1 (loop): c = n; if c goto body
+# Block 2: goto end
+# Block 3 (body): s = s + n; n = n - 1; goto loop
+# Block 4 (end): print s
+sumLoop: list[instr] = [
+    Call(Ident('n'), Ident('$input_i64'), []),
+    Assign(Ident('s'), Prim(Const(0))),
+    Label('loop'),
+    Assign(Ident('c'), Prim(v('n'))),
+    GotoIf(v('c'), 'body'),
+    Goto('end'),
+    Label('body'),
+    Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('n'))),
+    Assign(Ident('n'), BinOp(v('n'), Op('SUB'), Const(1))),
+    Goto('loop'),
+    Label('end'),
+    Call(None, Ident('$print_i64'), [v('s')]),
+]
+
+def test_liveSets():
+    g = controlFlow.buildControlFlowGraph(sumLoop)
+    live = bitLiveness.analyze(g)
+    assert names(live.liveIn(0)) == set()
+    assert names(live.liveIn(1)) == {'n', 's'}
+    assert names(live.liveOut(1)) == {'n', 's'}
+    assert names(live.liveIn(2)) == {'s'}
+    assert names(live.liveIn(3)) == {'n', 's'}
+    assert names(live.liveOut(4)) == set()
+    assert names(live.before((0, 1))) == {'n'}
+    assert names(live.after((0, 1))) == {'n', 's'}
+    assert names(live.after((1, 0))) == {'c', 'n', 's'}
+    assert names(live.before((3, 1))) == {'n', 's'}
+    assert names(live.after((4, 0))) == set()
+
+def test_interfGraph():
+    g = controlFlow.buildControlFlowGraph(sumLoop)
+    interfG = bitLiveness.analyze(g).interfGraph()
+    edges = {tuple(sorted((x.name, y.name))) for (x, y) in interfG.edges}
+    # c = n is a move, so c and n do not interfere
+    assert edges == {('n', 's'), ('c', 's')}
+    assert {x.name for x in interfG.vertices} == {'n', 's', 'c'}
+
+def test_moves():
+    g = controlFlow.buildControlFlowGraph(sumLoop + [Assign(Ident('s'), Prim(v('s')))])
+    live = bitLiveness.analyze(g)
+    assert [(x.name, y.name) for (x, y) in live.moves()] == [('c', 'n')]
+
+def test_moveSourceRedefined():
+    # x = y is a move, but y is redefined while x is still live
+    g = controlFlow.buildControlFlowGraph([
+        Call(Ident('y'), Ident('$input_i64'), []),
+        Assign(Ident('x'), Prim(v('y'))),
+        Assign(Ident('y'), BinOp(v('y'), Op('ADD'), Const(1))),
+        Call(None, Ident('$print_i64'), [v('x')]),
+        Call(None, Ident('$print_i64'), [v('y')]),
+    ])
+    interfG = bitLiveness.analyze(g).interfGraph()
+    assert interfG.succs(Ident('x')) == [Ident('y')]
+
+def test_isolatedVariablesInGraph():
+    g = controlFlow.buildControlFlowGraph([
+        Assign(Ident('x'), Prim(Const(1))),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ])
+    interfG = bitLiveness.analyze(g).interfGraph()
+    assert [x.name for x in interfG.vertices] == ['x']
+    assert interfG.succs(Ident('x')) == []
+
+def test_unreachableBlock():
+    g = controlFlow.buildControlFlowGraph([
+        Assign(Ident('x'), Prim(Const(1))),
+        Goto('end'),
+        Assign(Ident('y'), BinOp(v('x'), Op('ADD'), v('z'))),
+        Label('end'),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ])
+    live = bitLiveness.analyze(g)
+    assert names(live.liveIn(1)) == {'x', 'z'}
+    assert names(live.after((0, 0))) == {'x'}
+
+def test_largeFunction():
+    # A long chain of loops, each reading the variables of the previous one.
+    n = 10000
+    instrs: list[instr] = [Call(Ident('x0'), Ident('$input_i64'), [])]
+    for k in range(n):
+        instrs += [
+            Label(f'l{k}'),
+            Assign(Ident(f'x{k+1}'), BinOp(v(f'x{k}'), Op('SUB'), Const(1))),
+            GotoIf(v(f'x{k+1}'), f'l{k}'),
+        ]
+    instrs.append(Call(None, Ident('$print_i64'), [v(f'x{n}')]))
+    g = controlFlow.buildControlFlowGraph(instrs)
+    live = bitLiveness.analyze(g)
+    assert names(live.liveIn(1)) == {'x0'}
+    assert names(live.liveIn(n)) == {f'x{n-1}'}
+    # Each block is processed at most twice: once initially and once after the
+    # live-in set of its loop successor changed.
+    assert live.iterations <= 2 * len(list(g.vertices))
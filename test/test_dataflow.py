@@ -0,0 +1,117 @@
+from assembly.tac_ast import *
+from assembly.common import *
+import assembly.controlFlow as controlFlow
+import assembly.dataflow as dataflow
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+# Block 0: x = 1 (d0); y = 2 (d1)
+# Block 1 (loop): if x goto body
+# Block 2: goto end
+# Block 3 (body): x = x - 1 (d2); goto loop
+# Block 4 (end): y = x (d3)
+# Block 5: print y
+loop: list[instr] = [
+    Assign(Ident('x'), Prim(Const(1))),
+    Assign(Ident('y'), Prim(Const(2))),
+    Label('loop'),
+    GotoIf(v('x'), 'body'),
+    Goto('end'),
+    Label('body'),
+    Assign(Ident('x'), BinOp(v('x'), Op('SUB'), Const(1))),
+    Goto('loop'),
+    Label('end'),
+    Assign(Ident('y'), Prim(v('x'))),
+    Label('print'),
+    Call(None, Ident('$print_i64'), [v('y')]),
+]
+
+# Reaching definitions of the program above, as bit sets over d0 ... d3
+reachingGen = {0: 0b0011, 1: 0, 2: 0, 3: 0b0100, 4: 0b1000, 5: 0}
+reachingKill = {0: 0b1111, 1: 0, 2: 0, 3: 0b0101, 4: 0b1010, 5: 0}
+
+def test_forwardMay():
+    g = controlFlow.buildControlFlowGraph(loop)
+    a = dataflow.BitVectorAnalysis('forward', reachingGen, reachingKill)
+    res = dataflow.solve(g, a)
+    assert res.inValues[0] == 0
+    assert res.inValues[1] == 0b0111
+    assert res.outValues[3] == 0b0110
+    assert res.inValues[5] == 0b1101
+    # Blocks 1 and 3 are processed again after the back edge from block 3
+    assert res.iterations == 8
+
+def test_forwardMust():
+    g = controlFlow.buildControlFlowGraph(loop)
+    a = dataflow.BitVectorAnalysis('forward', reachingGen, reachingKill,
+                                   must=True, universe=0b1111)
+    res = dataflow.solve(g, a)
+    # Definitions reaching along all paths
+    assert res.inValues[1] == 0b0010
+    assert res.inValues[3] == 0b0010
+    assert res.inValues[5] == 0b1000
+
+def test_backward():
+    # Liveness of x and y, bits 0 and 1
+    g = controlFlow.buildControlFlowGraph(loop)
+    gen = {0: 0, 1: 0b01, 2: 0, 3: 0b01, 4: 0b01, 5: 0b10}
+    kill = {0: 0b11, 1: 0, 2: 0, 3: 0b01, 4: 0b10, 5: 0}
+    res = dataflow.solve(g, dataflow.BitVectorAnalysis('backward', gen, kill))
+    assert res.outValues[5] == 0
+    assert res.inValues[5] == 0b10
+    assert res.inValues[1] == 0b01
+    assert res.outValues[3] == 0b01
+    assert res.inValues[0] == 0
+
+class ConstX:
+    """
+    Tracks whether x holds the same constant on all paths, None means not constant.
+    """
+    direction: dataflow.Direction = 'forward'
+    def boundary(self) -> Optional[int]:
+        return None
+    def initial(self) -> Optional[int]:
+        return None
+    def join(self, x: Optional[int], y: Optional[int]) -> Optional[int]:
+        return x if x == y else None
+    def transfer(self, b: int, bb: BasicBlock, x: Optional[int]) -> Optional[int]:
+        for i in bb.instrs:
+            match i:
+                case Assign(Ident('x'), Prim(Const(c))):
+                    x = c
+                case Assign(Ident('x')):
+                    x = None
+                case _:
+                    pass
+        return x
+
+def test_customLattice():
+    g = controlFlow.buildControlFlowGraph([
+        Assign(Ident('x'), Prim(Const(1))),
+        GotoIf(v('c'), 'l'),
+        Assign(Ident('x'), Prim(Const(1))),
+        Goto('m'),
+        Label('l'),
+        Assign(Ident('x'), Prim(Const(1))),
+        Label('m'),
+        Call(None, Ident('$print_i64'), [v('x')]),
+        Goto('end'),
+        Assign(Ident('x'), Prim(Const(3))),
+        Label('end'),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ])
+    res = dataflow.solve(g, ConstX())
+    assert res.inValues[3] == 1
+    # The unreachable block 4 has no values and does not affect block 5
+    assert 4 not in res.inValues
+    assert res.inValues[5] == 1
+
+def test_customLatticeJoin():
+    g = controlFlow.buildControlFlowGraph(loop)
+    res = dataflow.solve(g, ConstX())
+    assert res.outValues[0] == 1
+    assert res.inValues[1] is None
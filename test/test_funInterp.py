@@ -0,0 +1,108 @@
+import common.genericParser as genericParser
+import common.utils as utils
+import lang_fun.fun_ast as fun_ast
+import lang_fun.fun_interp as fun_interp
+import lang_fun.fun_purity as fun_purity
+import lang_fun.fun_tychecker as fun_tychecker
+import shell
+import pytest
+
+def parseFun(src: str) -> fun_ast.mod:
+    with shell.tempDir() as d:
+        srcFile = shell.pjoin(d, 'input.py')
+        utils.writeTextFile(srcFile, src)
+        return genericParser.parseFile(srcFile, fun_ast)
+
+def runFun(src: str, capsys: pytest.CaptureFixture[str]) -> str:
+    fun_interp.interpModule(parseFun(src))
+    return capsys.readouterr().out.strip()
+
+tailRecursive = """
+def walk(a: list[int], i: int, acc: int) -> int:
+    if i == len(a):
+        return acc
+    else:
+        return walk(a, i + 1, acc + a[i])
+
+def isEven(n: int) -> bool:
+    if n == 0:
+        return True
+    else:
+        return isOdd(n - 1)
+
+def isOdd(n: int) -> bool:
+    if n == 0:
+        return False
+    else:
+        return isEven(n - 1)
+
+print(walk(20000 * [2], 0, 0))
+print(isEven(20001))
+"""
+
+def test_tailCalls(capsys: pytest.CaptureFixture[str]):
+    assert runFun(tailRecursive, capsys) == '40000\nFalse'
+
+returnInLoop = """
+def find(a: list[int], x: int) -> int:
+    i = 0
+    while i < len(a):
+        if a[i] == x:
+            return i
+        i = i + 1
+    return -1
+
+def count(n: int) -> int:
+    if n == 0:
+        return 0
+    return 1 + count(n - 1)
+
+print(find([3, 4, 5], 5))
+print(find([3, 4, 5], 6))
+print(count(50))
+"""
+
+def test_returnInLoop(capsys: pytest.CaptureFixture[str]):
+    assert runFun(returnInLoop, capsys) == '2\n-1\n50'
+
+purityExample = """
+def fib(n: int) -> int:
+    if n < 2:
+        return n
+    return fib(n - 1) + fib(n - 2)
+
+def usesFib(n: int) -> bool:
+    a = [fib(n), 1]
+    return a[0] > a[1]
+
+def noisy(n: int) -> int:
+    print(n)
+    return n
+
+def callsNoisy(n: int) -> int:
+    return noisy(n) + 1
+
+def storesArray(n: int) -> int:
+    a = [n]
+    a[0] = 1
+    return a[0]
+
+def arrayParam(a: list[int]) -> int:
+    return a[0]
+
+def higherOrder(f: Callable[[int], int], n: int) -> int:
+    return f(n)
+
+print(fib(30))
+"""
+
+def test_pureFunctions():
+    m = parseFun(purityExample)
+    fun_tychecker.tycheckModule(m)
+    pure = {f.name for f in fun_purity.pureFunctions(m.funs)}
+    assert pure == {'fib', 'usesFib'}
+
+def test_memoize(capsys: pytest.CaptureFixture[str]):
+    m = parseFun(purityExample)
+    fun_interp.interpModule(m, memoSize=10)
+    assert capsys.readouterr().out.strip() == '832040'
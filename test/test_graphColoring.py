@@ -39,3 +39,27 @@ def test_ManyVarsConflict():
 def test_TooManyVarsConflict():
     graphColoringTester(['x', 'y', 'z'], [('x', 'y'), ('y', 'z'), ('x', 'z')],
                    [('x', '$s0'), ('y', '$s1')], maxRegs=2)
+
+def test_EvenCycleTwoColors():
+    # Choosing by saturation colors bipartite graphs with two colors
+    vars = ['a', 'b', 'c', 'd', 'e', 'f']
+    deps = [('a', 'd'), ('d', 'b'), ('b', 'e'), ('e', 'c'), ('c', 'f'), ('f', 'a')]
+    graphColoringTester(vars, deps,
+                        [('a', '$s0'), ('d', '$s1'), ('b', '$s0'),
+                         ('e', '$s1'), ('c', '$s0'), ('f', '$s1')], maxRegs=2)
+
+def test_LargeGraph():
+    graphColoring = utils.importModuleNotInStudent('compilers.assembly.graphColoring')
+    n = 10000
+    vars = [tac.Ident(f'x{k}') for k in range(n)]
+    g: InterfGraph = Graph('undirected')
+    for x in vars:
+        g.addVertex(x, None)
+    for k in range(n):
+        for d in [1, 7, 31]:
+            g.addEdge(vars[k], vars[(k + d) % n])
+    rm = graphColoring.colorInterfGraph(g, maxRegs=7)
+    for (x, y) in g.edges:
+        rx = rm.resolve(x)
+        assert rx is not None
+        assert rx != rm.resolve(y)
@@ -0,0 +1,131 @@
+from assembly.tac_ast import *
+from assembly.common import PassStats
+import assembly.tacSpill_ast as tacSpill
+import assembly.controlFlow as controlFlow
+import assembly.liveRangeSplit as liveRangeSplit
+import assembly.tacToTacSpill as tacToTacSpill
+import assembly.tacSpillInterp as tacSpillInterp
+import assembly.tacInterp as tacInterp
+import common.genericCompiler as genCompiler
+import common.testsupport as testsupport
+import common.utils as utils
+from assembly.loopToTac import fileToTac, mainFun
+import shell
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+# The inputs a, b, c, d are live during the whole program. The first loop only uses
+# a and b, the second loop only c and d.
+twoLoops: list[instr] = [
+    Call(Ident('a'), Ident('$input_i64'), []),
+    Call(Ident('b'), Ident('$input_i64'), []),
+    Call(Ident('c'), Ident('$input_i64'), []),
+    Call(Ident('d'), Ident('$input_i64'), []),
+    Assign(Ident('i'), Prim(Const(10))),
+    Label('loop1'),
+    GotoIf(v('i'), 'body1'),
+    Goto('mid'),
+    Label('body1'),
+    Assign(Ident('a'), BinOp(v('a'), Op('ADD'), v('b'))),
+    Assign(Ident('i'), BinOp(v('i'), Op('SUB'), Const(1))),
+    Goto('loop1'),
+    Label('mid'),
+    Assign(Ident('j'), Prim(Const(10))),
+    Label('loop2'),
+    GotoIf(v('j'), 'body2'),
+    Goto('end'),
+    Label('body2'),
+    Assign(Ident('c'), BinOp(v('c'), Op('MUL'), v('d'))),
+    Assign(Ident('j'), BinOp(v('j'), Op('SUB'), Const(1))),
+    Goto('loop2'),
+    Label('end'),
+    Call(None, Ident('$print_i64'), [v('a')]),
+    Call(None, Ident('$print_i64'), [v('b')]),
+    Call(None, Ident('$print_i64'), [v('c')]),
+    Call(None, Ident('$print_i64'), [v('d')]),
+]
+
+@pytest.fixture
+def fixedInput(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(utils, 'inputInt', lambda _prompt: 2)
+
+def test_splitLoops():
+    stats = PassStats('split')
+    res = liveRangeSplit.splitLiveRanges(twoLoops, stats, {Ident('a'), Ident('c')})
+    assert stats.counters == {'loops': 2, 'split': 2, 'copies': 4}
+    # The copies in front of the loops go to the end of the preceding blocks
+    assert res[4:7] == [
+        Assign(Ident('i'), Prim(Const(10))),
+        Assign(Ident('a.loop1'), Prim(v('a'))),
+        Label('loop1'),
+    ]
+    # Leaving the loop, the value is copied back
+    assert res[8:10] == [Assign(Ident('a'), Prim(v('a.loop1'))), Goto('mid')]
+    assert Assign(Ident('a.loop1'), BinOp(v('a.loop1'), Op('ADD'), v('b'))) in res
+    assert Assign(Ident('c.loop2'), BinOp(v('c.loop2'), Op('MUL'), v('d'))) in res
+
+def test_splitPreservesSemantics(fixedInput: None, capsys: pytest.CaptureFixture[str]):
+    tacInterp.interpInstrs(twoLoops)
+    expected = capsys.readouterr().out
+    res = liveRangeSplit.splitLiveRanges(twoLoops, PassStats('split'))
+    tacInterp.interpInstrs(res)
+    assert capsys.readouterr().out == expected
+
+def test_splitPreheader():
+    # The loop is entered from two places, so the copy needs a new preheader block
+    instrs: list[instr] = [
+        Call(Ident('x'), Ident('$input_i64'), []),
+        GotoIf(v('x'), 'loop'),
+        Assign(Ident('x'), Prim(Const(3))),
+        Label('loop'),
+        Assign(Ident('x'), BinOp(v('x'), Op('SUB'), Const(1))),
+        GotoIf(v('x'), 'loop'),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ]
+    stats = PassStats('split')
+    res = liveRangeSplit.splitLiveRanges(instrs, stats)
+    assert stats.counters['preheadersCreated'] == 1
+    assert res[1:5] == [
+        GotoIf(v('x'), 'loop_preheader'),
+        Assign(Ident('x'), Prim(Const(3))),
+        Label('loop_preheader'),
+        Assign(Ident('x.loop'), Prim(v('x'))),
+    ]
+    g = controlFlow.buildControlFlowGraph(res)
+    assert len(g.vertices) == 5
+
+def test_splitReducesMemoryTraffic(fixedInput: None, capsys: pytest.CaptureFixture[str]):
+    stats: list[PassStats] = []
+    res1 = tacToTacSpill.tacToTacSpill(twoLoops, 3, regAlloc='briggs')
+    counts1 = tacSpillInterp.run(res1)
+    out1 = capsys.readouterr().out
+    res2 = tacToTacSpill.tacToTacSpill(twoLoops, 3, stats=stats, regAlloc='briggs', split=True)
+    counts2 = tacSpillInterp.run(res2)
+    assert capsys.readouterr().out == out1 == '22\n2\n2048\n2\n'
+    assert [s.counters.get('rejected') for s in stats if s.name == 'split'] == [None]
+    # Without splitting, two of the inputs are loaded in every iteration of one loop.
+    # With splitting, the inputs are only loaded and stored around the loops.
+    assert counts1.loads >= 20
+    assert counts2.loads < 10
+    assert counts2.loads + counts2.stores < (counts1.loads + counts1.stores) * 2 / 3
+
+def params() -> list[tuple[str, str, int, tacToTacSpill.RegAlloc]]:
+    l = testsupport.collectTestFiles(['test_files'], ['loop'], ignoreErrorFiles=True)
+    return [(lang, src, maxRegs, regAlloc) for (lang, src) in l
+            for maxRegs in [3, 1] for regAlloc in ['briggs', 'linear']]
+
+@pytest.mark.parametrize("lang, srcFile, maxRegs, regAlloc", params())
+def test_splitFiles(lang: str, srcFile: str, maxRegs: int, regAlloc: tacToTacSpill.RegAlloc,
+                    tmp_path: str, fixedInput: None, capsys: pytest.CaptureFixture[str]):
+    args = genCompiler.Args(srcFile, shell.pjoin(tmp_path, 'out.wat'))
+    instrs = mainFun(fileToTac(args, lang)).body
+    counts1 = tacSpillInterp.run(tacToTacSpill.tacToTacSpill(instrs, maxRegs, regAlloc=regAlloc))
+    out1 = capsys.readouterr().out
+    counts2 = tacSpillInterp.run(
+        tacToTacSpill.tacToTacSpill(instrs, maxRegs, regAlloc=regAlloc, split=True))
+    assert capsys.readouterr().out == out1
+    assert counts2.loads + counts2.stores <= counts1.loads + counts1.stores + 2
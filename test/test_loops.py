@@ -0,0 +1,78 @@
+from assembly.tac_ast import *
+import assembly.controlFlow as controlFlow
+import assembly.loops as loops
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+# Block 0: i = 0
+# Block 1 (outer): if i goto outerBody
+# Block 2: goto end
+# Block 3 (outerBody): j = 0
+# Block 4 (inner): if j goto innerBody
+# Block 5: goto innerEnd
+# Block 6 (innerBody): j = j - 1; goto inner
+# Block 7 (innerEnd): i = i - 1; goto outer
+# Block 8 (end): print i
+nestedLoops: list[instr] = [
+    Assign(Ident('i'), Prim(Const(3))),
+    Label('outer'),
+    GotoIf(v('i'), 'outerBody'),
+    Goto('end'),
+    Label('outerBody'),
+    Assign(Ident('j'), Prim(Const(2))),
+    Label('inner'),
+    GotoIf(v('j'), 'innerBody'),
+    Goto('innerEnd'),
+    Label('innerBody'),
+    Assign(Ident('j'), BinOp(v('j'), Op('SUB'), Const(1))),
+    Goto('inner'),
+    Label('innerEnd'),
+    Assign(Ident('i'), BinOp(v('i'), Op('SUB'), Const(1))),
+    Goto('outer'),
+    Label('end'),
+    Call(None, Ident('$print_i64'), [v('i')]),
+]
+
+def test_nestedLoops():
+    g = controlFlow.buildControlFlowGraph(nestedLoops)
+    info = loops.loopInfo(g)
+    assert info.backEdges == [(6, 4), (7, 1)]
+    assert sorted(info.loops) == [1, 4]
+    outer = info.loops[1]
+    inner = info.loops[4]
+    assert outer.blocks == {1, 3, 4, 5, 6, 7}
+    assert inner.blocks == {4, 6}
+    assert outer.latches == [7]
+    assert (outer.parent, outer.children, outer.depth) == (None, [4], 1)
+    assert (inner.parent, inner.children, inner.depth) == (1, [], 2)
+    assert info.roots == [1]
+    assert [info.depth(b) for b in range(9)] == [0, 1, 0, 1, 2, 1, 2, 1, 0]
+    assert info.loopOf(5) is outer
+    assert info.loopOf(8) is None
+    assert info.isHeader(4) and not info.isHeader(6)
+
+def test_noLoops():
+    g = controlFlow.buildControlFlowGraph([
+        Assign(Ident('x'), Prim(Const(1))),
+        GotoIf(v('x'), 'l'),
+        Assign(Ident('x'), Prim(Const(2))),
+        Label('l'),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ])
+    info = loops.loopInfo(g)
+    assert info.loops == {} and info.backEdges == []
+    assert all(info.depth(b) == 0 for b in g.vertices)
+
+def test_cachedOnGraph():
+    g = controlFlow.buildControlFlowGraph(nestedLoops)
+    info = loops.loopInfo(g)
+    assert loops.loopInfo(g) is info
+    g.addEdge(8, 0)
+    newInfo = loops.loopInfo(g)
+    assert newInfo is not info
+    assert newInfo.backEdges == [(6, 4), (7, 1), (8, 0)]
+    assert newInfo.depth(1) == 2
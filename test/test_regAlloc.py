@@ -0,0 +1,272 @@
+from assembly.tac_ast import *
+from assembly.common import PassStats, REGISTERS
+import assembly.tacSpill_ast as tacSpill
+import assembly.controlFlow as controlFlow
+import assembly.bitLiveness as bitLiveness
+import assembly.tacToTacSpill as tacToTacSpill
+import assembly.linearScan as linearScan
+import assembly.optimalAlloc as optimalAlloc
+import common.genericCompiler as genCompiler
+import common.testsupport as testsupport
+from assembly.loopToTac import fileToTac, mainFun
+import shell
+import itertools
+import random
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+def params() -> list[tuple[str, str, int]]:
+    l = testsupport.collectTestFiles(['test_files'], ['var', 'loop'], ignoreErrorFiles=True)
+    return [(lang, src, maxRegs) for (lang, src) in l for maxRegs in [len(REGISTERS), 8, 2, 0]]
+
+def checkAllocation(instrs: list[instr], maxRegs: int, regAlloc: tacToTacSpill.RegAlloc):
+    g = controlFlow.buildControlFlowGraph(instrs)
+    regMap = tacToTacSpill.allocRegisters(g, maxRegs, regAlloc)
+    interfG = bitLiveness.analyze(g).interfGraph()
+    for x in interfG.vertices:
+        r = regMap.resolve(x)
+        if r is None:
+            continue
+        assert REGISTERS.index(r.name) < maxRegs
+        for y in interfG.succs(x):
+            assert regMap.resolve(y) != r, f'{x} and {y} interfere but share register {r}'
+
+@pytest.mark.parametrize("lang, srcFile, maxRegs", params())
+def test_briggsValid(lang: str, srcFile: str, maxRegs: int, tmp_path: str):
+    args = genCompiler.Args(srcFile, shell.pjoin(tmp_path, 'out.wat'))
+    checkAllocation(mainFun(fileToTac(args, lang)).body, maxRegs, 'briggs')
+
+@pytest.mark.parametrize("lang, srcFile, maxRegs", params())
+def test_linearValid(lang: str, srcFile: str, maxRegs: int, tmp_path: str):
+    args = genCompiler.Args(srcFile, shell.pjoin(tmp_path, 'out.wat'))
+    checkAllocation(mainFun(fileToTac(args, lang)).body, maxRegs, 'linear')
+
+# The inputs a, b, c, d are live during the whole loop but only used once afterwards,
+# the loop variables s and i are used in every iteration.
+sumLoop: list[instr] = [
+    Call(Ident('a'), Ident('$input_i64'), []),
+    Call(Ident('b'), Ident('$input_i64'), []),
+    Call(Ident('c'), Ident('$input_i64'), []),
+    Call(Ident('d'), Ident('$input_i64'), []),
+    Assign(Ident('s'), Prim(Const(0))),
+    Assign(Ident('i'), Prim(Const(10))),
+    Label('loop'),
+    GotoIf(v('i'), 'body'),
+    Goto('end'),
+    Label('body'),
+    Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('i'))),
+    Assign(Ident('i'), BinOp(v('i'), Op('SUB'), Const(1))),
+    Goto('loop'),
+    Label('end'),
+    Call(None, Ident('$print_i64'), [v('a')]),
+    Call(None, Ident('$print_i64'), [v('b')]),
+    Call(None, Ident('$print_i64'), [v('c')]),
+    Call(None, Ident('$print_i64'), [v('d')]),
+    Call(None, Ident('$print_i64'), [v('s')]),
+]
+
+def spillsInLoop(instrs: list[tacSpill.instr]) -> int:
+    inLoop = False
+    n = 0
+    for i in instrs:
+        match i:
+            case tacSpill.Label(l):
+                inLoop = l in ['loop', 'body']
+            case tacSpill.Spill() | tacSpill.Unspill() if inLoop:
+                n += 1
+            case _:
+                pass
+    return n
+
+def test_briggsSpillsOutsideLoops():
+    checkAllocation(sumLoop, 2, 'briggs')
+    res = tacToTacSpill.tacToTacSpill(sumLoop, 2, regAlloc='briggs')
+    assert spillsInLoop(res) == 0
+    regs = {i.var.name for i in res if isinstance(i, tacSpill.Assign)}
+    assert regs == {'$s0', '$s1'}
+
+def test_linearScanIntervals():
+    g = controlFlow.buildControlFlowGraph(sumLoop)
+    intervals = {i.var.name: i for i in linearScan.buildIntervals(g)}
+    # Positions: a..d are defined at 1, 3, 5, 7, the loop header is at 12, the body
+    # starts at 16, the end block at 22.
+    assert intervals['a'].ranges == [(1, 23)]
+    assert intervals['d'].ranges == [(7, 29)]
+    assert intervals['i'].ranges == [(11, 14), (16, 22)]
+    assert intervals['s'].ranges == [(9, 31)]
+
+def test_linearScanHoles():
+    # x is dead between its last use and its next definition, so y fits into the hole
+    g = controlFlow.buildControlFlowGraph([
+        Call(Ident('x'), Ident('$input_i64'), []),
+        Call(None, Ident('$print_i64'), [v('x')]),
+        Call(Ident('y'), Ident('$input_i64'), []),
+        Call(None, Ident('$print_i64'), [v('y')]),
+        Call(Ident('x'), Ident('$input_i64'), []),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ])
+    intervals = linearScan.buildIntervals(g)
+    byName = {i.var.name: i for i in intervals}
+    assert byName['x'].ranges == [(1, 3), (9, 11)]
+    assert linearScan.linearScan(intervals, 1) == 0
+    assert byName['x'].reg == 0 and byName['y'].reg == 0
+
+def test_linearScanSpillsLongest():
+    g = controlFlow.buildControlFlowGraph(sumLoop)
+    regMap = linearScan.linearScanAlloc(g, 2)
+    # c, d and s end after a and b, so they are spilled. i ends before a and b and gets
+    # the register of b, which ends last.
+    assert regMap.resolve(Ident('a')) == tacSpill.Ident('$s0')
+    assert regMap.resolve(Ident('i')) == tacSpill.Ident('$s1')
+    assert [x for x in 'bcds' if regMap.resolve(Ident(x)) is not None] == []
+
+def test_briggsCoalescesMoves():
+    # The pattern produced by wasmToTac: a temporary is computed and then copied into
+    # a local variable.
+    instrs: list[instr] = [
+        Call(Ident('$a'), Ident('$input_i64'), []),
+        Assign(Ident('$a'), Prim(v('$a'))),
+        Assign(Ident('%R0'), BinOp(v('$a'), Op('ADD'), Const(1))),
+        Assign(Ident('$b'), Prim(v('%R0'))),
+        Assign(Ident('%R1'), BinOp(v('$b'), Op('MUL'), v('$a'))),
+        Assign(Ident('$c'), Prim(v('%R1'))),
+        Call(None, Ident('$print_i64'), [v('$c')]),
+        Call(None, Ident('$print_i64'), [v('$a')]),
+    ]
+    checkAllocation(instrs, 2, 'briggs')
+    res = tacToTacSpill.tacToTacSpill(instrs, 2, regAlloc='briggs')
+    moves = [i for i in res if isinstance(i, tacSpill.Assign) and isinstance(i.left, tacSpill.Prim)]
+    assert moves == []
+    assert not any(isinstance(i, tacSpill.Spill | tacSpill.Unspill) for i in res)
+
+# c is always -1, k is assigned two different constants, z is read before its
+# definition and thus holds 0 on the first iteration.
+rematLoop: list[instr] = [
+    Call(Ident('n'), Ident('$input_i64'), []),
+    Assign(Ident('c'), BinOp(Const(0), Op('SUB'), Const(1))),
+    Assign(Ident('k'), Prim(Const(1))),
+    Label('loop'),
+    GotoIf(v('n'), 'body'),
+    Goto('end'),
+    Label('body'),
+    Call(None, Ident('$print_i64'), [v('z')]),
+    Assign(Ident('z'), Prim(Const(5))),
+    Assign(Ident('n'), BinOp(v('n'), Op('ADD'), v('c'))),
+    Assign(Ident('k'), Prim(Const(2))),
+    Goto('loop'),
+    Label('end'),
+    Call(None, Ident('$print_i64'), [v('k')]),
+    Call(None, Ident('$print_i64'), [v('c')]),
+]
+
+def test_rematerializable():
+    g = controlFlow.buildControlFlowGraph(rematLoop)
+    assert tacToTacSpill.rematerializable(g) == {Ident('c'): -1}
+
+@pytest.mark.parametrize("regAlloc", ['color', 'briggs', 'linear'])
+def test_rematInsteadOfSpill(regAlloc: tacToTacSpill.RegAlloc):
+    stats: list[PassStats] = []
+    res = tacToTacSpill.tacToTacSpill(rematLoop, 0, stats=stats, regAlloc=regAlloc)
+    spills = [i for i in res if isinstance(i, tacSpill.Spill | tacSpill.Unspill)]
+    assert 'c' not in [i.origName for i in spills]
+    assert tacSpill.Assign(tacSpill.Ident('$t1'), tacSpill.Prim(tacSpill.Const(-1))) in res
+    # The last instruction prints c
+    assert res[-2:] == [
+        tacSpill.Assign(tacSpill.Ident('$t0'), tacSpill.Prim(tacSpill.Const(-1))),
+        tacSpill.Call(None, tacSpill.Ident('$print_i64'), [tacSpill.Name(tacSpill.Ident('$t0'))])
+    ]
+    [s] = stats
+    assert s.name == 'regAlloc'
+    assert s.counters['spilled'] == 3
+    assert s.counters['rematerialized'] == 1
+    assert s.counters['rematLoads'] == 2
+    assert s.counters['spillLoads'] == 4
+    assert s.counters['spillStores'] == 5
+
+def test_briggsPrefersRematerialization():
+    # With one register, either n or c is spilled. Spilling c costs no memory traffic.
+    res = tacToTacSpill.tacToTacSpill(rematLoop, 1, regAlloc='briggs')
+    spills = [i for i in res if isinstance(i, tacSpill.Spill | tacSpill.Unspill)]
+    assert 'n' not in [i.origName for i in spills]
+
+def test_extendedRegisters():
+    # All ten variables are live at the same time
+    instrs: list[instr] = [Call(Ident(f'x{k}'), Ident('$input_i64'), []) for k in range(10)] + \
+        [Call(None, Ident('$print_i64'), [v(f'x{k}')]) for k in range(10)]
+    for regAlloc in ['color', 'briggs', 'linear']:
+        checkAllocation(instrs, len(REGISTERS), regAlloc)
+        res = tacToTacSpill.tacToTacSpill(instrs, regAlloc=regAlloc)
+        assert not any(isinstance(i, tacSpill.Spill | tacSpill.Unspill) for i in res)
+        regs = {i.var.name for i in res if isinstance(i, tacSpill.Call) and i.var is not None}
+        assert regs == set(REGISTERS[:10])
+        # With 8 registers, only the $s registers are used
+        res = tacToTacSpill.tacToTacSpill(instrs, 8, regAlloc=regAlloc)
+        regs = {i.var.name for i in res if isinstance(i, tacSpill.Call) and i.var is not None}
+        assert regs == {f'$s{k}' for k in range(8)} | {'$t0'}
+
+@pytest.mark.parametrize("lang, srcFile, maxRegs", params())
+def test_optimalValid(lang: str, srcFile: str, maxRegs: int, tmp_path: str):
+    args = genCompiler.Args(srcFile, shell.pjoin(tmp_path, 'out.wat'))
+    instrs = mainFun(fileToTac(args, lang)).body
+    checkAllocation(instrs, maxRegs, 'optimal')
+    stats: list[PassStats] = []
+    tacToTacSpill.tacToTacSpill(instrs, maxRegs, stats=stats, regAlloc='optimal')
+    c = stats[-1].counters
+    assert c['spillCost'] <= c['briggsSpillCost']
+    assert c['spillCost'] <= c['colorSpillCost']
+
+def colorable(adj: dict[int, set[int]], vertices: list[int], maxRegs: int) -> bool:
+    colors: dict[int, int] = {}
+    def go(k: int) -> bool:
+        if k == len(vertices):
+            return True
+        x = vertices[k]
+        for c in range(maxRegs):
+            if all(colors.get(y) != c for y in adj[x]):
+                colors[x] = c
+                if go(k + 1):
+                    return True
+                del colors[x]
+        return False
+    return go(0)
+
+def randomGraph(rnd: random.Random, n: int, p: float) -> dict[int, set[int]]:
+    adj: dict[int, set[int]] = {x: set() for x in range(n)}
+    for x in range(n):
+        for y in range(x + 1, n):
+            if rnd.random() < p:
+                adj[x].add(y)
+                adj[y].add(x)
+    return adj
+
+@pytest.mark.parametrize("seed", range(20))
+def test_minCostColoring(seed: int):
+    rnd = random.Random(seed)
+    n = 7
+    adj = randomGraph(rnd, n, 0.6)
+    costs: dict[int, float] = {x: rnd.randint(1, 20) for x in range(n)}
+    for maxRegs in [0, 1, 2, 3]:
+        res = optimalAlloc.minCostColoring(adj, costs, maxRegs)
+        assert res.optimal
+        for x, c in res.colors.items():
+            assert 0 <= c < maxRegs and x not in res.spilled
+            assert all(res.colors.get(y) != c for y in adj[x])
+        assert set(res.colors) | res.spilled == set(adj)
+        best = min(sum(costs[x] for x in spilled)
+                   for k in range(n + 1) for spilled in itertools.combinations(range(n), k)
+                   if colorable(adj, [x for x in range(n) if x not in spilled], maxRegs))
+        assert res.cost == best
+
+def test_minCostColoringBudget():
+    adj = randomGraph(random.Random(0), 60, 0.3)
+    costs: dict[int, float] = {x: 1 for x in adj}
+    res = optimalAlloc.minCostColoring(adj, costs, 3, budget=0)
+    # The search stops early but still returns the first coloring found
+    assert not res.optimal
+    for x, c in res.colors.items():
+        assert all(res.colors.get(y) != c for y in adj[x])
+    assert res.cost == len(res.spilled) < len(adj)
@@ -0,0 +1,140 @@
+from assembly.tac_ast import *
+from assembly.common import PassStats
+import assembly.controlFlow as controlFlow
+import assembly.dominators as dominators
+import assembly.ssa as ssa
+import assembly.sccp as sccp
+import assembly.gvn as gvn
+import assembly.tacInterp as tacInterp
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+def printInstr(p: prim) -> instr:
+    return Call(None, Ident('$print_i64'), [p])
+
+# Block 0: i = 0, s = 0
+# Block 1 (loop): c = i < n; if c goto body
+# Block 2: goto end
+# Block 3 (body): s = s + i; i = i + 1; goto loop
+# Block 4 (end): print s
+def loopInstrs(n: int) -> list[instr]:
+    return [
+        Assign(Ident('i'), Prim(Const(0))),
+        Assign(Ident('s'), Prim(Const(0))),
+        Label('loop'),
+        Assign(Ident('c'), BinOp(v('i'), Op('LT_S'), Const(n))),
+        GotoIf(v('c'), 'body'),
+        Goto('end'),
+        Label('body'),
+        Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('i'))),
+        Assign(Ident('i'), BinOp(v('i'), Op('ADD'), Const(1))),
+        Goto('loop'),
+        Label('end'),
+        printInstr(v('s')),
+    ]
+
+def run(instrs: list[instr], capsys: pytest.CaptureFixture[str]) -> str:
+    capsys.readouterr()
+    tacInterp.interpInstrs(instrs)
+    return capsys.readouterr().out
+
+def test_dominators():
+    g = controlFlow.buildControlFlowGraph(loopInstrs(5))
+    idom = dominators.immediateDominators(g)
+    assert idom == {0: 0, 1: 0, 2: 1, 3: 1, 4: 2}
+    assert dominators.dominatorTree(idom) == {0: [1], 1: [2, 3], 2: [4], 3: [], 4: []}
+    assert dominators.dominates(idom, 1, 4)
+    assert not dominators.dominates(idom, 3, 4)
+    df = dominators.dominanceFrontiers(g, idom)
+    assert df == {0: set(), 1: {1}, 2: set(), 3: {1}, 4: set()}
+
+def test_entryInLoop():
+    instrs: list[instr] = [
+        Label('start'),
+        Assign(Ident('x'), BinOp(v('x'), Op('ADD'), Const(1))),
+        GotoIf(v('x'), 'start'),
+    ]
+    g = controlFlow.buildControlFlowGraph(instrs)
+    idom = dominators.immediateDominators(g)
+    assert dominators.dominanceFrontiers(g, idom) == {0: {0}}
+    f = ssa.toSsa(g)
+    [phi] = f.phis[0]
+    assert phi.args == {ssa.ENTRY_PRED: v('x'), 0: v('x.2')}
+
+def test_toSsa(capsys: pytest.CaptureFixture[str]):
+    instrs = loopInstrs(5)
+    f = ssa.buildSsa(instrs)
+    assert [phi.var.name for phi in f.phis[1]] == ['i.2', 's.2']
+    assert f.phis[1][0].args == {0: v('i.1'), 3: v('i.3')}
+    assert f.g.getData(3).instrs[0] == Assign(Ident('s.3'), BinOp(v('s.2'), Op('ADD'), v('i.2')))
+    defs = [ssa.instrDefs(i) for bb in f.g.values for i in bb.instrs]
+    defs += [phi.var for phis in f.phis.values() for phi in phis]
+    names = [x.name for x in defs if x is not None]
+    assert len(names) == len(set(names))
+    res = ssa.fromSsa(f)
+    assert run(res, capsys) == run(instrs, capsys) == '10\n'
+    # The versions do not interfere, so all of them get their original name again
+    assert [i for i in res if not (isinstance(i, Assign) and i.left == Prim(Name(i.var)))] \
+        == instrs
+
+def test_unreachableBlocksDropped():
+    instrs: list[instr] = [
+        Goto('end'),
+        Assign(Ident('x'), Prim(Const(1))),
+        Label('end'),
+        printInstr(v('x')),
+    ]
+    f = ssa.buildSsa(instrs)
+    assert sorted(f.g.vertices) == [0, 2]
+    assert ssa.fromSsa(f) == [Goto('end'), Label('end'), printInstr(v('x'))]
+
+def test_sccp(capsys: pytest.CaptureFixture[str]):
+    # x is always 1, which needs the executable edges to find out
+    instrs: list[instr] = [
+        Assign(Ident('x'), Prim(Const(1))),
+        Label('loop'),
+        Assign(Ident('c'), BinOp(v('x'), Op('EQ'), Const(1))),
+        GotoIf(v('c'), 'skip'),
+        Assign(Ident('x'), Prim(Const(2))),
+        Label('skip'),
+        Call(Ident('y'), Ident('$input_i64'), []),
+        GotoIf(v('y'), 'loop'),
+        printInstr(v('x')),
+    ]
+    f = ssa.buildSsa(instrs)
+    stats = PassStats('ssa')
+    sccp.sccp(f, stats)
+    assert stats.counters == {'folded': 1, 'branchesFolded': 1, 'blocksRemoved': 1}
+    res = ssa.fromSsa(f)
+    assert res[-1] == printInstr(Const(1))
+    assert not any(isinstance(i, GotoIf) and i.label == 'skip' for i in res)
+
+def test_gvn(capsys: pytest.CaptureFixture[str]):
+    instrs: list[instr] = [
+        Assign(Ident('a'), Prim(Const(7))),
+        Assign(Ident('b'), Prim(Const(3))),
+        Assign(Ident('x'), BinOp(v('a'), Op('MUL'), v('b'))),
+        GotoIf(v('a'), 'other'),
+        Assign(Ident('y'), BinOp(v('b'), Op('MUL'), v('a'))),
+        Goto('end'),
+        Label('other'),
+        Assign(Ident('y'), BinOp(v('a'), Op('MUL'), v('b'))),
+        Assign(Ident('z'), BinOp(v('a'), Op('SUB'), v('b'))),
+        Label('end'),
+        Assign(Ident('w'), BinOp(v('a'), Op('MUL'), v('b'))),
+        printInstr(v('y')),
+        printInstr(v('w')),
+    ]
+    f = ssa.buildSsa(instrs)
+    stats = PassStats('ssa')
+    gvn.gvn(f, stats)
+    # Both definitions of y and the one of w are copies of x. The phi function for y
+    # has the same value on both edges.
+    assert stats.counters == {'replaced': 3, 'phisRemoved': 1}
+    res = ssa.fromSsa(f)
+    assert res[-2:] == [printInstr(v('x')), printInstr(v('x'))]
+    assert run(res, capsys) == run(instrs, capsys) == '21\n21\n'
@@ -7,20 +7,25 @@ import shell
 pytestmark = pytest.mark.instructor
 
 def params() -> list[tuple[str, str]]:
-    l = testsupport.collectTestFiles(['test_files'], ['var', 'simple'])
+    l = testsupport.collectTestFiles(['test_files'], ['var', 'loop', 'array'])
     return l
 
-def runTest(lang: str, srcFile: str, tmp: str, captureErr: bool, input: str|None, extraArgs: str|None) -> shell.RunResult:
-    cmd = f'python src/main.py --lang={lang} tacInterp {srcFile}'
+def runTest(lang: str, srcFile: str, engine: str, tmp: str, captureErr: bool, input: str|None,
+            extraArgs: str|None) -> shell.RunResult:
+    cmd = f'python src/main.py --lang={lang} tacInterp --engine={engine}'
+    if extraArgs:
+        cmd = cmd + ' ' + extraArgs
+    cmd = cmd + ' ' + srcFile
     log.info(f'Running command {cmd}')
     res = shell.run(cmd, captureStderr=captureErr, captureStdout=True, onError='ignore', input=input)
     return res
 
+@pytest.mark.parametrize("engine", ['ast', 'vm', 'pycompile'])
 @pytest.mark.parametrize("lang, srcFile", params())
-def test_tacInterp(lang: str, srcFile: str, tmp_path: str):
+def test_tacInterp(lang: str, srcFile: str, engine: str, tmp_path: str):
     testsupport.runFileTest(
         srcFile,
         lambda captureErr, input, extraArgs: \
-            runTest(lang, srcFile, tmp_path, captureErr, input, extraArgs)
+            runTest(lang, srcFile, engine, tmp_path, captureErr, input, extraArgs)
     )
 
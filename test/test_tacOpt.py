@@ -0,0 +1,223 @@
+from assembly.tac_ast import *
+from assembly.common import PassStats
+import assembly.tacOpt as tacOpt
+import assembly.constProp as constProp
+import assembly.copyProp as copyProp
+import assembly.valueNumbering as valueNumbering
+import assembly.licm as licm
+import assembly.tacVm as tacVm
+import common.genericCompiler as genCompiler
+import common.testsupport as testsupport
+from assembly.loopToTac import fileToTac
+import io
+import sys
+import shell
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+def params() -> list[tuple[str, str]]:
+    return testsupport.collectTestFiles(['test_files'], ['var', 'loop', 'array'],
+                                        ignoreErrorFiles=True)
+
+def compileArgs(srcFile: str, tmp: str) -> genCompiler.Args:
+    opts: dict[str, int] = {}
+    extraArgs = testsupport.readFileOpt(shell.removeExt(srcFile) + '.args')
+    for a in (extraArgs or '').split():
+        k, x = a.split('=')
+        opts[k] = int(x)
+    return genCompiler.Args(srcFile, shell.pjoin(tmp, 'out.wat'),
+                            maxMemSize=opts.get('--max-mem-size'),
+                            maxArraySize=opts.get('--max-array-size'))
+
+@pytest.mark.parametrize("lang, srcFile", params())
+def test_optimizedOutput(lang: str, srcFile: str, tmp_path: str,
+                         monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]):
+    input = testsupport.readFileOpt(shell.removeExt(srcFile) + '.in')
+    expected = testsupport.getGolden(srcFile, input)
+    prog = tacOpt.optimizeProgram(fileToTac(compileArgs(srcFile, tmp_path), lang),
+                                  tacOpt.MAX_OPT_LEVEL)
+    capsys.readouterr()
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(input or ''))
+    tacVm.runProgram(tacVm.decodeProgram(prog))
+    assert capsys.readouterr().out.strip() == expected
+
+def test_constProp():
+    instrs: list[instr] = [
+        Assign(Ident('x'), Prim(Const(3))),
+        Assign(Ident('y'), BinOp(v('x'), Op('MUL'), Const(4))),
+        Assign(Ident('c'), BinOp(v('y'), Op('GT_S'), Const(10))),
+        GotoIf(v('c'), 'big'),
+        Call(None, Ident('$print_i64'), [Const(0)]),
+        Label('big'),
+        Call(Ident('z'), Ident('$input_i64'), []),
+        Assign(Ident('w'), BinOp(v('y'), Op('LT_S'), v('z'))),
+        Call(None, Ident('$print_i64'), [v('w')]),
+    ]
+    stats = PassStats('constProp')
+    assert constProp.constProp(instrs, stats) == [
+        Assign(Ident('x'), Prim(Const(3))),
+        Assign(Ident('y'), Prim(Const(12))),
+        Assign(Ident('c'), Prim(Const(1))),
+        Label('big'),
+        Call(Ident('z'), Ident('$input_i64'), []),
+        Assign(Ident('w'), BinOp(v('z'), Op('GT_S'), Const(12))),
+        Call(None, Ident('$print_i64'), [v('w')]),
+    ]
+    assert stats.counters == {'folded': 2, 'branchesFolded': 1, 'blocksRemoved': 1}
+
+def test_constPropLoop():
+    # The value of x is only known before the loop
+    instrs: list[instr] = [
+        Assign(Ident('x'), Prim(Const(0))),
+        Assign(Ident('k'), Prim(Const(5))),
+        Label('loop'),
+        Assign(Ident('c'), BinOp(v('x'), Op('LT_S'), v('k'))),
+        GotoIf(v('c'), 'body'),
+        Goto('exit'),
+        Label('body'),
+        Assign(Ident('x'), BinOp(v('x'), Op('ADD'), Const(1))),
+        Goto('loop'),
+        Label('exit'),
+        Call(None, Ident('$print_i64'), [v('x')]),
+    ]
+    res = constProp.constProp(instrs, PassStats('constProp'))
+    assert res[3] == Assign(Ident('c'), BinOp(v('x'), Op('LT_S'), Const(5)))
+    assert res[-1] == Call(None, Ident('$print_i64'), [v('x')])
+
+def test_largeConstantsNotFolded():
+    instrs: list[instr] = [
+        Assign(Ident('x'), Prim(Const(30000))),
+        Assign(Ident('y'), BinOp(v('x'), Op('ADD'), v('x'))),
+    ]
+    res = constProp.constProp(instrs, PassStats('constProp'))
+    assert res[1] == Assign(Ident('y'), BinOp(Const(30000), Op('ADD'), Const(30000)))
+
+def test_copyPropDce():
+    instrs: list[instr] = [
+        Call(Ident('%R0'), Ident('$input_i64'), []),
+        Assign(Ident('x'), Prim(v('%R0'))),
+        Assign(Ident('%R1'), BinOp(v('x'), Op('ADD'), Const(1))),
+        Assign(Ident('y'), Prim(v('%R1'))),
+        Assign(Ident('unused'), BinOp(v('y'), Op('MUL'), v('y'))),
+        Label('loop'),
+        Assign(Ident('%R2'), BinOp(v('y'), Op('LT_S'), v('x'))),
+        GotoIf(v('%R2'), 'end'),
+        Assign(Ident('%R3'), Prim(v('y'))),
+        Assign(Ident('y'), BinOp(v('%R3'), Op('SUB'), Const(1))),
+        Goto('loop'),
+        Label('end'),
+        Call(None, Ident('$print_i64'), [v('y')]),
+    ]
+    stats = PassStats('copyProp')
+    assert copyProp.copyPropDce(instrs, stats) == [
+        Call(Ident('%R0'), Ident('$input_i64'), []),
+        Assign(Ident('%R1'), BinOp(v('%R0'), Op('ADD'), Const(1))),
+        Assign(Ident('y'), Prim(v('%R1'))),
+        Label('loop'),
+        Assign(Ident('%R2'), BinOp(v('y'), Op('LT_S'), v('%R0'))),
+        GotoIf(v('%R2'), 'end'),
+        Assign(Ident('y'), BinOp(v('y'), Op('SUB'), Const(1))),
+        Goto('loop'),
+        Label('end'),
+        Call(None, Ident('$print_i64'), [v('y')]),
+    ]
+    assert stats.counters['deadRemoved'] == 3
+    assert stats.counters['interfVerticesRemoved'] > 0
+
+def test_copyKilledByRedefinition():
+    instrs: list[instr] = [
+        Call(Ident('a'), Ident('$input_i64'), []),
+        Assign(Ident('b'), Prim(v('a'))),
+        Assign(Ident('a'), BinOp(v('a'), Op('ADD'), Const(1))),
+        Call(None, Ident('$print_i64'), [v('b')]),
+        Call(None, Ident('$print_i64'), [v('a')]),
+    ]
+    assert copyProp.copyPropDce(instrs, PassStats('copyProp')) == instrs
+
+def test_valueNumbering():
+    instrs: list[instr] = [
+        Call(Ident('i'), Ident('$input_i64'), []),
+        Assign(Ident('a'), BinOp(v('i'), Op('MUL'), Const(8))),
+        Assign(Ident('j'), Prim(v('i'))),
+        Assign(Ident('b'), BinOp(Const(8), Op('MUL'), v('j'))),
+        Assign(Ident('c'), BinOp(v('i'), Op('SUB'), Const(8))),
+        Assign(Ident('d'), BinOp(Const(8), Op('SUB'), v('i'))),
+        Assign(Ident('a'), Prim(Const(0))),
+        Assign(Ident('e'), BinOp(v('j'), Op('MUL'), Const(8))),
+        Assign(Ident('i'), BinOp(v('i'), Op('ADD'), Const(1))),
+        Assign(Ident('f'), BinOp(v('i'), Op('MUL'), Const(8))),
+        Label('l'),
+        Assign(Ident('g'), BinOp(v('i'), Op('MUL'), Const(8))),
+    ]
+    stats = PassStats('valueNumbering')
+    res = valueNumbering.valueNumbering(instrs, stats)
+    assert res[3] == Assign(Ident('b'), Prim(v('a')))
+    assert res[4:7] == instrs[4:7]
+    # a was redefined, but b still holds the value
+    assert res[7] == Assign(Ident('e'), Prim(v('b')))
+    # i was redefined
+    assert res[9:] == instrs[9:]
+    assert stats.counters == {'replaced': 2}
+
+def whileLoop(entry: list[instr], body: list[instr]) -> list[instr]:
+    return entry + [
+        Label('loop'),
+        Assign(Ident('c'), BinOp(v('i'), Op('LT_S'), v('n'))),
+        GotoIf(v('c'), 'body'),
+        Goto('exit'),
+        Label('body'),
+    ] + body + [
+        Assign(Ident('i'), BinOp(v('i'), Op('ADD'), Const(1))),
+        Goto('loop'),
+        Label('exit'),
+        Call(None, Ident('$print_i64'), [v('s')]),
+    ]
+
+def test_licm():
+    entry: list[instr] = [
+        Call(Ident('n'), Ident('$input_i64'), []),
+        Call(Ident('a'), Ident('$input_i64'), []),
+    ]
+    instrs = whileLoop(entry, [
+        Assign(Ident('t'), BinOp(v('a'), Op('MUL'), Const(3))),
+        Assign(Ident('u'), BinOp(v('t'), Op('ADD'), v('n'))),
+        Assign(Ident('w'), BinOp(v('i'), Op('ADD'), v('u'))),
+        Call(Ident('r'), Ident('$input_i64'), []),
+        Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('w'))),
+    ])
+    stats = PassStats('licm')
+    res = licm.licm(instrs, stats)
+    # t and u are moved to the end of the block before the loop
+    assert res == entry + instrs[7:9] + instrs[2:7] + instrs[9:]
+    assert stats.counters == {'loops': 1, 'hoisted': 2}
+
+def test_licmPreheader():
+    entry: list[instr] = [
+        Call(Ident('a'), Ident('$input_i64'), []),
+        GotoIf(v('a'), 'loop'),
+        Assign(Ident('s'), Prim(Const(1))),
+    ]
+    instrs = whileLoop(entry, [
+        Assign(Ident('t'), BinOp(v('a'), Op('MUL'), Const(3))),
+        Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('t'))),
+    ])
+    stats = PassStats('licm')
+    res = licm.licm(instrs, stats)
+    assert res[:5] == [entry[0], GotoIf(v('a'), 'loop_preheader'), entry[2],
+                       Label('loop_preheader'), instrs[8]]
+    assert Goto('loop') in res
+    assert stats.counters == {'loops': 1, 'hoisted': 1, 'preheadersCreated': 1}
+
+def test_licmLiveValuesStay():
+    instrs = whileLoop([Call(Ident('a'), Ident('$input_i64'), [])], [
+        # t is live at the exit and v at the loop header
+        Assign(Ident('t'), BinOp(v('a'), Op('MUL'), Const(3))),
+        Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('v'))),
+        Assign(Ident('v'), BinOp(v('a'), Op('ADD'), Const(1))),
+    ])
+    instrs.append(Call(None, Ident('$print_i64'), [v('t')]))
+    assert licm.licm(instrs, PassStats('licm')) == instrs
@@ -0,0 +1,41 @@
+from assembly.tacSpill_ast import *
+import assembly.tacSpillInterp as tacSpillInterp
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def r(x: str) -> Name:
+    return Name(Ident(x))
+
+# s = 0; i = 3; while i: s = s + i (s spilled); i = i - 1; print(s)
+spillLoop: list[instr] = [
+    Assign(Ident('$t0'), Prim(Const(0))),
+    Spill(Ident('$t0'), 's'),
+    Assign(Ident('$s0'), Prim(Const(3))),
+    Label('loop'),
+    GotoIf(r('$s0'), 'body'),
+    Goto('end'),
+    Label('body'),
+    Unspill(Ident('$t0'), 's'),
+    Assign(Ident('$t0'), BinOp(r('$t0'), Op('ADD'), r('$s0'))),
+    Spill(Ident('$t0'), 's'),
+    Assign(Ident('$s0'), BinOp(r('$s0'), Op('SUB'), Const(1))),
+    Goto('loop'),
+    Label('end'),
+    Unspill(Ident('$t0'), 's'),
+    Call(None, Ident('$print_i64'), [r('$t0')]),
+]
+
+def test_counts(capsys: pytest.CaptureFixture[str]):
+    counts = tacSpillInterp.run(spillLoop)
+    assert capsys.readouterr().out == '6\n'
+    # 3 instructions before the loop, 4 tests, 3 iterations of the body, 3 at the end
+    assert counts == tacSpillInterp.Counts(instrs=3 + 4 + 3 * 5 + 3, loads=4, stores=4)
+
+def test_32bit(capsys: pytest.CaptureFixture[str]):
+    tacSpillInterp.run([
+        Assign(Ident('$s0'), Prim(Const(2**31 - 1))),
+        Assign(Ident('$s0'), BinOp(r('$s0'), Op('ADD'), Const(1))),
+        Call(None, Ident('$print_i64'), [r('$s0')]),
+    ])
+    assert capsys.readouterr().out == f'{-2**31}\n'
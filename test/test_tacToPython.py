@@ -0,0 +1,58 @@
+from assembly.tac_ast import *
+import assembly.tacVm as tacVm
+import assembly.tacToPython as tacToPython
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+# Counts the pairs (i, j) with 0 <= j < i < 30 and i * j even.
+nestedLoop: list[instr] = [
+    Assign(Ident('n'), Prim(Const(0))),
+    Assign(Ident('i'), Prim(Const(0))),
+    Label('outer'),
+    Assign(Ident('c'), BinOp(v('i'), Op('LT_S'), Const(30))),
+    GotoIf(v('c'), 'outerBody'),
+    Goto('exit'),
+    Label('outerBody'),
+    Assign(Ident('j'), Prim(Const(0))),
+    Label('inner'),
+    Assign(Ident('c'), BinOp(v('j'), Op('GE_S'), v('i'))),
+    GotoIf(v('c'), 'innerExit'),
+    Assign(Ident('p'), BinOp(v('i'), Op('MUL'), v('j'))),
+    Assign(Ident('h'), BinOp(v('p'), Op('SUB'), Const(1))),
+    Assign(Ident('c'), BinOp(v('p'), Op('EQ'), Const(0))),
+    GotoIf(v('c'), 'even'),
+    Assign(Ident('k'), Prim(v('p'))),
+    Label('half'),
+    Assign(Ident('k'), BinOp(v('k'), Op('SUB'), Const(2))),
+    Assign(Ident('c'), BinOp(v('k'), Op('GT_S'), Const(1))),
+    GotoIf(v('c'), 'half'),
+    Assign(Ident('c'), BinOp(v('k'), Op('NE'), Const(0))),
+    GotoIf(v('c'), 'next'),
+    Label('even'),
+    Assign(Ident('n'), BinOp(v('n'), Op('ADD'), Const(1))),
+    Label('next'),
+    Assign(Ident('j'), BinOp(v('j'), Op('ADD'), Const(1))),
+    Goto('inner'),
+    Label('innerExit'),
+    Assign(Ident('i'), BinOp(v('i'), Op('ADD'), Const(1))),
+    Goto('outer'),
+    Label('exit'),
+    Call(None, Ident('$print_i64'), [v('n')]),
+]
+
+def test_tacToPython(capsys: pytest.CaptureFixture[str]):
+    expected = sum(1 for i in range(30) for j in range(i) if i * j % 2 == 0)
+    prog = tacToPython.tacToPython(nestedLoop)
+    vars = tacToPython.run(prog)
+    assert capsys.readouterr().out == f'{expected}\n'
+    assert vars == tacVm.run(tacVm.decode(nestedLoop))
+    assert capsys.readouterr().out == f'{expected}\n'
+
+def test_invalidCall():
+    prog = tacToPython.tacToPython([Call(None, Ident('$foo'), [])])
+    with pytest.raises(ValueError):
+        tacToPython.run(prog)
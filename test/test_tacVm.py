@@ -0,0 +1,94 @@
+from assembly.tac_ast import *
+import assembly.tacVm as tacVm
+import assembly.tacInterp as tacInterp
+import assembly.controlFlow as controlFlow
+import assembly.tacRuntime as tacRuntime
+import assembly.tacToPython as tacToPython
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def v(x: str) -> Name:
+    return Name(Ident(x))
+
+# s = 0; i = 0; while i < 100: s = s + i; i = i + 1; print(s)
+sumLoop: list[instr] = [
+    Assign(Ident('s'), Prim(Const(0))),
+    Assign(Ident('i'), Prim(Const(0))),
+    Label('start'),
+    Assign(Ident('c'), BinOp(v('i'), Op('GE_S'), Const(100))),
+    GotoIf(v('c'), 'exit'),
+    Assign(Ident('s'), BinOp(v('s'), Op('ADD'), v('i'))),
+    Assign(Ident('i'), BinOp(v('i'), Op('ADD'), Const(1))),
+    Goto('start'),
+    Goto('start'),
+    Label('exit'),
+    Label('exit2'),
+    Call(None, Ident('$print_i64'), [v('s')]),
+    Label('end'),
+]
+
+def test_run(capsys: pytest.CaptureFixture[str]):
+    vars = tacVm.run(tacVm.decode(sumLoop))
+    assert vars[Ident('s')] == 4950
+    assert vars[Ident('c')] == 1
+    assert capsys.readouterr().out == '4950\n'
+    tacInterp.interpInstrs(sumLoop)
+    assert capsys.readouterr().out == '4950\n'
+
+def test_profile(capsys: pytest.CaptureFixture[str]):
+    prog = tacVm.decode(sumLoop, profile=True)
+    tacVm.run(prog)
+    blocks = prog.blocks
+    assert blocks is not None
+    cfg = controlFlow.buildControlFlowGraph(sumLoop)
+    assert [b.labels for b in blocks] == [cfg.getData(i).labels for i in sorted(cfg.vertices)]
+    assert [b.count for b in blocks] == [1, 101, 100, 0, 1, 1]
+
+def fun(name: str, params: list[str], body: list[instr]) -> Fun:
+    return Fun(Ident(name), [Ident(p) for p in params], [], body)
+
+# A program with functions, memory, globals, and indirect calls
+program = TacProgram(
+    [Global(Ident('$g'), 40)],
+    [Data(0, 'IndexError')],
+    [Ident('$double'), Ident('$print_i64')],
+    100,
+    [
+        fun('$double', ['x'], [
+            Assign(Ident('y'), BinOp(v('x'), Op('MUL'), Const(2))),
+            Return(v('y'))
+        ]),
+        fun('$main', [], [
+            Call(Ident('a'), Ident('$double'), [Const(21)]),
+            GlobalGet(Ident('p'), Ident('$g')),
+            Store(8, v('p'), v('a')),
+            Load(Ident('b'), 8, v('p')),
+            CallIndirect(Ident('c'), Const(0), [v('b')]),
+            CallIndirect(None, Const(1), [v('c')]),
+            Store(4, Const(32), Const(-1)),
+            Load(Ident('d'), 4, Const(32)),
+            Assign(Ident('e'), UnOp(Op('EXTEND_I32_S'), v('d'))),
+            Call(None, Ident('$print_i64'), [v('e')]),
+            Call(None, Ident('$print_err'), [Const(0), Const(10)]),
+            GlobalSet(Ident('$g'), Const(1000)),
+            GlobalGet(Ident('p'), Ident('$g')),
+            Load(Ident('b'), 8, v('p')), # out of bounds
+            Call(None, Ident('$print_i64'), [v('b')]),
+            Trap(),
+        ])
+    ])
+
+@pytest.mark.parametrize('engine', ['ast', 'vm', 'pycompile'])
+def test_program(engine: str, capsys: pytest.CaptureFixture[str]):
+    with pytest.raises(tacRuntime.TacTrap):
+        match engine:
+            case 'ast':
+                tacInterp.interpProgram(program)
+            case 'vm':
+                tacVm.runProgram(tacVm.decodeProgram(program))
+            case _:
+                tacToPython.run(tacToPython.programToPython(program))
+    out = capsys.readouterr()
+    assert out.out == '84\n-1\n'
+    assert out.err == 'ERROR: IndexError\n'
@@ -1,4 +1,5 @@
-from common.utils import splitIf
+from common.utils import splitIf, BulkInput
+import pytest
 
 def test_splitIf():
     l = [1, 2, 3, 4, 5, 6]
@@ -12,3 +13,11 @@ def test_splitIf():
     assert splitIf(empty, lambda x: x == 3, 'left') == ([], [])
     assert splitIf([3], lambda x: x == 3) == ([], [3])
     assert splitIf([3], lambda x: x == 3, 'left') == ([3], [])
+
+def test_bulkInput():
+    b = BulkInput(b'1 -2\n\n 30\nx\n')
+    assert [b.nextInt(), b.nextInt(), b.nextInt()] == [1, -2, 30]
+    with pytest.raises(ValueError):
+        b.nextInt()
+    with pytest.raises(EOFError):
+        b.nextInt()
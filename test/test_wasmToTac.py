@@ -0,0 +1,115 @@
+from common.wasm import *
+from common.compilerSupport import wasmImports
+import assembly.tac_ast as tac
+import assembly.wasmToTac as wasmToTac
+import pytest
+
+pytestmark = pytest.mark.instructor
+
+def toTac(instrs: list[WasmInstr]) -> list[tac.instr]:
+    (res, tacInstrs) = wasmToTac.wasmToTac(wasmToTac.downcast(instrs))
+    assert res is None
+    return tacInstrs
+
+def test_evaluationOrder():
+    # print(input_int() - input_int())
+    instrs: list[WasmInstr] = [
+        WasmInstrCall(WasmId('$input_i64')),
+        WasmInstrCall(WasmId('$input_i64')),
+        WasmInstrNumBinOp('i64', 'sub'),
+        WasmInstrCall(WasmId('$print_i64'))
+    ]
+    r0 = tac.Ident('%R0')
+    r1 = tac.Ident('%R1')
+    r2 = tac.Ident('%R2')
+    assert toTac(instrs) == [
+        tac.Call(r0, tac.Ident('$input_i64'), []),
+        tac.Call(r1, tac.Ident('$input_i64'), []),
+        tac.Assign(r2, tac.BinOp(tac.Name(r0), tac.Op('SUB'), tac.Name(r1))),
+        tac.Call(None, tac.Ident('$print_i64'), [tac.Name(r2)])
+    ]
+
+def test_uniqueLabels():
+    x = WasmId('$x')
+    ifStmt: list[WasmInstr] = [
+        WasmInstrVarLocal('get', x),
+        WasmInstrIf(None, [], [WasmInstrConst('i64', 1), WasmInstrVarLocal('set', x)])
+    ]
+    labels = [i.label for i in toTac(ifStmt + ifStmt) if isinstance(i, tac.Label)]
+    assert len(labels) == 2
+    assert len(set(labels)) == 2
+
+def test_deepExpression():
+    n = 50000
+    instrs: list[WasmInstr] = [WasmInstrConst('i64', 0)]
+    for _ in range(n):
+        instrs += [WasmInstrConst('i64', 1), WasmInstrNumBinOp('i64', 'add')]
+    instrs.append(WasmInstrVarLocal('set', WasmId('$x')))
+    tacInstrs = toTac(instrs)
+    assert len(tacInstrs) == n + 1
+    assert tacInstrs[-2] == tac.Assign(tac.Ident('$x'),
+                                       tac.BinOp(tac.Name(tac.Ident(f'%R{n - 2}')),
+                                                 tac.Op('ADD'), tac.Const(1)))
+
+def test_shadowedLabels():
+    loop = WasmId('$loop')
+    inner = WasmInstrLoop(loop, [WasmInstrConst('i32', 0), WasmInstrBranch(loop, True)])
+    outer = WasmInstrLoop(loop, [inner, WasmInstrConst('i32', 0), WasmInstrBranch(loop, True)])
+    assert toTac([outer]) == [
+        tac.Label('$loop'),
+        tac.Label('$loop_1'),
+        tac.GotoIf(tac.Const(0), '$loop_1'),
+        tac.GotoIf(tac.Const(0), '$loop')
+    ]
+
+def test_operandKeepsOldValue():
+    # x + (x = 1)
+    x = WasmId('$x')
+    instrs: list[WasmInstr] = [
+        WasmInstrVarLocal('get', x),
+        WasmInstrConst('i64', 1),
+        WasmInstrVarLocal('tee', x),
+        WasmInstrNumBinOp('i64', 'add'),
+        WasmInstrCall(WasmId('$print_i64'))
+    ]
+    tacInstrs = toTac(instrs)
+    r0 = tac.Ident('%R0')
+    assert tacInstrs[:2] == [
+        tac.Assign(r0, tac.Prim(tac.Name(tac.Ident('$x')))),
+        tac.Assign(tac.Ident('$x'), tac.Prim(tac.Const(1)))
+    ]
+    assert tacInstrs[2] == tac.Assign(tac.Ident('%R1'),
+                                      tac.BinOp(tac.Name(r0), tac.Op('ADD'),
+                                                tac.Name(tac.Ident('$x'))))
+
+def test_moduleToTac():
+    x = WasmId('$x')
+    ptr = WasmId('$ptr')
+    double = WasmFunc(WasmId('$double'), [(x, 'i64')], 'i64', [], [
+        WasmInstrVarLocal('get', x),
+        WasmInstrConst('i64', 2),
+        WasmInstrNumBinOp('i64', 'mul')
+    ])
+    main = WasmFunc(WasmId('$main'), [], None, [(x, 'i32')], [
+        WasmInstrVarGlobal('get', ptr),
+        WasmInstrConst('i64', 21),
+        WasmInstrCall(WasmId('$double')),
+        WasmInstrMem('i64', 'store'),
+        WasmInstrVarGlobal('get', ptr),
+        WasmInstrMem('i64', 'load'),
+        WasmInstrCall(WasmId('$print_i64'))
+    ])
+    m = WasmModule(wasmImports(1), [],
+                   [WasmGlobal(ptr, 'i32', True, [WasmInstrConst('i32', 100)])],
+                   [WasmData(0, 'Error')], WasmFuncTable([WasmId('$double')]), [double, main])
+    prog = wasmToTac.moduleToTac(m)
+    assert prog.memSize == wasmToTac.WASM_PAGE_SIZE
+    assert prog.globals == [tac.Global(tac.Ident('$ptr'), 100)]
+    assert prog.data == [tac.Data(0, 'Error')]
+    assert prog.funTable == [tac.Ident('$double')]
+    assert [f.name.name for f in prog.funs] == ['$double', '$main']
+    assert prog.funs[0].params == [tac.Ident('$x')]
+    assert prog.funs[0].body[-1] == tac.Return(tac.Name(tac.Ident('%R0')))
+    assert prog.funs[1].locals == [tac.Ident('$x')]
+    assert [type(i) for i in prog.funs[1].body] == \
+        [tac.GlobalGet, tac.Call, tac.Store, tac.GlobalGet, tac.Load, tac.Call]
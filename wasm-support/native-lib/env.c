@@ -49,28 +49,67 @@ static void print_f64_wrapper(wasm_exec_env_t exec_env, double x)
     printf("%f\n", x);
 }
 
-static int32_t input_i32_wrapper(wasm_exec_env_t exec_env) {
-    int32_t res;
-    if(isatty(1)) {
-        // stdout is a terminal
-        printf("input int: ");
-    }
-    int i = scanf("%" PRId32 "", &res);
-    if (i == 1) {
-        return res;
-    } else {
-        fprintf(stderr, "Invalid input");
+/*
+ * Input handling. If stdin is not a terminal, all of stdin is read into a buffer on the
+ * first call of input_i32 or input_i64, and the numbers are parsed from this buffer.
+ * This avoids one scanf call per input for programs consuming many inputs. If stdin is
+ * a terminal, each number is read with scanf as before.
+ */
+static int stdout_is_tty = -1;
+static int stdin_is_tty = -1;
+static char *input_buf = NULL;
+static char *input_pos = NULL;
+
+static void read_all_input(void)
+{
+    size_t cap = 1 << 16;
+    size_t len = 0;
+    input_buf = malloc(cap + 1);
+    if (input_buf == NULL) {
+        fprintf(stderr, "Out of memory while reading input");
         abort();
     }
+    size_t n;
+    while ((n = fread(input_buf + len, 1, cap - len, stdin)) > 0) {
+        len += n;
+        if (len == cap) {
+            cap *= 2;
+            char *p = realloc(input_buf, cap + 1);
+            if (p == NULL) {
+                fprintf(stderr, "Out of memory while reading input");
+                abort();
+            }
+            input_buf = p;
+        }
+    }
+    input_buf[len] = '\0';
+    input_pos = input_buf;
 }
 
-static int64_t input_i64_wrapper(wasm_exec_env_t exec_env) {
-    int64_t res;
-    if(isatty(1)) {
-        // stdout is a terminal
+static int64_t input_int(void)
+{
+    if (stdout_is_tty < 0) {
+        stdout_is_tty = isatty(1);
+        stdin_is_tty = isatty(0);
+    }
+    if (stdout_is_tty) {
         printf("input int: ");
     }
-    int i = scanf("%" PRId64 "", &res);
+    if (!stdin_is_tty) {
+        if (input_buf == NULL) {
+            read_all_input();
+        }
+        char *end;
+        int64_t res = strtoll(input_pos, &end, 10);
+        if (end == input_pos) {
+            fprintf(stderr, "Invalid input");
+            abort();
+        }
+        input_pos = end;
+        return res;
+    }
+    int64_t res;
+    int i = scanf("%" SCNd64, &res);
     if (i == 1) {
         return res;
     } else {
@@ -79,6 +118,16 @@ static int64_t input_i64_wrapper(wasm_exec_env_t exec_env) {
     }
 }
 
+static int32_t input_i32_wrapper(wasm_exec_env_t exec_env)
+{
+    return (int32_t)input_int();
+}
+
+static int64_t input_i64_wrapper(wasm_exec_env_t exec_env)
+{
+    return input_int();
+}
+
 /* clang-format off */
 #define REG_NATIVE_FUNC(func_name, signature) \
     { #func_name, func_name##_wrapper, signature, NULL }